@@ -0,0 +1,214 @@
+"""Approximate nearest-neighbour backends for the embedding index.
+
+The service starts on a brute-force ("flat") index and is promoted to the
+configured ANN backend once it holds ``ANN_PROMOTE_AT`` vectors. All
+backends use the L2 metric so ``retrieve``'s distance -> similarity mapping
+stays valid.
+
+``VECTOR_STORAGE`` sets how the flat and HNSW indexes hold their vectors in
+RAM (and in the snapshot ``.index`` file), per 384-dim vector:
+
+    fp32   1536 bytes, exact (IndexFlatL2 / IndexHNSWFlat)
+    fp16    768 bytes, scalar quantized, error ~1e-3
+    int8    384 bytes, scalar quantized per dimension (trained)
+    pq       48 bytes (PQ_M), product quantized (trained)
+
+int8 and pq need training data, so the index stays fp32 until it holds
+``STORAGE_TRAIN_AT`` vectors and is then rebuilt compressed, like an ANN
+promotion. IVF-PQ is always product quantized.
+
+Compression is for RAM, not disk: the exact float32 vectors are kept on
+purpose next to every base (and in every delta segment), because lossy
+results are re-scored against them (segment_store.ExactVectors) and
+promotion / retraining builds from them. On disk a vector therefore costs
+its index code plus 4 * dim bytes; ``describe`` reports both, and
+``SegmentStore.disk_usage`` the measured total.
+
+Configuration (env):
+    ANN_BACKEND          hnsw | ivfpq | flat (flat disables promotion)
+    ANN_PROMOTE_AT       vector count that triggers promotion
+    ANN_TRAIN_SAMPLE     max vectors sampled for IVF/PQ training
+    VECTOR_STORAGE       fp32 | fp16 | int8 | pq
+    STORAGE_TRAIN_AT     vector count before int8 / pq storage is trained
+    HNSW_M, HNSW_EF_CONSTRUCTION, HNSW_EF_SEARCH
+    IVF_NLIST (0 = auto), IVF_NPROBE, PQ_M, PQ_NBITS
+"""
+import os
+import math
+
+import faiss
+import numpy as np
+
+ANN_BACKEND = os.getenv("ANN_BACKEND", "hnsw").lower()
+ANN_PROMOTE_AT = int(os.getenv("ANN_PROMOTE_AT", "50000"))
+ANN_TRAIN_SAMPLE = int(os.getenv("ANN_TRAIN_SAMPLE", "100000"))
+
+HNSW_M = int(os.getenv("HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+
+IVF_NLIST = int(os.getenv("IVF_NLIST", "0"))
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "16"))
+PQ_M = int(os.getenv("PQ_M", "48"))  # 384 dims / 48 = 8 dims per sub-quantizer
+PQ_NBITS = int(os.getenv("PQ_NBITS", "8"))
+
+VECTOR_STORAGE = os.getenv("VECTOR_STORAGE", "fp32").lower()
+# PQ with 256 centroids per sub-quantizer wants >= 39 * 256 training vectors
+STORAGE_TRAIN_AT = int(os.getenv("STORAGE_TRAIN_AT", "10000"))
+
+BACKENDS = ("flat", "hnsw", "ivfpq")
+STORAGES = ("fp32", "fp16", "int8", "pq")
+# storages whose distances are approximate enough to re-score with exact vectors
+LOSSY = ("int8", "pq")
+
+_SQ_TYPES = {"fp16": faiss.ScalarQuantizer.QT_fp16, "int8": faiss.ScalarQuantizer.QT_8bit}
+
+
+def index_kind(index) -> str:
+    """Short name of the backend an index instance belongs to."""
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivfpq"
+    if isinstance(index, (faiss.IndexFlat, faiss.IndexScalarQuantizer, faiss.IndexPQ)):
+        return "flat"
+    return type(index).__name__
+
+
+def storage_kind(index) -> str:
+    """How an index stores its vectors (one of STORAGES)."""
+    if isinstance(index, faiss.IndexHNSW):
+        return storage_kind(faiss.downcast_index(index.storage))
+    if isinstance(index, (faiss.IndexPQ, faiss.IndexIVFPQ)):
+        return "pq"
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        return next((k for k, t in _SQ_TYPES.items() if t == index.sq.qtype), "sq")
+    return "fp32"
+
+
+def needs_training(storage: str) -> bool:
+    return storage in ("int8", "pq")
+
+
+def initial_index(dim: int, storage: str = None):
+    """The empty index a new log starts with (fp32 until a trained storage can be trained)."""
+    storage = storage or VECTOR_STORAGE
+    return new_index("flat", dim, storage="fp32" if needs_training(storage) else storage)
+
+
+def promotion_target(n: int, backend: str = None, storage: str = None):
+    """``(backend, storage)`` a flat index holding ``n`` vectors should be served from."""
+    backend = backend or ANN_BACKEND
+    storage = storage or VECTOR_STORAGE
+    if backend != "flat" and n >= ANN_PROMOTE_AT:
+        return backend, "pq" if backend == "ivfpq" else storage
+    if needs_training(storage) and n < STORAGE_TRAIN_AT:
+        return "flat", "fp32"
+    return "flat", storage
+
+
+def should_promote(index, backend: str = None, storage: str = None) -> bool:
+    """Whether a flat index should be rebuilt as an ANN index or with another storage."""
+    if index_kind(index) != "flat":
+        return False  # ANN indexes are never demoted
+    return promotion_target(index.ntotal, backend, storage) != ("flat", storage_kind(index))
+
+
+def default_nlist(n: int) -> int:
+    if IVF_NLIST > 0:
+        return IVF_NLIST
+    # ~4*sqrt(n) lists, while keeping >= 39 training points per centroid
+    return max(1, min(int(4 * math.sqrt(max(n, 1))), n // 39 or 1))
+
+
+def _sample(vectors, n: int, seed: int = 1234) -> np.ndarray:
+    total = len(vectors)
+    if total <= n:
+        return np.ascontiguousarray(vectors, dtype="float32")
+    rows = np.sort(np.random.default_rng(seed).choice(total, size=n, replace=False))
+    return np.ascontiguousarray(vectors[rows], dtype="float32")
+
+
+def new_index(backend: str, dim: int, n_hint: int = 0, storage: str = "fp32", **params):
+    """Create an empty (untrained) index for ``backend`` storing vectors as ``storage``."""
+    if storage not in STORAGES:
+        raise ValueError(f"unknown vector storage: {storage!r} (expected one of {STORAGES})")
+    pq_m, pq_nbits = params.get("pq_m", PQ_M), params.get("pq_nbits", PQ_NBITS)
+    if backend == "flat":
+        if storage == "pq":
+            return faiss.IndexPQ(dim, pq_m, pq_nbits)
+        if storage in _SQ_TYPES:
+            return faiss.IndexScalarQuantizer(dim, _SQ_TYPES[storage], faiss.METRIC_L2)
+        return faiss.IndexFlatL2(dim)
+    if backend == "hnsw":
+        m = params.get("m", HNSW_M)
+        if storage == "pq":
+            idx = faiss.IndexHNSWPQ(dim, pq_m, m, pq_nbits)
+        elif storage in _SQ_TYPES:
+            idx = faiss.IndexHNSWSQ(dim, _SQ_TYPES[storage], m)
+        else:
+            idx = faiss.IndexHNSWFlat(dim, m)
+        idx.hnsw.efConstruction = params.get("ef_construction", HNSW_EF_CONSTRUCTION)
+        return idx
+    if backend == "ivfpq":
+        nlist = params.get("nlist") or default_nlist(n_hint)
+        quantizer = faiss.IndexFlatL2(dim)
+        return faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m, pq_nbits)
+    raise ValueError(f"unknown index backend: {backend!r} (expected one of {BACKENDS})")
+
+
+def tune(index, ef_search: int = None, nprobe: int = None):
+    """Apply query-time knobs (efSearch / nprobe); no-op for flat indexes."""
+    kind = index_kind(index)
+    if kind == "hnsw":
+        index.hnsw.efSearch = ef_search or HNSW_EF_SEARCH
+    elif kind == "ivfpq":
+        index.nprobe = nprobe or IVF_NPROBE
+    return index
+
+
+def build_index(backend: str, vectors, batch_size: int = 65536, storage: str = "fp32", **params):
+    """Build a trained, populated index from exact float32 vectors.
+
+    ``vectors`` may be a memory-mapped array; it is added in batches so only
+    the training sample and one batch are resident at a time.
+    """
+    n, dim = len(vectors), vectors.shape[1]
+    idx = new_index(backend, dim, n_hint=n, storage=storage, **params)
+    if not idx.is_trained:
+        train = _sample(vectors, max(ANN_TRAIN_SAMPLE, getattr(idx, "nlist", 0) * 39))
+        print(f"🏋️ Training {backend}/{storage_kind(idx)} index on {len(train)} sample vectors", flush=True)
+        idx.train(train)
+    for start in range(0, n, batch_size):
+        idx.add(np.ascontiguousarray(vectors[start:start + batch_size], dtype="float32"))
+    return tune(idx, params.get("ef_search"), params.get("nprobe"))
+
+
+def bytes_per_vector(index) -> int:
+    """Approximate RAM per vector: its code plus HNSW level-0 links or IVF ids."""
+    kind = index_kind(index)
+    if kind == "hnsw":
+        return int(faiss.downcast_index(index.storage).code_size) + 4 * int(index.hnsw.nb_neighbors(0))
+    if kind == "ivfpq":
+        return int(index.code_size) + 8
+    return int(getattr(index, "code_size", 0))
+
+
+def disk_bytes_per_vector(index) -> int:
+    """Approximate disk per vector: the index (as bytes_per_vector) plus its exact float32 copy."""
+    return bytes_per_vector(index) + 4 * int(index.d)
+
+
+def describe(index) -> dict:
+    info = {"type": index_kind(index), "storage": storage_kind(index), "vectors": int(index.ntotal)}
+    info["bytes_per_vector"] = bytes_per_vector(index)
+    info["mb_per_million"] = round(info["bytes_per_vector"] * 1e6 / 2 ** 20, 1)
+    info["disk_bytes_per_vector"] = disk_bytes_per_vector(index)
+    info["disk_mb_per_million"] = round(info["disk_bytes_per_vector"] * 1e6 / 2 ** 20, 1)
+    kind = info["type"]
+    if kind == "hnsw":
+        info["efSearch"] = int(index.hnsw.efSearch)
+    elif kind == "ivfpq":
+        info["nlist"] = int(index.nlist)
+        info["nprobe"] = int(index.nprobe)
+    return info
@@ -1,16 +1,32 @@
-from fastapi import FastAPI, UploadFile, File
+import time
+_IMPORT_START = time.perf_counter()
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+from typing import List
 import asyncio
-import uuid
+import json
 import threading
 from datetime import datetime
-import shutil
 import os
 
-from ocr import extract_text
-from embed import add_text, search_text, documents, index
+from ocr import extract_text, extraction_complete
+import embed
+from extract_cache import extract_cached
+import ann
+from embed import add_text, retrieve_batch, documents
+from batcher import MicroBatcher
+from job_queue import JobQueue
+from uploads import receive_upload, resolve_download, UploadError
 from db import init_db, add_notification_db, SessionLocal, Notification as DBNotification
+import ocr
+import readiness
 from fastapi.middleware.cors import CORSMiddleware
 
+# models and the index are not loaded at import (see _start_background_loading)
+readiness.record("imports", time.perf_counter() - _IMPORT_START)
+
 app = FastAPI()
 app.add_middleware(
     CORSMiddleware,
@@ -28,37 +44,115 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 # ensure DB ready
 init_db()
 
-@app.post("/upload")
-async def upload_file(file: UploadFile = File(...), sync: bool = False):
-    try:
-        file_path = os.path.join(UPLOAD_DIR, file.filename)
+# concurrent /search and /chat queries arriving within a few ms share one
+# model.encode + index.search call (see embed.retrieve_batch)
+search_batcher = MicroBatcher(
+    retrieve_batch,
+    max_batch=int(os.getenv("SEARCH_BATCH_MAX", "32")),
+    max_wait_ms=float(os.getenv("SEARCH_BATCH_WAIT_MS", "5")),
+)
 
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+def _index_upload(job: dict) -> dict:
+    """Job handler: OCR + index one uploaded file (runs on a job worker thread)."""
+    filename, content_hash = job["filename"], job["content_hash"]
+    _, raw_text, cleaned_text = extract_cached(job["path"], extract_text, sha=content_hash, complete=extraction_complete)
 
-        raw_text, cleaned_text = extract_text(file_path)
+    if not cleaned_text or len(cleaned_text.strip()) < 10:
+        add_notification(f"Uploaded but no readable text found: {filename}")
+        return {"message": "File uploaded but no readable text found"}
 
-        if not cleaned_text or len(cleaned_text.strip()) < 10:
-            return {"message": "File uploaded but no readable text found"}
+    doc_id = add_text(raw_text, cleaned_text, source=filename, content_hash=content_hash)
+    add_notification(f"Uploaded and indexed: {filename} (id={doc_id})")
+    return {"doc_id": int(doc_id) if doc_id is not None else None, "message": "File uploaded and indexed successfully"}
 
-        # If client requested synchronous indexing, run and return doc_id
-        if sync:
-            try:
-                doc_id = await asyncio.to_thread(add_text, raw_text, cleaned_text, source=file.filename)
-            except TypeError:
-                doc_id = await asyncio.to_thread(add_text, raw_text, cleaned_text, file.filename)
-            add_notification(f"Uploaded and indexed: {file.filename} (id={doc_id})")
-            return {"message": "File uploaded and indexed successfully", "doc_id": doc_id}
 
-        # Otherwise schedule background indexing and return a job id immediately
-        job_id = uuid.uuid4().hex
-        with jobs_lock:
-            jobs[job_id] = {"status": "pending", "doc_id": None, "error": None, "filename": file.filename}
+# uploads are OCR'd and indexed by a bounded pool of job workers, never on the
+# event loop; jobs live in the jobs table, so they survive a restart
+job_queue = JobQueue(
+    _index_upload,
+    workers=int(os.getenv("UPLOAD_WORKERS", "2")),
+    max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", "3")),
+    retry_delay=float(os.getenv("JOB_RETRY_DELAY", "5")),
+    on_failure=lambda job, e: add_notification(f"Upload failed: {job['filename']} - {e}"),
+)
+
+
+# build the OCR reader and spell index in the background too, so the first
+# upload does not pay for them
+OCR_WARMUP = os.getenv("OCR_WARMUP", "1").lower() in ("1", "true", "yes")
+
+
+@app.on_event("startup")
+def _start_job_queue():
+    # upload jobs wait for the index inside add_text, so workers can start now
+    job_queue.start()
+
 
-        asyncio.create_task(_run_index_job(job_id, raw_text, cleaned_text, file.filename))
+@app.on_event("startup")
+def _start_background_loading():
+    # uvicorn binds right away; the index, then the model, load on a thread
+    if OCR_WARMUP:
+        readiness.register("ocr_reader", "spell_index")
+    loader = embed.load_async()
+
+    def warm_ocr():
+        loader.join()  # the index and model first: search matters more than OCR
+        try:
+            ocr.warm_up()
+        except Exception as e:
+            print(f"⚠️ OCR warm-up failed: {e}", flush=True)
+
+    if OCR_WARMUP:
+        threading.Thread(target=warm_ocr, name="ocr-warmup", daemon=True).start()
+
+
+def _loading_response():
+    """503 for search requests that arrive before the index is loaded."""
+    return JSONResponse(
+        status_code=503,
+        headers={"Retry-After": "5"},
+        content={"error": "Search index is still loading, retry shortly", "results": [], "startup": readiness.snapshot()},
+    )
+
+
+# multipart body documented by hand: the handler parses the stream itself
+_UPLOAD_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "properties": {"file": {"type": "string", "format": "binary"}},
+            "required": ["file"],
+        }}},
+    }
+}
+
+
+@app.post("/upload", openapi_extra=_UPLOAD_BODY)
+async def upload_file(request: Request, sync: bool = False, priority: int = 0):
+    try:
+        # streamed to a content-addressed blob, hashed while writing
+        filename, content_hash, file_path, size = await receive_upload(request)
+
+        # identical content is indexed once; uploads with the same name are separate documents
+        existing = embed.find_by_hash([content_hash]).get(content_hash)
+        if existing is not None:
+            add_notification(f"Already indexed: {filename} (id={existing})")
+            return {"message": "File already indexed", "doc_id": existing}
+
+        job_id = job_queue.submit(priority=priority, filename=filename, path=file_path, content_hash=content_hash)
+
+        # If client requested synchronous indexing, wait for the job and return doc_id
+        if sync:
+            job = await asyncio.to_thread(job_queue.wait, job_id)
+            if job["status"] == "failed":
+                return {"error": job["error"], "job_id": job_id}
+            return {"message": job["message"], "doc_id": job["doc_id"], "job_id": job_id}
 
-        return {"message": "File uploaded, indexing started", "job_id": job_id}
+        return {"message": "File uploaded, indexing queued", "job_id": job_id, "bytes": size}
 
+    except UploadError as e:
+        return JSONResponse(status_code=e.status_code, content={"error": str(e)})
     except Exception as e:
         return {"error": str(e)}
 
@@ -74,33 +168,158 @@ def home():
         "upload": "Use POST /upload via /docs",
         "search": "Use GET /search?query=your_text"
     }
+@app.get("/health")
+def health():
+    """Liveness: the process is up and serving (models may still be loading)."""
+    return {"status": "ok"}
+
+
+@app.get("/ready")
+def ready():
+    """Readiness: 200 once the index and the embedding model are loaded, else 503.
+
+    Search answers earlier than that: keyword-only (path ``lexical``) while
+    the model loads, 503 while the index loads.
+    """
+    is_ready = readiness.is_ready("index", "model")
+    body = {"ready": is_ready, **readiness.snapshot()}
+    return body if is_ready else JSONResponse(status_code=503, content=body)
+
+
 @app.get("/search")
 async def search(query: str):
-    # run search in thread to avoid blocking the event loop
-    results = await asyncio.to_thread(search_text, query)
+    if not embed.is_loaded():
+        return _loading_response()
+    # micro-batched with concurrent queries; runs in a worker thread off the event loop
+    results = await search_batcher.submit((query, 3))
     if not results:
         add_notification(f"Search: No results for '{query}'")
     return {"results": results}
 
 
+# POST /search/batch limits: queries per request, results per query
+SEARCH_BATCH_MAX_QUERIES = int(os.getenv("SEARCH_BATCH_MAX_QUERIES", "64"))
+SEARCH_BATCH_MAX_K = int(os.getenv("SEARCH_BATCH_MAX_K", "20"))
+
+
+class BatchQuery(BaseModel):
+    query: str
+    k: int = 3
+
+
+class BatchSearchRequest(BaseModel):
+    queries: List[BatchQuery]
+
+
+@app.post("/search/batch")
+async def search_batch(body: BatchSearchRequest):
+    """Many queries in one request: one encode + one index search for all of them.
+
+    Results come back in input order, each with the path that answered it
+    (cache / keyword / semantic) and its own timings; shared stage timings
+    are reported once for the batch.
+    """
+    if not embed.is_loaded():
+        return _loading_response()
+    if not body.queries:
+        return {"results": [], "timing_ms": {}}
+    if len(body.queries) > SEARCH_BATCH_MAX_QUERIES:
+        return JSONResponse(status_code=400, content={"error": f"At most {SEARCH_BATCH_MAX_QUERIES} queries per batch"})
+
+    queries = [(q.query, max(1, min(q.k, SEARCH_BATCH_MAX_K))) for q in body.queries]
+    timings = {}
+    start = time.perf_counter()
+    # one call straight to retrieve_batch: the request is already a batch
+    results = await asyncio.to_thread(embed.retrieve_batch, queries, timings)
+    total_ms = (time.perf_counter() - start) * 1000.0
+
+    out = []
+    for (query, k), res, t in zip(queries, results, timings.get("queries", [{}] * len(queries))):
+        out.append({
+            "query": query,
+            "k": k,
+            "results": res,
+            "path": t.get("path"),
+            "timing_ms": {"prefilter": round(t.get("prefilter_ms", 0.0), 2), "rank": round(t.get("rank_ms", 0.0), 2)},
+        })
+    return {
+        "results": out,
+        "timing_ms": {
+            "encode": round(timings.get("encode_ms", 0.0), 2),
+            "search": round(timings.get("search_ms", 0.0), 2),
+            "attach": round(timings.get("attach_ms", 0.0), 2),
+            "total": round(total_ms, 2),
+        },
+    }
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _chat_events(request: Request, query: str, k: int = 5):
+    """SSE stream of embed.retrieve_stream: one ``result`` event per hit, then ``done``.
+
+    The retriever is stepped one result at a time on a worker thread; the
+    stream stops (and the generator is closed, skipping the remaining
+    scoring) as soon as the client disconnects.
+    """
+    start = time.perf_counter()
+    results = embed.retrieve_stream(query, k)
+    count = 0
+    try:
+        while True:
+            if await request.is_disconnected():
+                return
+            item = await asyncio.to_thread(next, results, None)
+            if item is None:
+                break
+            stage, result = item
+            count += 1
+            yield _sse("result", {"stage": stage, "rank": count,
+                                  "elapsed_ms": round((time.perf_counter() - start) * 1000.0, 2), "result": result})
+        yield _sse("done", {"query": query, "found_documents": count,
+                            "elapsed_ms": round((time.perf_counter() - start) * 1000.0, 2)})
+        add_notification(f"Search query: {query}")
+    finally:
+        try:
+            results.close()
+        except ValueError:
+            pass  # still running on the worker thread (cancelled mid-step); it is dropped unfinished
+
+
 @app.get("/chat")
-async def chat(query: str):
-    """Search endpoint - returns document search results (removed conversational responses)"""
-    results = await asyncio.to_thread(search_text, query, 5)
+async def chat(request: Request, query: str, stream: bool = False, k: int = 5):
+    """Search endpoint - returns document search results (removed conversational responses).
+
+    ``stream=true`` answers with Server-Sent Events: keyword hits as soon as
+    the pre-filter finds them, then semantic hits as they are scored.
+    """
+    if not embed.is_loaded():
+        return _loading_response()
+    if stream:
+        return StreamingResponse(
+            _chat_events(request, query, max(1, min(k, SEARCH_BATCH_MAX_K))),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+    results = await search_batcher.submit((query, max(1, min(k, SEARCH_BATCH_MAX_K))))
     add_notification(f"Search query: {query}")
     return {"query": query, "results": results, "found_documents": len(results)}
 
 
 
 @app.get("/download")
-def download(filename: str):
-    # prevent path traversal
+def download(doc_id: int = None, filename: str = ""):
+    # the file is looked up by doc_id; the name is only what the browser saves it as
+    # (basename: prevent path traversal in the legacy by-name lookup)
     safe_name = os.path.basename(filename)
-    file_path = os.path.join(UPLOAD_DIR, safe_name)
-    if not os.path.exists(file_path):
-        add_notification(f"Download failed: {safe_name} not found")
+    file_path = resolve_download(doc_id=doc_id, filename=safe_name)
+    if file_path is None:
+        add_notification(f"Download failed: {safe_name or doc_id} not found")
         return {"error": "File not found"}
 
+    safe_name = safe_name or os.path.basename(file_path)
     add_notification(f"Downloaded: {safe_name}")
     from fastapi.responses import FileResponse
 
@@ -110,29 +329,6 @@ def download(filename: str):
 # simple in-memory notifications
 notifications = []
 
-# job tracking for background indexing
-jobs = {}
-jobs_lock = threading.Lock()
-
-
-async def _run_index_job(job_id: str, raw_text: str, cleaned_text: str, filename: str):
-    with jobs_lock:
-        jobs[job_id]["status"] = "running"
-        jobs[job_id]["started_at"] = datetime.utcnow().isoformat() + "Z"
-    try:
-        doc_id = await asyncio.to_thread(add_text, raw_text, cleaned_text, source=filename)
-        with jobs_lock:
-            jobs[job_id]["status"] = "done"
-            jobs[job_id]["doc_id"] = int(doc_id) if doc_id is not None else None
-            jobs[job_id]["completed_at"] = datetime.utcnow().isoformat() + "Z"
-        add_notification(f"Uploaded and indexed: {filename} (id={doc_id})")
-    except Exception as e:
-        with jobs_lock:
-            jobs[job_id]["status"] = "failed"
-            jobs[job_id]["error"] = str(e)
-            jobs[job_id]["completed_at"] = datetime.utcnow().isoformat() + "Z"
-        add_notification(f"Upload failed: {filename} - {e}")
-
 def add_notification(message: str):
     from datetime import datetime
     notifications.append({"message": message, "time": datetime.utcnow().isoformat() + "Z"})
@@ -167,18 +363,20 @@ def get_notifications():
 
 @app.get("/status")
 def status():
+    # read embed.index at call time: it is swapped when promoted to an ANN backend
     try:
-        vectors = int(index.ntotal) if hasattr(index, 'ntotal') else 0
+        vectors = int(embed.index.ntotal) if hasattr(embed.index, 'ntotal') else 0
+        index_info = {**ann.describe(embed.index), "disk": embed.disk_usage()}
     except Exception:
         vectors = 0
-    return {"documents": len(documents), "vectors": vectors}
+        index_info = {}
+    return {"documents": len(documents), "deleted_chunks": embed.deleted_chunks(), "vectors": vectors, "index": index_info, "cache": embed.cache_stats(), "search_batching": search_batcher.stats(), "jobs": job_queue.stats(), "startup": readiness.snapshot()}
 
 
 @app.get("/job/{job_id}")
 def job_status(job_id: str):
-    with jobs_lock:
-        job = jobs.get(job_id)
-        if not job:
-            return {"error": "job not found"}
-        # shallow copy to avoid exposing lock-protected structure
-        return {"job_id": job_id, "status": job.get("status"), "doc_id": job.get("doc_id"), "error": job.get("error"), "filename": job.get("filename"), "started_at": job.get("started_at"), "completed_at": job.get("completed_at")}
+    job = job_queue.get(job_id)
+    if not job:
+        return {"error": "job not found"}
+    job.pop("path", None)
+    return {**job, "queue": job_queue.stats()}
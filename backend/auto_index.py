@@ -1,19 +1,34 @@
 from scraper import scrape_notices
-from ocr import extract_text
-from embed import add_text
+from ocr import extract_text, extraction_complete
+from extract_cache import extract_cached, file_sha256
 import os
 
 NOTICE_DIR = "data/auto_notices"
+INGEST_BATCH_DOCS = int(os.getenv("INGEST_BATCH_DOCS", "16"))
 
 def run_auto_index():
+    # not at module level: the OCR pool's spawned workers re-import this script
+    from embed import add_texts, find_by_hash
+
     scrape_notices()
 
+    batch = []
     for file in os.listdir(NOTICE_DIR):
         path = os.path.join(NOTICE_DIR, file)
-        raw, cleaned = extract_text(path)
+        sha = file_sha256(path)
+        if find_by_hash([sha]):
+            continue  # unchanged since it was indexed
+        _, raw, cleaned = extract_cached(path, extract_text, sha=sha, complete=extraction_complete)
 
         if cleaned.strip():
-            add_text(raw, cleaned, source=file, title=file)
+            # the folder holds one file per name: a changed file replaces its old version
+            batch.append({"raw": raw, "clean": cleaned, "source": file, "title": file, "content_hash": sha,
+                          "replace": True})
+        if len(batch) >= INGEST_BATCH_DOCS:
+            add_texts(batch)
+            batch = []
+    if batch:
+        add_texts(batch)
 
     print("✅ Auto indexing complete")
 
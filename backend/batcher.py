@@ -0,0 +1,87 @@
+"""asyncio micro-batching for CPU-bound batch functions.
+
+Requests that arrive within ``max_wait_ms`` of each other are collected
+(up to ``max_batch``) and handed to ``fn`` as one list on a worker thread,
+so e.g. concurrent /search calls share one ``model.encode`` and one
+``index.search``. Each caller awaits only its own result.
+
+While one batch runs, new requests queue up and form the next batch, so
+under load batches grow on their own and the wait is bounded by
+``max_wait_ms`` plus one batch's run time.
+"""
+import asyncio
+import threading
+
+
+class MicroBatcher:
+    def __init__(self, fn, max_batch: int = 32, max_wait_ms: float = 5.0):
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = None
+        self._task = None
+        self._loop = None
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.max_seen = 0
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._run())
+
+    async def submit(self, item):
+        """Queue one item and wait for its result (exceptions are re-raised per caller)."""
+        self._ensure_worker()
+        fut = self._loop.create_future()
+        await self._queue.put((item, fut))
+        return await fut
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            # callers that gave up (client disconnected) don't need work done
+            batch = [(item, fut) for item, fut in batch if not fut.done()]
+            if not batch:
+                continue
+            with self._stats_lock:
+                self.batches += 1
+                self.items += len(batch)
+                self.max_seen = max(self.max_seen, len(batch))
+            try:
+                results = await asyncio.to_thread(self.fn, [item for item, _ in batch])
+            except Exception as e:
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            for (_, fut), result in zip(batch, results):
+                if not fut.done():
+                    fut.set_result(result)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "batches": self.batches,
+                "queries": self.items,
+                "avg_batch": round(self.items / self.batches, 2) if self.batches else 0.0,
+                "max_batch_seen": self.max_seen,
+                "max_batch": self.max_batch,
+                "max_wait_ms": self.max_wait * 1000.0,
+            }
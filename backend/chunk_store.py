@@ -0,0 +1,202 @@
+"""Columnar, memory-mapped store for chunk metadata.
+
+Replaces the in-memory list of per-chunk dicts. Chunk text lives in one
+UTF-8 blob addressed by byte offsets, and the other fields are integer columns:
+
+    start, end   byte range of the chunk text in the blob
+    doc_id       SQLite Document.id (-1 if unknown)
+    source, url, title   codes into a small shared string table
+
+A store is a memory-mapped *base* (written at index compaction) plus an
+in-memory *tail* of rows appended since. Opening a base only maps the files,
+so startup cost and RSS do not grow with the corpus, and reading a result
+touches only the bytes of that chunk. The full document text is not
+duplicated per chunk any more; it stays in SQLite.
+
+Base files (``<prefix>`` is the segment-log base name):
+    <prefix>.chunks.text          concatenated chunk text
+    <prefix>.chunks.cols.npy      int64 array, shape (6, n), one row per column
+    <prefix>.chunks.strings.json  string table (index 0 is None)
+"""
+import os
+import json
+import mmap
+import threading
+
+import numpy as np
+
+COLUMNS = ("start", "end", "doc_id", "source", "url", "title")
+_START, _END, _DOC_ID, _SOURCE, _URL, _TITLE = range(len(COLUMNS))
+SUFFIXES = ("chunks.text", "chunks.cols.npy", "chunks.strings.json")
+
+
+class _State:
+    """One consistent view of base + tail; swapped atomically on rebase."""
+    __slots__ = ("text", "text_len", "cols", "n", "tail_text", "tail_cols")
+
+    def __init__(self, text=b"", cols=None, tail_text=None, tail_cols=None):
+        self.text = text
+        self.text_len = len(text)
+        self.cols = cols if cols is not None else np.zeros((len(COLUMNS), 0), dtype=np.int64)
+        self.n = self.cols.shape[1]
+        self.tail_text = tail_text if tail_text is not None else bytearray()
+        self.tail_cols = tail_cols if tail_cols is not None else [[] for _ in COLUMNS]
+
+
+def _map_text(path: str):
+    if os.path.getsize(path) == 0:
+        return b""
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class ChunkStore:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._state = _State()
+        self._strings = [None]
+        self._codes = {None: 0}
+
+    # ---------- SIZE / ACCESS ----------
+
+    def __len__(self):
+        st = self._state
+        return st.n + len(st.tail_cols[_START])
+
+    def _value(self, st, i: int, col: int) -> int:
+        if i < st.n:
+            return int(st.cols[col, i])
+        return st.tail_cols[col][i - st.n]
+
+    def text(self, i: int) -> str:
+        """Text of chunk ``i`` (reads only that chunk's bytes)."""
+        st = self._state
+        start, end = self._value(st, i, _START), self._value(st, i, _END)
+        if i < st.n:
+            data = st.text[start:end]
+        else:
+            data = st.tail_text[start - st.text_len:end - st.text_len]
+        return bytes(data).decode("utf-8")
+
+    def string(self, code: int):
+        return self._strings[code] if 0 <= code < len(self._strings) else None
+
+    def row(self, i: int) -> dict:
+        """Chunk ``i`` as the dict shape the retriever has always used (minus ``raw``)."""
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        st = self._state
+        doc_id = self._value(st, i, _DOC_ID)
+        return {
+            "clean": self.text(i),
+            "doc_id": doc_id if doc_id >= 0 else None,
+            "source": self.string(self._value(st, i, _SOURCE)),
+            "url": self.string(self._value(st, i, _URL)),
+            "title": self.string(self._value(st, i, _TITLE)),
+        }
+
+    __getitem__ = row
+
+    def rows(self, start: int = 0, stop: int = None):
+        stop = len(self) if stop is None else stop
+        for i in range(start, stop):
+            yield self.row(i)
+
+    __iter__ = rows
+
+    def column(self, name: str) -> np.ndarray:
+        """Whole integer column (base memmap + tail) as one array."""
+        col = COLUMNS.index(name)
+        st = self._state
+        tail = np.asarray(st.tail_cols[col], dtype=np.int64)
+        return np.concatenate([st.cols[col], tail]) if len(tail) else np.asarray(st.cols[col])
+
+    # ---------- WRITES ----------
+
+    def _code(self, s) -> int:
+        s = s or None
+        code = self._codes.get(s)
+        if code is None:
+            code = self._codes[s] = len(self._strings)
+            self._strings.append(s)
+        return code
+
+    def extend(self, rows):
+        """Append chunk dicts (``clean``, ``doc_id``, ``source``, ``url``, ``title``)."""
+        with self._lock:
+            st = self._state
+            for r in rows:
+                data = (r.get("clean") or "").encode("utf-8")
+                start = st.text_len + len(st.tail_text)
+                st.tail_text += data
+                doc_id = r.get("doc_id")
+                values = (start, start + len(data), -1 if doc_id is None else int(doc_id),
+                          self._code(r.get("source")), self._code(r.get("url")), self._code(r.get("title")))
+                for col, v in zip(st.tail_cols, values):
+                    col.append(v)
+
+    def clear(self):
+        with self._lock:
+            self._state = _State()
+            self._strings = [None]
+            self._codes = {None: 0}
+
+    # ---------- PERSISTENCE ----------
+
+    def snapshot_writers(self, n: int) -> dict:
+        """Writers for a base covering rows ``[0, n)``: ``{suffix: fn(path)}``.
+
+        Call under the index lock; the writers themselves can run later on
+        another thread because rows below ``n`` never change.
+        """
+        st = self._state
+        strings = list(self._strings)
+        k = n - st.n
+        if k < 0:
+            raise ValueError("snapshot smaller than the current base")
+        text_end = self._value(st, n - 1, _END) if n else 0
+
+        def write_text(path):
+            with open(path, "wb") as f:
+                step = 1 << 24
+                for pos in range(0, st.text_len, step):
+                    f.write(st.text[pos:min(pos + step, st.text_len)])
+                f.write(bytes(st.tail_text[:text_end - st.text_len]) if n > st.n else b"")
+
+        def write_cols(path):
+            tail = np.array([c[:k] for c in st.tail_cols], dtype=np.int64).reshape(len(COLUMNS), k)
+            with open(path, "wb") as f:
+                np.save(f, np.concatenate([np.asarray(st.cols), tail], axis=1))
+
+        def write_strings(path):
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(strings, f, ensure_ascii=False)
+
+        return dict(zip(SUFFIXES, (write_text, write_cols, write_strings)))
+
+    def open_base(self, paths: dict):
+        """Replace the whole store with the base at ``paths`` ({suffix: path})."""
+        with open(paths["chunks.strings.json"], "r", encoding="utf-8") as f:
+            strings = json.load(f)
+        cols = np.load(paths["chunks.cols.npy"], mmap_mode="r")
+        text = _map_text(paths["chunks.text"])
+        with self._lock:
+            self._strings = strings
+            self._codes = {s: i for i, s in enumerate(strings)}
+            self._state = _State(text, cols)
+
+    def rebase(self, paths: dict, n: int):
+        """Switch to a freshly written base covering rows ``[0, n)``, keeping newer tail rows."""
+        cols = np.load(paths["chunks.cols.npy"], mmap_mode="r")
+        text = _map_text(paths["chunks.text"])
+        with self._lock:
+            st = self._state
+            k = n - st.n
+            if cols.shape[1] != n or k < 0:
+                return
+            tail_text = st.tail_text[self._value(st, n - 1, _END) - st.text_len:] if k else bytearray(st.tail_text)
+            tail_cols = [c[k:] for c in st.tail_cols]
+            # tail byte offsets are global, so they stay valid against the new base blob
+            self._state = _State(text, cols, bytearray(tail_text), tail_cols)
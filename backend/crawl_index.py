@@ -1,6 +1,12 @@
 import os
 import sys
+import time
+import hashlib
+import threading
 import requests
+from functools import partial
+from concurrent.futures import Future
+from email.utils import formatdate
 from urllib.parse import urlparse
 from bs4 import BeautifulSoup
 
@@ -8,13 +14,16 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 UPLOAD_DIR = os.path.join(BASE_DIR, "..", "data", "uploads")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-# load UniversityCrawler dynamically
-import importlib.util
-uc_path = os.path.abspath(os.path.join(BASE_DIR, "..", "crawler", "crawler", "crawler", "UniversityCrawler.py"))
-spec = importlib.util.spec_from_file_location("UniversityCrawler", uc_path)
-uc_mod = importlib.util.module_from_spec(spec)
-spec.loader.exec_module(uc_mod)
-UniversityCrawler = uc_mod.UniversityCrawler
+
+def _load_crawler():
+    """Load UniversityCrawler dynamically (it lives outside backend/)."""
+    import importlib.util
+    uc_path = os.path.abspath(os.path.join(BASE_DIR, "..", "crawler", "crawler", "crawler", "UniversityCrawler.py"))
+    spec = importlib.util.spec_from_file_location("UniversityCrawler", uc_path)
+    uc_mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(uc_mod)
+    return uc_mod.UniversityCrawler
+
 
 # seeds (copied from crawler/runner.py)
 seed_urls = [
@@ -30,9 +39,14 @@ seed_urls = [
     "https://www.giet.edu/academics-calender/"
 ]
 
-from embed import add_text
-from ocr import extract_text
-from app import add_notification
+# embed (model, index) and app (FastAPI) are imported where they are used:
+# the OCR pool's spawned workers re-import this script as __mp_main__, and
+# must not each load the embedding model and the whole index
+from ocr import extract_text, extraction_complete, OCR_WORKERS
+from extract_cache import extract_cached, file_sha256
+from crawl_state import CrawlState, conditional_headers
+from pipeline import Stage, BatchStage, print_report
+from uploads import crawl_path
 
 
 def safe_filename_from_url(url):
@@ -55,35 +69,156 @@ def fetch_title(page_url):
     return None
 
 
+class TitleCache:
+    """``fetch_title`` once per source page, shared by concurrent callers."""
+
+    def __init__(self):
+        self._titles = {}
+        self._lock = threading.Lock()
+
+    def get(self, page_url):
+        with self._lock:
+            fut = self._titles.get(page_url)
+            owner = fut is None
+            if owner:
+                fut = self._titles[page_url] = Future()
+        if owner:
+            fut.set_result(fetch_title(page_url))
+        return fut.result()
+
+
+def _prepare(path, sha=None, extract_fn=extract_text):
+    """``(sha256, raw, cleaned)`` for a file, or None if this exact content is already indexed."""
+    from embed import find_by_hash
+    sha = sha or file_sha256(path)
+    if find_by_hash([sha]):
+        return None
+    return extract_cached(path, extract_fn, sha=sha, complete=extraction_complete)
+
+
+# documents indexed per add_texts call (one DB transaction / encode / index segment)
+INGEST_BATCH_DOCS = int(os.getenv("INGEST_BATCH_DOCS", "16"))
+
+# crawler: total in-flight requests, in-flight per host, polite requests/second per host
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", "8"))
+CRAWL_PER_HOST = int(os.getenv("CRAWL_PER_HOST", "4"))
+CRAWL_RATE = float(os.getenv("CRAWL_RATE", "5"))
+
+# pipeline stages (crawl -> download -> OCR -> embed), each with its own
+# workers and a bounded inbox; a full inbox blocks the stage feeding it
+CRAWL_DOWNLOAD_WORKERS = int(os.getenv("CRAWL_DOWNLOAD_WORKERS", "4"))
+# documents in extraction at once; their scanned pages share the OCR process pool
+CRAWL_OCR_WORKERS = int(os.getenv("CRAWL_OCR_WORKERS", str(max(1, OCR_WORKERS))))
+CRAWL_QUEUE_SIZE = int(os.getenv("CRAWL_QUEUE_SIZE", "16"))
+
+
+def _download(session, state, url, dest_path):
+    """Conditionally download a document.
+
+    Returns ``(sha256, changed)``: ``changed`` is False when the server answered
+    304 or sent the same bytes as last time, ``sha256`` is None if nothing usable
+    is on disk.
+    """
+    known = state.document(url) or {}
+    headers = {}
+    if os.path.exists(dest_path):
+        headers = conditional_headers(known.get("etag"), known.get("last_modified"))
+        if not headers:
+            # downloaded before validators were recorded: revalidate against the file's mtime
+            headers["If-Modified-Since"] = formatdate(os.path.getmtime(dest_path), usegmt=True)
+
+    r = session.get(url, headers=headers, timeout=12)
+    if r.status_code == 304 and headers:
+        sha = known.get("content_hash") or file_sha256(dest_path)
+        if not known.get("content_hash"):
+            state.record_document(url, r.headers.get("ETag"), r.headers.get("Last-Modified"), sha)
+        return sha, False
+    if r.status_code != 200:
+        return None, False
+
+    sha = hashlib.sha256(r.content).hexdigest()
+    changed = sha != known.get("content_hash")
+    if changed or not os.path.exists(dest_path):
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        # whole file or nothing: the OCR stage may be reading the previous version
+        tmp = dest_path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(r.content)
+        os.replace(tmp, dest_path)
+    state.record_document(url, r.headers.get("ETag"), r.headers.get("Last-Modified"), sha)
+    return sha, changed
+
+
 def run_crawl_and_index():
-    crawler = UniversityCrawler(seed_urls=seed_urls, allowed_domain="giet.edu", max_depth=3, max_pages=200, max_documents=500)
-    docs = crawler.crawl()
+    from embed import add_texts, find_by_hash
+    from app import add_notification
 
-    for doc in docs:
+    UniversityCrawler = _load_crawler()
+    state = CrawlState()
+    titles = TitleCache()
+    sessions = threading.local()
+
+    def download(doc, emit):
         url = doc.get("url")
         source = doc.get("source")
         file_name = safe_filename_from_url(url)
-        dest_path = os.path.join(UPLOAD_DIR, file_name)
-
-        if os.path.exists(dest_path):
-            add_notification(f"Skipping download (exists): {file_name}")
-            raw, cleaned = extract_text(dest_path)
-            add_text(raw, cleaned, source=file_name, url=url, title=fetch_title(source) or file_name)
-            continue
+        # keyed by URL: /a/notice.pdf and /b/notice.pdf are downloaded concurrently
+        dest_path = crawl_path(url)
 
+        if not hasattr(sessions, "s"):
+            sessions.s = requests.Session()
         try:
-            r = requests.get(url, timeout=12)
-            if r.status_code == 200:
-                with open(dest_path, "wb") as f:
-                    f.write(r.content)
-                add_notification(f"Downloaded: {file_name}")
-                raw, cleaned = extract_text(dest_path)
-                if cleaned.strip():
-                    add_text(raw, cleaned, source=file_name, url=url, title=fetch_title(source) or file_name)
+            sha, changed = _download(sessions.s, state, url, dest_path)
         except Exception:
+            sha, changed = None, False
+        if sha is None:
             add_notification(f"Failed to fetch: {url}")
-
-    add_notification("Crawl & indexing complete")
+            return
+        if not changed and find_by_hash([sha]):
+            return  # 304 / same bytes, and already indexed
+        if changed:
+            add_notification(f"Downloaded: {file_name}")
+
+        # the crawler saw the source page's <title>; fetch it (once) only for resumed/304 pages
+        title = doc.get("title") or titles.get(source) or file_name
+        # re-hash what is on disk unless these bytes were just downloaded
+        emit({"path": dest_path, "sha": sha if changed else None, "source": file_name, "url": url, "title": title})
+
+    def extract(item, emit):
+        prepared = _prepare(item["path"], item["sha"], partial(extract_text, pool_min_pages=1))
+        if prepared is None:
+            return
+        sha, raw, cleaned = prepared
+        if cleaned.strip():
+            # a changed file replaces the old version indexed for this URL
+            emit({"raw": raw, "clean": cleaned, "source": item["source"], "url": item["url"],
+                  "title": item["title"], "content_hash": sha})
+
+    def index(batch, emit):
+        add_texts(batch)
+
+    embed_stage = BatchStage("embed", index, batch_size=INGEST_BATCH_DOCS, maxsize=CRAWL_QUEUE_SIZE)
+    ocr_stage = Stage("ocr", extract, workers=CRAWL_OCR_WORKERS, maxsize=CRAWL_QUEUE_SIZE, out=embed_stage)
+    download_stage = Stage("download", download, workers=CRAWL_DOWNLOAD_WORKERS, maxsize=CRAWL_QUEUE_SIZE, out=ocr_stage)
+    stages = [download_stage, ocr_stage, embed_stage]
+    for stage in stages:
+        stage.start()
+
+    crawler = UniversityCrawler(seed_urls=seed_urls, allowed_domain="giet.edu", max_depth=3, max_pages=200, max_documents=500,
+                                concurrency=CRAWL_CONCURRENCY, per_host=CRAWL_PER_HOST, rate=CRAWL_RATE, burst=max(1, int(CRAWL_RATE)),
+                                state=state, on_document=download_stage.put)
+    start = time.perf_counter()
+    try:
+        docs = crawler.crawl()
+    finally:
+        download_stage.close()  # drains download -> ocr -> embed in order
+    elapsed = time.perf_counter() - start
+
+    print(f"📈 Crawl: {len(crawler.visited_urls)} pages ({crawler.stats['not_modified']} not modified), "
+          f"{len(docs)} documents in {crawler.stats['elapsed']:.1f}s", flush=True)
+    print_report(stages, elapsed)
+    state.close()
+    add_notification(f"Crawl & indexing complete ({embed_stage.received} documents indexed)")
 
 
 if __name__ == "__main__":
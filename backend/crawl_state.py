@@ -0,0 +1,159 @@
+"""Persistent crawl frontier and per-URL HTTP validators (SQLite).
+
+Lets ``crawl_index`` crawl incrementally:
+
+- pages and documents remember their ETag / Last-Modified, so the next crawl
+  sends conditional requests and a 304 costs no body (a page's links are
+  stored too, so a 304 page is still traversed);
+- documents remember the SHA-256 of the last downloaded body, so a 200 with
+  identical bytes is not re-extracted;
+- the frontier (queued URLs) and the pages visited in the current run are
+  written as the crawl progresses, so an interrupted crawl resumes where it
+  stopped instead of starting over.
+
+Delete the database file to force a full crawl.
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+
+STATE_PATH = os.getenv(
+    "CRAWL_STATE_PATH",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'crawl_state.db')),
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, links TEXT,
+    fetched_at REAL, visited_run INTEGER
+);
+CREATE TABLE IF NOT EXISTS documents (
+    url TEXT PRIMARY KEY, source TEXT, etag TEXT, last_modified TEXT,
+    content_hash TEXT, fetched_at REAL, found_run INTEGER
+);
+CREATE TABLE IF NOT EXISTS frontier (url TEXT PRIMARY KEY, depth INTEGER);
+"""
+
+
+class CrawlState:
+
+    def __init__(self, path: str = STATE_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        # one connection shared by the crawler and the download threads
+        self._lock = threading.Lock()
+        self.run = int(self._meta("run", "0"))
+
+    def _meta(self, key, default=None):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key, value):
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    # ---------- crawl run / frontier ----------
+
+    def begin(self, seed_urls):
+        """Start a crawl run, or resume the unfinished one.
+
+        Returns ``(frontier, visited, documents)``: the ``(url, depth)`` pairs still
+        to crawl, the page URLs already visited in this run and the
+        ``{"url", "source"}`` documents it found so far.
+        """
+        with self._lock, self._conn:
+            if self._meta("open") == "1":
+                frontier = self._conn.execute("SELECT url, depth FROM frontier ORDER BY depth").fetchall()
+                visited = {u for (u,) in self._conn.execute("SELECT url FROM pages WHERE visited_run = ?", (self.run,))}
+                documents = [
+                    {"url": u, "source": s}
+                    for u, s in self._conn.execute("SELECT url, source FROM documents WHERE found_run = ?", (self.run,))
+                ]
+                print(f"↩️ Resuming crawl run {self.run}: {len(frontier)} queued, {len(visited)} visited", flush=True)
+                return list(frontier), visited, documents
+
+            self.run += 1
+            self._set_meta("run", self.run)
+            self._set_meta("open", "1")
+            self._conn.execute("DELETE FROM frontier")
+            self._conn.executemany("INSERT OR IGNORE INTO frontier (url, depth) VALUES (?, 0)", [(u,) for u in seed_urls])
+        return [(u, 0) for u in seed_urls], set(), []
+
+    def complete(self, url, page=None, pushed=(), documents=()):
+        """Record one processed frontier URL atomically.
+
+        ``page`` is ``(etag, last_modified, links)`` when the page was fetched
+        (or revalidated), ``pushed`` the ``(url, depth)`` pairs it queued and
+        ``documents`` the ``(url, source)`` documents it linked to.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            if page is not None:
+                etag, last_modified, links = page
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO pages (url, etag, last_modified, links, fetched_at, visited_run) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (url, etag, last_modified, json.dumps(sorted(links)), now, self.run),
+                )
+            self._conn.executemany(
+                "INSERT INTO frontier (url, depth) VALUES (?, ?) "
+                "ON CONFLICT(url) DO UPDATE SET depth = MIN(depth, excluded.depth)",
+                list(pushed),
+            )
+            self._conn.executemany(
+                "INSERT INTO documents (url, source, found_run) VALUES (?, ?, ?) "
+                "ON CONFLICT(url) DO UPDATE SET source = excluded.source, found_run = excluded.found_run",
+                [(u, s, self.run) for u, s in documents],
+            )
+            self._conn.execute("DELETE FROM frontier WHERE url = ?", (url,))
+
+    def finish(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM frontier")
+            self._set_meta("open", "0")
+
+    # ---------- validators ----------
+
+    def page(self, url):
+        """``(etag, last_modified, links)`` stored for a page, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT etag, last_modified, links FROM pages WHERE url = ?", (url,)).fetchone()
+        if row is None or row[2] is None:
+            return None
+        return row[0], row[1], set(json.loads(row[2]))
+
+    def document(self, url):
+        """``{"etag", "last_modified", "content_hash"}`` from the last download of a document, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, content_hash FROM documents WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"etag": row[0], "last_modified": row[1], "content_hash": row[2]}
+
+    def record_document(self, url, etag, last_modified, content_hash):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO documents (url, etag, last_modified, content_hash, fetched_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(url) DO UPDATE SET etag = excluded.etag, last_modified = excluded.last_modified, "
+                "content_hash = excluded.content_hash, fetched_at = excluded.fetched_at",
+                (url, etag, last_modified, content_hash, time.time()),
+            )
+
+    def close(self):
+        self._conn.close()
+
+
+def conditional_headers(etag, last_modified):
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    return headers
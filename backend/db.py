@@ -21,9 +21,35 @@ class Document(Base):
     url = Column(String(2048))
     title = Column(String(1024))
     filename = Column(String(512))
+    # SHA-256 of the source file; unchanged re-crawls are skipped by hash
+    content_hash = Column(String(64), index=True)
+    # set when a newer version replaces the document or it is deleted; rows are
+    # kept so SQLite never reuses the id (index chunks still reference it)
+    deleted_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
+class Job(Base):
+    """Background upload job (see job_queue.JobQueue); survives restarts."""
+    __tablename__ = "jobs"
+    id = Column(String(32), primary_key=True)
+    kind = Column(String(32), default="upload")
+    status = Column(String(16), index=True, default="queued")  # queued | running | done | failed
+    priority = Column(Integer, default=0)  # higher runs first
+    filename = Column(String(512))
+    path = Column(String(2048))
+    content_hash = Column(String(64))
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    doc_id = Column(Integer, nullable=True)
+    message = Column(Text, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    run_after = Column(DateTime, default=datetime.utcnow)  # retry backoff
+    started_at = Column(DateTime, nullable=True)
+    completed_at = Column(DateTime, nullable=True)
+
+
 class Notification(Base):
     __tablename__ = "notifications"
     id = Column(Integer, primary_key=True, index=True)
@@ -33,6 +59,18 @@ class Notification(Base):
 
 def init_db():
     Base.metadata.create_all(bind=engine)
+    _migrate()
+
+
+def _migrate():
+    """Add columns introduced after a database was first created (SQLite has no auto-migration)."""
+    with engine.begin() as conn:
+        cols = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(documents)")}
+        if "content_hash" not in cols:
+            conn.exec_driver_sql("ALTER TABLE documents ADD COLUMN content_hash VARCHAR(64)")
+        if "deleted_at" not in cols:
+            conn.exec_driver_sql("ALTER TABLE documents ADD COLUMN deleted_at DATETIME")
+        conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_documents_content_hash ON documents (content_hash)")
 
 
 def get_db():
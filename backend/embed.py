@@ -1,83 +1,611 @@
 import re
 import os
 import json
-from sentence_transformers import SentenceTransformer
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime
 import faiss
 import numpy as np
-from datetime import datetime
+from sqlalchemy import func
 from db import init_db, SessionLocal, Document as DBDocument
+from segment_store import SegmentStore, ExactVectors
+import ann
+from keyword_index import InvertedIndex
+import chunk_store
+from chunk_store import ChunkStore
+import ranking
+from query_cache import TTLCache, normalize_query
+import extract_cache
+import readiness
+import encoder
 
-model = SentenceTransformer("all-MiniLM-L6-v2")
+MODEL_NAME = "all-MiniLM-L6-v2"
+# loaded on first use (or by load_async on a background thread), see get_model;
+# encoder.EMBED_BACKEND picks PyTorch, ONNX Runtime or int8 ONNX Runtime
+model = None
+_model_lock = threading.Lock()
 
 # Configuration: tune these to control fuzzy matching and metadata boosting
-FUZZY_THRESHOLD = 0.82
+# query tokens missing from the corpus vocabulary also match indexed terms at
+# least this similar (1 - edits / length), via the keyword index's trigrams
+FUZZY_THRESHOLD = float(os.getenv("FUZZY_THRESHOLD", "0.82"))
+
+# Scoring weights (sum should be 1.0): semantic (FAISS) and lexical (BM25)
+# rank-fusion weights, plus a bonus for query terms in the title
+WEIGHT_SEMANTIC = 0.55
+WEIGHT_EXACT = 0.35
+WEIGHT_TITLE = 0.10
+
+# Quality gates: a candidate needs a strong embedding match or a lexical hit,
+# and a minimum quality score (see _quality_score). Fusion only orders the
+# survivors: RRF scores depend on rank alone, so they can't say "relevant"
+MIN_SEMANTIC_SIM = 0.45
+MIN_RELEVANCE = 0.35
 
-# Scoring weights (sum should be 1.0)
-WEIGHT_SEMANTIC = 0.35
-WEIGHT_EXACT = 0.30
-WEIGHT_DENSITY = 0.08
-WEIGHT_TITLE = 0.12
-WEIGHT_SOURCE = 0.10
-WEIGHT_CONTEXT = 0.05
+# FAISS / BM25 candidates per query: k * RANK_CANDIDATES_PER_K, capped.
+# Re-ranking is vectorized, so the cap is bounded by search cost, not Python loops.
+# Deep candidates matter when a few long documents fill the top ranks: results
+# are de-duplicated per document, and the gate is on similarity, not on rank
+MAX_CANDIDATES = int(os.getenv("RANK_MAX_CANDIDATES", "200"))
+CANDIDATES_PER_K = int(os.getenv("RANK_CANDIDATES_PER_K", "20"))
 
 # vector dim for all-MiniLM-L6-v2 is 384
-index = faiss.IndexFlatL2(384)
-# in-memory list of chunks with metadata
-documents = []
+EMBED_DIM = 384
+# starts flat, storing vectors as ann.VECTOR_STORAGE (fp32 until int8 / pq can be
+# trained); promoted to ann.ANN_BACKEND once it passes ann.ANN_PROMOTE_AT vectors
+index = ann.initial_index(EMBED_DIM)
+# exact float32 vectors of every chunk (memory-mapped from the segment log), for
+# re-scoring candidates of a lossy index (int8 / pq) with exact L2 distances
+_exact = ExactVectors(EMBED_DIM)
+# a lossy index is searched for this many times the candidates, which are then
+# re-scored exactly and cut back; 0 disables re-scoring
+RESCORE_FACTOR = int(os.getenv("VECTOR_RESCORE_FACTOR", "4"))
+# chunk metadata (text, doc_id, source, url, title) in a columnar store whose
+# base is memory-mapped from the segment log; full documents stay in SQLite
+documents = ChunkStore()
+# token -> postings over documents (same row ids as the FAISS index)
+keywords = InvertedIndex()
+# guards index/documents mutation and the segment log ordering
+_index_lock = threading.RLock()
+
+
+class _ReadWriteLock:
+    """Many concurrent readers or one writer; a waiting writer blocks new readers.
+
+    FAISS indexes (HNSW above all) must not be searched while vectors are
+    being added, so searches hold ``read()`` and the in-memory part of an
+    append or an index swap holds ``write()``. Not reentrant: a thread holding
+    ``read()`` must not take it again.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+# searches vs. in-memory index mutation (taken inside _index_lock by writers)
+_search_lock = _ReadWriteLock()
+# chunk ids whose document was deleted or replaced by a newer version; they
+# stay in the index but are filtered out of results (derived from the DB on start)
+_dead = np.zeros(0, dtype=bool)
 
 # ensure DB exists
 init_db()
 
 DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data'))
+# legacy single-file snapshot (migrated into the segment log on first start)
 FAISS_PATH = os.path.join(DATA_DIR, 'faiss.index')
 DOCS_JSON = os.path.join(DATA_DIR, 'documents.json')
+# append-only segment log: add_text writes one delta segment per document,
+# deltas are folded into a base snapshot in the background every N segments
+INDEX_DIR = os.path.join(DATA_DIR, 'index')
+COMPACT_EVERY = int(os.getenv("INDEX_COMPACT_EVERY", "64"))
+# a compaction drops tombstoned chunks (and renumbers the rest) once this share
+# of the index is tombstoned; the index is rebuilt from the surviving vectors
+PURGE_AT = float(os.getenv("INDEX_PURGE_AT", "0.1"))
+# chunks per model.encode forward pass during ingestion
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+# chunks accumulated before encoding when rebuilding the index from the DB
+INGEST_BATCH_CHUNKS = int(os.getenv("INGEST_BATCH_CHUNKS", "2048"))
 
+_store = SegmentStore(INDEX_DIR, compact_every=COMPACT_EVERY)
 
-def _persist_document(raw, clean, source=None, url=None, title=None, filename=None):
-    db = SessionLocal()
-    try:
-        doc = DBDocument(raw=raw, clean=clean, source=source, url=url, title=title, filename=filename)
-        db.add(doc)
-        db.commit()
-        db.refresh(doc)
-        return doc.id
-    finally:
-        db.close()
+# Query caches: embeddings are reused across index changes; search results are
+# keyed on index_version, which add_text bumps, so stale results are never served
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "3600"))
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "256"))  # 0 disables
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "300"))
+
+_query_cache = TTLCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL)
+_result_cache = TTLCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL)
+index_version = 0
+
+
+def _embed_docs(docs: list) -> np.ndarray:
+    """Embeddings for every chunk of ``docs`` (dicts with ``chunks``), in order.
+
+    Embeddings are cached by a hash of the chunk text, so re-indexing a
+    document whose text did not change skips model.encode.
+    """
+    parts = [None] * len(docs)
+    keys = [extract_cache.embedding_key(d["chunks"], encoder.cache_name(MODEL_NAME)) for d in docs]
+    todo = []
+    for i, (d, key) in enumerate(zip(docs, keys)):
+        parts[i] = extract_cache.get_embeddings(key, len(d["chunks"]))
+        if parts[i] is None:
+            todo.append(i)
+    if todo:
+        # OPTIMIZATION: Batch encode all chunks of all documents at once
+        # show_progress_bar=False for speed, batch_size tuned for GPU/CPU balance
+        texts = [c for i in todo for c in docs[i]["chunks"]]
+        embeddings = np.array(get_model().encode(texts, show_progress_bar=False, batch_size=EMBED_BATCH_SIZE)).astype("float32")
+        pos = 0
+        for i in todo:
+            n = len(docs[i]["chunks"])
+            parts[i] = embeddings[pos:pos + n]
+            pos += n
+            extract_cache.put_embeddings(keys[i], parts[i])
+    if not parts:
+        return np.zeros((0, EMBED_DIM), dtype="float32")
+    return np.ascontiguousarray(np.concatenate(parts), dtype="float32")
+
+
+def _mark_deleted(doc_ids) -> int:
+    """Tombstone every chunk of the given documents; returns the number of chunks hit."""
+    global _dead
+    doc_ids = np.asarray(sorted(doc_ids), dtype=np.int64)
+    if not len(doc_ids):
+        return 0
+    hit = np.isin(documents.column("doc_id"), doc_ids)
+    dead = np.zeros(len(hit), dtype=bool)
+    dead[:len(_dead)] = _dead[:len(hit)]
+    # swap in a new array so concurrent readers see either the old or the new mask
+    _dead = dead | hit
+    return int(hit.sum())
+
+
+def _live(ids: np.ndarray) -> np.ndarray:
+    """Boolean mask: which chunk ids are not tombstoned."""
+    dead = _dead
+    ids = np.asarray(ids, dtype=np.int64)
+    out = np.ones(len(ids), dtype=bool)
+    inside = ids < len(dead)
+    out[inside] = ~dead[ids[inside]]
+    return out
+
+
+def deleted_chunks() -> int:
+    return int(_dead.sum())
+
+
+def disk_usage() -> dict:
+    """Bytes the segment log takes on disk (see SegmentStore.disk_usage)."""
+    return _store.disk_usage()
+
+
+def _append_chunks(vectors: np.ndarray, new_chunks: list, replaced_doc_ids=()):
+    """Add encoded chunks to the live index and the segment log (and tombstone replaced docs)."""
+    global index_version
+    with _index_lock:
+        with _search_lock.write():
+            _exact.add(vectors)  # first: rows are always there for ids the index can return
+            index.add(vectors)
+            keywords.add_chunks(new_chunks, start=len(documents))
+            documents.extend(new_chunks)
+        if replaced_doc_ids:
+            print(f"♻️ Replaced documents {sorted(replaced_doc_ids)}: {_mark_deleted(replaced_doc_ids)} old chunks tombstoned", flush=True)
+        index_version += 1
+        _result_cache.clear()
+        # append-only persistence: one segment per batch, cost proportional to the batch only
+        try:
+            os.makedirs(DATA_DIR, exist_ok=True)
+            _store.append(vectors, new_chunks)
+        except Exception as e:
+            print(f"⚠️ Failed to persist index segment: {e}", flush=True)
 
 
 def _load_from_db(rebuild_index=True):
     db = SessionLocal()
+    pending = []
+
+    def flush():
+        # encode chunks of many documents per model.encode call
+        if rebuild_index:
+            vectors = _embed_docs(pending)
+            _exact.add(vectors)
+            index.add(vectors)
+        new_chunks = [c for d in pending for c in d["rows"]]
+        keywords.add_chunks(new_chunks, start=len(documents))
+        documents.extend(new_chunks)
+        pending.clear()
+
     try:
-        rows = db.query(DBDocument).all()
+        # the raw column is not needed to rebuild the index
+        rows = db.query(DBDocument.id, DBDocument.clean, DBDocument.source, DBDocument.filename,
+                        DBDocument.url, DBDocument.title).filter(DBDocument.deleted_at.is_(None)).order_by(DBDocument.id)
+        n_pending = 0
         for r in rows:
             cleaned = (r.clean or "").strip()
             if not cleaned:
                 continue
             # chunk and embed
             chunks = [cleaned[i:i+500] for i in range(0, len(cleaned), 500)]
-            if not chunks:
-                continue
-            if rebuild_index:
-                embeddings = model.encode(chunks)
-                index.add(np.array(embeddings).astype("float32"))
-            for c in chunks:
-                documents.append({"clean": c, "raw": r.raw, "source": r.filename or r.source, "url": r.url, "title": r.title, "doc_id": r.id})
+            pending.append({"chunks": chunks, "rows": [
+                {"clean": c, "source": r.filename or r.source, "url": r.url, "title": r.title, "doc_id": r.id} for c in chunks]})
+            n_pending += len(chunks)
+            if n_pending >= INGEST_BATCH_CHUNKS:
+                flush()
+                n_pending = 0
+        if pending:
+            flush()
     finally:
         db.close()
 
 
-# load existing documents into in-memory index on startup
-if os.path.exists(FAISS_PATH) and os.path.exists(DOCS_JSON):
+def _snapshot():
+    """Capture a consistent view of the index for a base snapshot (write_base kwargs)."""
+    with _index_lock:
+        count = len(documents)
+        upto_seq = _store.last_seq
+        snap = {
+            "index_bytes": faiss.serialize_index(index),
+            "count": count,
+            "upto_seq": upto_seq,
+            "extra": ann.describe(index),
+            "sidecars": {"postings.npz": keywords.to_bytes()},
+            "writers": documents.snapshot_writers(count),
+            # remap the chunk store and exact vectors onto the files just written, dropping the in-memory tails
+            "after": lambda: _rebase(upto_seq, count),
+        }
+        # first snapshot of a log without exact vectors: take them from memory (or the flat index)
+        if _store.base_vectors() is None:
+            if len(_exact) == index.ntotal:
+                snap["vectors"] = _exact.to_array()
+            elif ann.index_kind(index) == "flat" and ann.storage_kind(index) == "fp32":
+                snap["vectors"] = index.reconstruct_n(0, index.ntotal) if index.ntotal else np.zeros((0, EMBED_DIM), dtype="float32")
+        return snap
+
+
+def _rebase(seq: int, count: int):
+    path = os.path.join(INDEX_DIR, f"base-{seq:06d}.vectors.npy")
+    with _search_lock.write():
+        documents.rebase(_chunk_paths(seq), count)
+        if len(_exact) >= count and os.path.exists(path):
+            _exact.rebase(np.load(path, mmap_mode="r"), count)
+
+
+def _chunk_paths(seq=None) -> dict:
+    """Chunk store files of the base at ``seq`` (default: the current base)."""
+    if seq is None:
+        paths = {suffix: _store.base_path(suffix) for suffix in chunk_store.SUFFIXES}
+        return paths if all(paths.values()) else None
+    return {suffix: os.path.join(INDEX_DIR, f"base-{seq:06d}.{suffix}") for suffix in chunk_store.SUFFIXES}
+
+
+def _purge_snapshot():
+    """Drop tombstoned chunks from the live index, then capture it like ``_snapshot``.
+
+    The surviving rows are renumbered 0..n-1: the index, exact vectors, chunk
+    store and keyword index are rebuilt from them off the lock, rows added
+    meanwhile are caught up, and everything is swapped in at once. The base
+    keeps ``upto_seq``, so delta segments written afterwards replay on top of
+    the renumbered rows.
+    """
+    global index, _exact, documents, keywords, _dead, index_version
+    with _index_lock:
+        n0 = len(documents)
+        if len(_exact) != n0 or index.ntotal != n0:
+            raise ValueError("exact vectors do not cover the index")
+        keep = np.flatnonzero(_live(np.arange(n0)))
+    t0 = time.time()
+    vectors = _exact.rows(keep)
+    purged = ann.build_index(ann.index_kind(index), vectors, storage=ann.storage_kind(index))
+    exact = ExactVectors(EMBED_DIM)
+    exact.add(vectors)
+    chunks = ChunkStore()
+    chunks.extend(documents[i] for i in keep.tolist())
+    postings = InvertedIndex()
+    postings.add_chunks(chunks)
+    with _index_lock:
+        # catch up on chunks added while the purged copy was being built
+        n1 = len(documents)
+        if n1 > n0:
+            added = _exact.rows(np.arange(n0, n1))
+            rows = list(documents.rows(n0, n1))
+            purged.add(added)
+            exact.add(added)
+            postings.add_chunks(rows, start=len(chunks))
+            chunks.extend(rows)
+        # documents tombstoned during the build stay tombstoned
+        live = _live(np.arange(n1))
+        dead = ~np.concatenate([live[keep], live[n0:]])
+        with _search_lock.write():
+            index, _exact, documents, keywords, _dead = purged, exact, chunks, postings, dead
+        index_version += 1
+        _result_cache.clear()
+        print(f"🧹 Purged {n0 - len(keep)} tombstoned chunks in {time.time() - t0:.1f}s "
+              f"({len(documents)} left)", flush=True)
+        snap = _snapshot()
+    # the old base's vectors include the purged rows: write the kept ones
+    snap["vectors"] = _exact.to_array()
+    return snap
+
+
+def _compaction_snapshot():
+    """``_snapshot`` for background compactions, purging tombstoned chunks once PURGE_AT of them are dead."""
+    n_dead = int(_dead.sum())
+    # a promotion in flight numbers its catch-up by the old row ids: purge next time
+    if n_dead and n_dead >= PURGE_AT * len(documents) and _promoting.acquire(blocking=False):
+        try:
+            return _purge_snapshot()
+        except Exception as e:
+            print(f"⚠️ Tombstone purge failed, compacting without it: {e}", flush=True)
+        finally:
+            _promoting.release()
+    return _snapshot()
+
+
+def _maybe_compact():
+    if _store.needs_compaction():
+        _store.compact_async(_compaction_snapshot)
+
+
+# held while the index is rebuilt (promotion or tombstone purge)
+_promoting = threading.Lock()
+
+
+def _promote_index():
+    """Rebuild the flat index as the configured ANN backend / vector storage, then swap it in."""
+    global index, index_version
     try:
-        index = faiss.read_index(FAISS_PATH)
-        with open(DOCS_JSON, 'r', encoding='utf-8') as f:
-            docs = json.load(f)
-            documents.extend(docs)
-    except Exception:
-        # fallback to rebuilding from DB
+        # fold pending deltas so the base's exact vectors cover (almost) everything
+        _store.compact(_snapshot)
+        base = _store.base_vectors()
+        if base is None:
+            print("⚠️ ANN promotion skipped: no exact vectors on disk", flush=True)
+            return
+        n0 = len(base)
+        backend, storage = ann.promotion_target(n0)
+        target = f"{backend}/{storage}"
+        t0 = time.time()
+        print(f"🚀 Promoting index to {target} ({n0} vectors)", flush=True)
+        promoted = ann.build_index(backend, base, storage=storage)
+        with _index_lock:
+            # catch up on vectors added while the new index was being built
+            if index.ntotal > n0:
+                promoted.add(_exact.rows(np.arange(n0, index.ntotal)) if len(_exact) >= index.ntotal
+                             else index.reconstruct_n(n0, index.ntotal - n0))
+            with _search_lock.write():
+                index = promoted
+            index_version += 1
+            _result_cache.clear()
+        print(f"✅ Index promoted to {target} in {time.time() - t0:.1f}s "
+              f"({ann.describe(index)['mb_per_million']} MB per million chunks)", flush=True)
+        # persist the promoted index as the new base so restarts load it directly
+        _store.compact(_snapshot)
+    except Exception as e:
+        print(f"⚠️ Index promotion failed, staying on the current index: {e}", flush=True)
+    finally:
+        _promoting.release()
+
+
+def _maybe_promote():
+    if ann.should_promote(index) and _promoting.acquire(blocking=False):
+        threading.Thread(target=_promote_index, name="index-promotion", daemon=True).start()
+
+
+def _recover_keywords():
+    """Load the persisted postings for the base and index the replayed delta chunks."""
+    global keywords
+    try:
+        data = _store.read_sidecar("postings.npz")
+        keywords = InvertedIndex.from_bytes(data) if data else InvertedIndex()
+    except Exception as e:
+        print(f"⚠️ Keyword index unreadable, rebuilding: {e}", flush=True)
+        keywords = InvertedIndex()
+    if len(keywords) > len(documents):
+        keywords = InvertedIndex()
+    keywords.add_chunks(documents.rows(len(keywords)), start=len(keywords))
+
+
+def _recover_index():
+    """Load the segment log, migrating the legacy snapshot or rebuilding from the DB if needed."""
+    global index, keywords
+    if _store.exists():
+        try:
+            index, chunks = _store.recover(lambda: ann.initial_index(EMBED_DIM))
+            ann.tune(index)
+            base = _store.base_vectors()
+            if base is None and _store.read_manifest().get("base"):
+                print("⚠️ Base snapshot has no exact vectors; lossy results are not re-scored", flush=True)
+                _exact.reset()
+            else:
+                _exact.reset(([base] if base is not None else []) + _store.delta_vectors())
+            documents.clear()
+            if _store.read_manifest().get("base"):
+                paths = _chunk_paths()
+                if paths is None:
+                    raise ValueError("base snapshot has no chunk store")
+                documents.open_base(paths)
+            documents.extend(chunks)
+            if len(documents) != index.ntotal:
+                raise ValueError(f"{index.ntotal} vectors but {len(documents)} chunks")
+            _recover_keywords()
+            return
+        except Exception as e:
+            print(f"⚠️ Index log recovery failed, rebuilding from DB: {e}", flush=True)
+            index = ann.initial_index(EMBED_DIM)
+            keywords = InvertedIndex()
+            documents.clear()
+            _exact.reset()
+            _load_from_db(rebuild_index=True)
+    elif os.path.exists(FAISS_PATH) and os.path.exists(DOCS_JSON):
+        try:
+            index = faiss.read_index(FAISS_PATH)
+            if ann.storage_kind(index) == "fp32" and ann.index_kind(index) == "flat":
+                _exact.reset([index.reconstruct_n(0, index.ntotal)] if index.ntotal else [])
+            with open(DOCS_JSON, 'r', encoding='utf-8') as f:
+                documents.extend(json.load(f))  # per-chunk "raw" is dropped; it stays in the DB
+            keywords.add_chunks(documents)
+        except Exception:
+            # fallback to rebuilding from DB
+            index = ann.initial_index(EMBED_DIM)
+            keywords = InvertedIndex()
+            documents.clear()
+            _exact.reset()
+            _load_from_db(rebuild_index=True)
+    else:
         _load_from_db(rebuild_index=True)
-else:
-    _load_from_db(rebuild_index=True)
+
+    # seed the log with a base snapshot of whatever we loaded
+    try:
+        _store.reset()
+        _store.compact(_snapshot)
+    except Exception as e:
+        print(f"⚠️ Failed to write index base snapshot: {e}", flush=True)
+
+
+def _reconcile_with_db():
+    """Tombstone chunks of documents deleted in the DB; index DB documents missing from the index.
+
+    The DB is the source of truth: a crash between a DB commit and the index
+    segment write is repaired here instead of leaving a document unsearchable.
+    """
+    global _dead
+    db = SessionLocal()
+    try:
+        ids = db.query(DBDocument.id, func.length(func.trim(DBDocument.clean)) > 0).filter(DBDocument.deleted_at.is_(None)).all()
+        doc_ids = documents.column("doc_id")
+        live_ids = np.asarray(sorted(doc_id for doc_id, _ in ids), dtype=np.int64)
+        _dead = (doc_ids >= 0) & ~np.isin(doc_ids, live_ids)
+        if _dead.any():
+            print(f"🪦 {int(_dead.sum())} chunks belong to deleted documents", flush=True)
+
+        indexed = set(np.unique(doc_ids).tolist())
+        todo = [doc_id for doc_id, has_text in ids if has_text and doc_id not in indexed]
+        rows = []
+        for i in range(0, len(todo), 500):
+            rows += db.query(DBDocument.id, DBDocument.clean, DBDocument.source, DBDocument.filename,
+                             DBDocument.url, DBDocument.title).filter(DBDocument.id.in_(todo[i:i + 500])).all()
+    finally:
+        db.close()
+
+    missing = []
+    for r in sorted(rows, key=lambda r: r.id):
+        cleaned = (r.clean or "").strip()
+        if not cleaned:
+            continue
+        chunks = [cleaned[i:i+500] for i in range(0, len(cleaned), 500)]
+        missing.append({"chunks": chunks, "rows": [
+            {"clean": c, "source": r.filename or r.source, "url": r.url, "title": r.title, "doc_id": r.id} for c in chunks]})
+    if missing:
+        print(f"🩹 Indexing {len(missing)} documents found in the DB but not in the index", flush=True)
+        _append_chunks(_embed_docs(missing), [c for d in missing for c in d["rows"]])
+
+
+# ---------- lazy loading ----------
+# Nothing heavy happens at import: the index is loaded by the first call that
+# needs it (or by load_async at service start) and the model by get_model.
+_loaded = threading.Event()
+_load_lock = threading.Lock()
+# set while load_async's thread has not loaded the model yet: queries are then
+# answered from the keyword index alone instead of waiting for the model
+_model_pending = threading.Event()
+# the last model load failed: queries stay keyword-only instead of retrying it each time
+_model_failed = False
+
+
+def get_model():
+    """The sentence encoder (encoder.load), loaded and warmed up with one encode on first use."""
+    global model, index_version, _model_failed
+    if model is not None:
+        return model
+    with _model_lock:
+        if model is None:
+            try:
+                with readiness.loading("model"):
+                    m = encoder.load(MODEL_NAME)
+                    m.encode(["warm up"], show_progress_bar=False)  # first forward pass allocates
+            except Exception:
+                _model_failed = True
+                _model_pending.clear()
+                raise
+            model, _model_failed = m, False
+            # results computed without the model (keyword only) must not be served from cache
+            index_version += 1
+            _result_cache.clear()
+        _model_pending.clear()
+    return model
+
+
+def load():
+    """Load existing documents into the in-memory index (once; later calls return at once)."""
+    if _loaded.is_set():
+        return
+    with _load_lock:
+        if _loaded.is_set():
+            return
+        with readiness.loading("index"):
+            _recover_index()
+            _reconcile_with_db()
+            _maybe_promote()
+        _loaded.set()
+
+
+def is_loaded() -> bool:
+    return _loaded.is_set()
+
+
+def load_async(with_model: bool = True) -> threading.Thread:
+    """Load the index, then the model, on a background thread (service startup)."""
+    readiness.register("index", *(("model",) if with_model else ()))
+    if with_model and model is None:
+        _model_pending.set()
+
+    def run():
+        try:
+            load()
+            if with_model:
+                get_model()
+        except Exception as e:
+            print(f"❌ Background load failed: {e}", flush=True)
+
+    t = threading.Thread(target=run, name="embed-load", daemon=True)
+    t.start()
+    return t
 
 def clean_text(text):
     # remove code-like symbols and noise
@@ -85,66 +613,165 @@ def clean_text(text):
     text = re.sub(r"\s+", " ", text)
     return text.strip()
 
-def add_text(raw_text: str, cleaned_text: str = None, *, source: str = None, url: str = None, title: str = None):
-    # cleaned_text should be used for embeddings; raw_text is kept for user view
-    if cleaned_text is None:
-        cleaned_text = clean_text(raw_text or "")
+def _persist_documents(docs: list, replace_ids=()) -> list:
+    """Insert many documents (and retire the ones they replace) in one transaction; returns new ids."""
+    db = SessionLocal()
+    try:
+        if replace_ids:
+            db.query(DBDocument).filter(DBDocument.id.in_(list(replace_ids))).update(
+                {DBDocument.deleted_at: datetime.utcnow()}, synchronize_session=False)
+        rows = [DBDocument(raw=d["raw"], clean=d["clean"], source=d.get("source"), url=d.get("url"),
+                           title=d.get("title"), filename=d.get("source"), content_hash=d.get("content_hash")) for d in docs]
+        db.add_all(rows)
+        db.commit()
+        return [r.id for r in rows]
+    finally:
+        db.close()
 
-    cleaned_text = clean_text(cleaned_text)
-    # Optimal chunk size: 500 chars is good, but batch them for speed
-    chunks = [cleaned_text[i:i+500] for i in range(0, len(cleaned_text), 500)]
 
-    if not chunks:
-        return
-    # persist document and get id
-    doc_id = _persist_document(raw_text, cleaned_text, source=source, url=url, title=title, filename=source)
+def find_by_hash(content_hashes) -> dict:
+    """``{content_hash: doc_id}`` for hashes that are already indexed."""
+    content_hashes = [h for h in set(content_hashes) if h]
+    if not content_hashes:
+        return {}
+    db = SessionLocal()
     try:
-        print(f"💾 Persisted document id: {doc_id}", flush=True)
-    except Exception:
-        pass
+        rows = db.query(DBDocument.content_hash, DBDocument.id).filter(
+            DBDocument.content_hash.in_(content_hashes), DBDocument.deleted_at.is_(None)).all()
+        return {h: doc_id for h, doc_id in rows}
+    finally:
+        db.close()
+
+
+def _superseded(docs: list) -> set:
+    """Ids of older documents that ``docs`` replace: same URL but different content.
+
+    Only file-backed documents (with a hash) replace. A file name is not an
+    identity (two uploads named notice.pdf are different files), so documents
+    without a URL replace same-named ones only when they ask to (``replace``).
+    """
+    urls = {d["url"] for d in docs if d.get("content_hash") and d.get("url")}
+    names = {d["source"] for d in docs if d.get("content_hash") and d.get("replace") and not d.get("url") and d.get("source")}
+    if not urls and not names:
+        return set()
+    db = SessionLocal()
+    try:
+        q = db.query(DBDocument.id).filter(DBDocument.deleted_at.is_(None))
+        found = []
+        if urls:
+            found += q.filter(DBDocument.url.in_(urls)).all()
+        if names:
+            found += q.filter(DBDocument.url.is_(None), DBDocument.filename.in_(names)).all()
+        return {r.id for r in found}
+    finally:
+        db.close()
+
+
+def add_texts(batch: list) -> list:
+    """Index many documents at once.
+
+    ``batch`` holds dicts with ``raw`` and optional ``clean``, ``source``,
+    ``url``, ``title`` (the ``add_text`` arguments), ``content_hash``
+    (SHA-256 of the source file) and ``replace``. All documents are inserted in one DB
+    transaction, every chunk is embedded in one ``model.encode`` call and
+    the index log gets one segment for the batch.
+
+    Documents with a ``content_hash`` are deduplicated: a hash that is already
+    indexed is skipped, and a new version of the same URL replaces
+    the old one (its chunks are tombstoned) instead of accumulating. Without a
+    URL, a document replaces live ones with the same ``source`` only if
+    ``replace`` is true (e.g. a watched folder, where the name is the file).
+    Returns document ids in input order (the existing id for skipped
+    duplicates, None for empty documents).
+    """
+    load()
+    t0 = time.perf_counter()
+    ids = [None] * len(batch)
+    known = find_by_hash(item.get("content_hash") for item in batch)
+    docs = []
+    positions = []
+    seen = set()
+    for pos, item in enumerate(batch):
+        sha = item.get("content_hash")
+        if sha and sha in known:
+            if known[sha] is not None:
+                ids[pos] = int(known[sha])
+            continue
+        raw_text = item.get("raw") or ""
+        cleaned_text = item.get("clean")
+        if cleaned_text is None:
+            cleaned_text = clean_text(raw_text)
+        cleaned_text = clean_text(cleaned_text)
+        # Optimal chunk size: 500 chars is good, but batch them for speed
+        chunks = [cleaned_text[i:i+500] for i in range(0, len(cleaned_text), 500)]
+        if not chunks:
+            continue
+        if sha:
+            known[sha] = None  # same file twice in one batch
+        seen.add(pos)
+        docs.append({"raw": raw_text, "clean": cleaned_text, "source": item.get("source"),
+                     "url": item.get("url"), "title": item.get("title"), "content_hash": sha,
+                     "replace": bool(item.get("replace")), "chunks": chunks})
+        positions.append(pos)
+    # duplicates within the batch point at the first copy's id once it is known
+    dup_positions = [pos for pos, item in enumerate(batch)
+                     if item.get("content_hash") and ids[pos] is None and pos not in seen]
 
-    # OPTIMIZATION: Batch encode all chunks at once (much faster than one-by-one)
-    # show_progress_bar=False for speed, batch_size tuned for GPU/CPU balance
-    embeddings = model.encode(chunks, show_progress_bar=False, batch_size=32)
+    if not docs:
+        return ids
 
-    index.add(np.array(embeddings).astype("float32"))
-    # store dict entries mapping cleaned chunk to the full raw document and doc_id
-    for c in chunks:
-        documents.append({"clean": c, "raw": raw_text, "source": source, "url": url, "title": title, "doc_id": doc_id})
+    # persist documents (replacing older versions of the same file) and get ids
+    replaced = _superseded(docs)
+    doc_ids = _persist_documents(docs, replaced)
+    for pos, doc_id in zip(positions, doc_ids):
+        ids[pos] = int(doc_id)
+    by_hash = {d["content_hash"]: doc_id for d, doc_id in zip(docs, doc_ids) if d["content_hash"]}
+    for pos in dup_positions:
+        ids[pos] = by_hash.get(batch[pos].get("content_hash"))
 
-    print("📌 Chunks added:", len(chunks))
+    vectors = _embed_docs(docs)
+    # chunk rows point at the persisted document by doc_id; raw text is read back from the DB
+    new_chunks = [{"clean": c, "source": d["source"], "url": d["url"], "title": d["title"], "doc_id": doc_id}
+                  for d, doc_id in zip(docs, doc_ids) for c in d["chunks"]]
+
+    _append_chunks(vectors, new_chunks, replaced)
+    elapsed = time.perf_counter() - t0
+    print(f"💾 Persisted documents: {len(docs)} (ids {doc_ids[0]}..{doc_ids[-1]})", flush=True)
+    print("📌 Chunks added:", len(new_chunks), f"({len(new_chunks) / max(elapsed, 1e-9):.1f} chunks/s)")
     print("📌 Total documents:", len(documents))
     print("📌 FAISS vectors:", index.ntotal)
-    # persist faiss index and document metadata for fast restart
+
+    _maybe_compact()
+    _maybe_promote()
+    return ids
+
+
+def delete_document(doc_id: int) -> bool:
+    """Mark a document deleted in the DB and tombstone its chunks; False if it did not exist."""
+    global index_version
+    db = SessionLocal()
     try:
-        os.makedirs(DATA_DIR, exist_ok=True)
-        # atomic save for FAISS index and documents metadata
-        tmp_idx = FAISS_PATH + ".tmp"
-        tmp_docs = DOCS_JSON + ".tmp"
-        faiss.write_index(index, tmp_idx)
-        with open(tmp_docs, 'w', encoding='utf-8') as f:
-            json.dump(documents, f, ensure_ascii=False)
-        # replace atomically
-        try:
-            os.replace(tmp_idx, FAISS_PATH)
-        except Exception:
-            # fallback to write_index directly
-            faiss.write_index(index, FAISS_PATH)
-        try:
-            os.replace(tmp_docs, DOCS_JSON)
-        except Exception:
-            with open(DOCS_JSON, 'w', encoding='utf-8') as f:
-                json.dump(documents, f, ensure_ascii=False)
+        deleted = db.query(DBDocument).filter(DBDocument.id == int(doc_id), DBDocument.deleted_at.is_(None)).update(
+            {DBDocument.deleted_at: datetime.utcnow()}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+    if not deleted:
+        return False
+    with _index_lock:
+        n = _mark_deleted([int(doc_id)])
+        index_version += 1
+        _result_cache.clear()
+    print(f"🗑️ Deleted document {doc_id} ({n} chunks tombstoned)", flush=True)
+    return True
 
-        # write a meta file with timestamp for version tracking
-        meta = {"saved_at": datetime.utcnow().isoformat() + "Z", "count": len(documents), "vectors": index.ntotal}
-        with open(os.path.join(DATA_DIR, 'faiss_meta.json'), 'w', encoding='utf-8') as mf:
-            json.dump(meta, mf)
-    except Exception:
-        pass
 
-    # return the persisted document id for callers that need the integer result
-    return int(doc_id) if doc_id is not None else None
+def add_text(raw_text: str, cleaned_text: str = None, *, source: str = None, url: str = None, title: str = None,
+             content_hash: str = None):
+    # cleaned_text should be used for embeddings; raw_text is kept for user view
+    # returns the persisted document id for callers that need the integer result
+    return add_texts([{"raw": raw_text, "clean": cleaned_text, "source": source, "url": url, "title": title,
+                       "content_hash": content_hash}])[0]
 
 
 def _refine_text(text: str, max_length: int = 300) -> str:
@@ -194,158 +821,143 @@ def _refine_text(text: str, max_length: int = 300) -> str:
     
     return refined
 
-def _calculate_relevance_score(query_words: list, doc_text: str, semantic_sim: float, title: str = None) -> float:
+def _calculate_relevance_score(fused_score, title_hit):
     """
-    OPTIMIZED relevance scoring - fast (3 signals instead of 6)
-    Returns a combined score in range [0.0, 1.0]
+    Ranking key in [0.0, 1.0]: the fused semantic/BM25 rank score plus a
+    title-match bonus. Works elementwise on NumPy arrays of candidates.
     """
-    # OPTIMIZATION: Use only fast signals, skip expensive computations
-    # Signal 1: Semantic Similarity (75% weight - primary signal)
-    semantic_score = min(semantic_sim, 1.0)
-
-    # Signal 2: Exact Term Matching (20% weight - fast check)
-    doc_lower = doc_text.lower() if doc_text else ""
-    if query_words:
-        matches = sum(1 for w in query_words if w in doc_lower)
-        exact_score = min(matches / len(query_words), 1.0)
-    else:
-        exact_score = 0.0
+    return (1.0 - WEIGHT_TITLE) * fused_score + WEIGHT_TITLE * title_hit
 
-    # Signal 3: Title Match Bonus (5% weight - optional boost)
-    title_score = 0.0
-    if title and query_words:
-        title_lower = title.lower()
-        if any(w in title_lower for w in query_words):
-            title_score = 0.3  # Simple boost if any word matches
 
-    # Fast weighted combination
-    combined = (0.75 * semantic_score) + (0.20 * exact_score) + (0.05 * title_score)
+def _quality_score(semantic_sim, coverage, title_hit, has_semantic):
+    """
+    Absolute relevance in [0.0, 1.0] from the raw signals, gated by MIN_RELEVANCE
+    and returned as ``score``: 75% embedding similarity, 20% share of query
+    terms present, 5% title match. Candidates without a semantic similarity
+    (keyword-only mode) are scored on the lexical signals alone.
+    """
+    lexical = 0.20 * coverage + 0.05 * title_hit
+    return np.where(has_semantic, 0.75 * semantic_sim + lexical, lexical / 0.25)
 
-    return combined
 
+def _exact_sims(q_vec, ids: np.ndarray):
+    """Embedding similarity (as for FAISS hits) of ``ids`` to ``q_vec``, or None without exact vectors."""
+    # rows line up with chunk ids only when the exact vectors cover the whole index
+    # (after recovering a base without vectors they restart at row 0, see _recover_index)
+    if q_vec is None or not len(ids) or len(_exact) != index.ntotal:
+        return None
+    d = ((_exact.rows(ids) - np.asarray(q_vec, dtype=np.float32)) ** 2).sum(axis=1)
+    return 1.0 / (1.0 + d)
 
-def _levenshtein_distance(a: str, b: str) -> int:
-    """Compute Levenshtein distance between two strings (pure Python)."""
-    if a == b:
-        return 0
-    la, lb = len(a), len(b)
-    if la == 0:
-        return lb
-    if lb == 0:
-        return la
-
-    prev = list(range(lb + 1))
-    for i, ca in enumerate(a, start=1):
-        cur = [i] + [0] * lb
-        for j, cb in enumerate(b, start=1):
-            add = prev[j] + 1
-            delete = cur[j - 1] + 1
-            replace = prev[j - 1] + (0 if ca == cb else 1)
-            cur[j] = min(add, delete, replace)
-        prev = cur
-    return prev[lb]
-
-
-def _levenshtein_ratio(a: str, b: str) -> float:
-    """Return similarity ratio in [0.0, 1.0] (1.0 = identical)."""
-    a = (a or "").lower()
-    b = (b or "").lower()
-    max_len = max(len(a), len(b))
-    if max_len == 0:
-        return 1.0
-    dist = _levenshtein_distance(a, b)
-    return 1.0 - (dist / max_len)
-
-
-def _token_fuzzy_in_text(token: str, text: str, threshold: float = None) -> bool:
-    """Check if token fuzzy-matches any word in text using ratio threshold."""
-    if not token or not text:
-        return False
-    token = token.lower()
-    words = re.findall(r"\w+", text.lower())
-    # fast exact check first
-    if token in text:
-        return True
-    # check compact matches
-    compact_token = re.sub(r"\W+", "", token)
-    compact_text = re.sub(r"\W+", "", text.lower())
-    if compact_token and compact_token in compact_text:
-        return True
-
-    if threshold is None:
-        threshold = FUZZY_THRESHOLD
-
-    for w in words:
-        # skip very short words to avoid noise
-        if len(w) < 3 or len(token) < 3:
-            continue
-        if _levenshtein_ratio(token, w) >= threshold:
-            return True
-    return False
 
+def encode_query(query: str) -> np.ndarray:
+    """(1, dim) float32 embedding for a query, served from the LRU cache when possible."""
+    return encode_queries([query])
 
-def retrieve(query: str, k: int = 5) -> list:
+
+def encode_queries(queries: list) -> np.ndarray:
+    """(n, dim) float32 embeddings; cache misses are encoded in a single model.encode call."""
+    out = np.zeros((len(queries), EMBED_DIM), dtype="float32")
+    missing = []
+    for i, q in enumerate(queries):
+        cached = _query_cache.get(normalize_query(q))
+        if cached is None:
+            missing.append(i)
+        else:
+            out[i] = cached[0]
+    if missing:
+        embs = np.array(get_model().encode([queries[i] for i in missing], show_progress_bar=False)).astype("float32")
+        for i, emb in zip(missing, embs):
+            out[i] = emb
+            _query_cache.put(normalize_query(queries[i]), emb.reshape(1, -1))
+    return out
+
+
+def cache_stats() -> dict:
+    return {
+        "index_version": index_version,
+        "query_embeddings": _query_cache.stats(),
+        "results": _result_cache.stats(),
+    }
+
+
+def _num_candidates(k: int) -> int:
+    try:
+        total = int(index.ntotal)
+    except Exception:
+        total = 0
+    return min(max(k * CANDIDATES_PER_K, 15), total if total > 0 else 15, MAX_CANDIDATES)
+
+
+def _search(q_arr: np.ndarray, width: int):
+    """``index.search`` for ``width`` candidates per query.
+
+    A lossy index (int8 / pq storage) is searched for RESCORE_FACTOR times as
+    many; those are re-scored with exact L2 distances and the best ``width``
+    kept, so MIN_SEMANTIC_SIM still sees exact distances.
     """
-    Advanced multi-stage retriever with strict relevance filtering.
-    
-    Stages:
-    1. Semantic retrieval (FAISS) - get candidates
-    2. Re-ranking with comprehensive scoring
-    3. Quality filtering - only top matches
-    4. Deduplication and formatting
-    
-    Returns list of top-k highly relevant results
+    idx = index
+    if RESCORE_FACTOR <= 0 or ann.storage_kind(idx) not in ann.LOSSY or len(_exact) < idx.ntotal:
+        return idx.search(q_arr, width)
+    _, cand = idx.search(q_arr, width * RESCORE_FACTOR)
+    distances = np.full((len(q_arr), width), np.finfo(np.float32).max, dtype="float32")
+    indices = np.full((len(q_arr), width), -1, dtype=np.int64)
+    for row, q in enumerate(q_arr):
+        ids = cand[row][cand[row] >= 0]
+        d = ((_exact.rows(ids) - q) ** 2).sum(axis=1)
+        top = np.argsort(d, kind="stable")[:width]
+        distances[row, :len(top)] = d[top]
+        indices[row, :len(top)] = ids[top]
+    return distances, indices
+
+
+def _result_key(result: dict):
+    """De-duplication key: one result per document (file names are not unique).
+
+    Crawled documents are identified by their URL (/2024/notice.pdf and
+    /2025/notice.pdf are different documents), everything else by doc_id.
     """
-    if index.ntotal == 0 or len(documents) == 0:
-        return []
+    if result.get('url'):
+        return 'url', result['url']
+    doc_id = result.get('doc_id')
+    return ('doc', doc_id) if doc_id is not None else ('source', result.get('source') or result.get('title'))
 
-    # Pre-filter: OPTIMIZED - only exact phrase matching (NO expensive fuzzy matching)
-    # Fuzzy matching is too slow for large datasets; use semantic search instead
+
+def _prefilter(query: str, k: int):
+    """Keyword pre-filter stage of retrieve.
+
+    Returns ``(early_results, pre_filtered_exact)``: ``early_results`` is a
+    complete top-k list when exact matches alone fill it, else None.
+    """
+    # Pre-filter: inverted keyword index over the full corpus (no linear scan).
+    # Chunks containing every query token (text or title; a misspelled token also
+    # matches its fuzzy neighbours) qualify; exact phrase hits come first.
     normalized_query = (query or "").strip().lower()
     query_tokens = [w for w in re.findall(r"\w+", normalized_query) if w]
     exact_results = []
     pre_filtered_exact = []
 
-    # OPTIMIZATION: Fast exact-only pre-filter (skip fuzzy to save time)
-    if normalized_query and len(documents) < 10000:  # Only pre-filter if reasonable size
-        MAX_PREFILTER_DOCS = min(len(documents), 5000)  # Scan max 5000 docs for speed
-        for i, doc in enumerate(documents):
-            if i >= MAX_PREFILTER_DOCS:
-                break  # Stop if too many docs scanned
-            try:
-                doc_id = doc.get('doc_id')
-                clean_text = (doc.get('clean') or "").lower()
-                title = (doc.get('title') or doc.get('source') or "").lower()
-
-                # OPTIMIZATION: Only check exact phrase and token presence (no fuzzy)
-                phrase_present = normalized_query in clean_text or normalized_query in title
-                
-                tokens_present = False
-                if query_tokens and len(query_tokens) > 0:
-                    # Simple exact token match only (fast)
-                    ok = all((t in clean_text or t in title) for t in query_tokens)
-                    tokens_present = ok
-
-                if phrase_present or tokens_present:
-                    exact_results.append({
-                        'doc_id': doc_id,
-                        'score': 0.99,
-                        'semantic_sim': 1.0,
-                        'clean': doc.get('clean', ""),
-                        'raw': doc.get('raw', ""),
-                        'source': doc.get('source'),
-                        'url': doc.get('url'),
-                        'title': doc.get('title') or doc.get('source') or "",
-                    })
-            except Exception:
+    if query_tokens:
+        for idx in keywords.search(query_tokens, limit=20, live=_live, fuzzy=FUZZY_THRESHOLD):  # Limit pre-filter to 20
+            if idx >= len(documents):
                 continue
+            doc = documents[idx]
+            exact_results.append({
+                'doc_id': doc.get('doc_id'),
+                'score': 0.99,
+                'semantic_sim': 1.0,
+                'clean': doc.get('clean', ""),
+                'source': doc.get('source'),
+                'url': doc.get('url'),
+                'title': doc.get('title') or doc.get('source') or "",
+            })
 
         # OPTIMIZATION: Return early if exact matches found (avoid expensive FAISS search)
         if exact_results:
             seen = set()
             ordered = []
-            for r in exact_results[:min(len(exact_results), 20)]:  # Limit pre-filter to 20
-                key = r.get('source') or r.get('title') or str(r.get('doc_id'))
+            for r in exact_results:
+                key = _result_key(r)
                 if key in seen:
                     continue
                 seen.add(key)
@@ -353,34 +965,57 @@ def retrieve(query: str, k: int = 5) -> list:
                 r['snippet'] = r['clean']
                 ordered.append(r)
                 if len(ordered) >= k:
-                    return ordered[:k]
+                    return ordered[:k], ordered
             # keep exact matches to merge with semantic candidates later
             pre_filtered_exact = ordered
-    else:
-        pre_filtered_exact = []
-    
-    # Stage 1: Semantic Retrieval
-    # OPTIMIZATION: Reduced candidate count for faster search (50 instead of 200)
-    # Most relevant results appear in top candidates anyway
-    try:
-        total = int(index.ntotal)
-    except Exception:
-        total = 0
-    # cap candidates to a smaller bound for SPEED - typically only need top 10-20
-    MAX_CANDIDATES = 50  # REDUCED from 200 for 4x faster search
-    num_candidates = min(max(k * 5, 15), total if total > 0 else 15, MAX_CANDIDATES)
+    return None, pre_filtered_exact
+
+
+def _rank(query: str, k: int, distances, indices, pre_filtered_exact: list, q_vec=None) -> list:
+    """Ranking stages of retrieve for one query, given its FAISS result row."""
+    return list(_rank_iter(query, k, distances, indices, pre_filtered_exact, q_vec))
+
+
+def _rank_iter(query: str, k: int, distances, indices, pre_filtered_exact: list, q_vec=None):
+    """``_rank`` as a generator: final results one at a time, each refined just before it is yielded.
+
+    ``q_vec`` is the query embedding, used to score BM25 candidates that are
+    not among the FAISS hits (None in keyword-only mode).
+    """
+    # Stage 1 (cont.): semantic candidates from the FAISS row, lexical ones from BM25
+    n_docs = len(documents)
+    sem_ids = np.asarray(indices).astype(np.int64)
+    valid = (sem_ids >= 0) & (sem_ids < n_docs)
+    valid[valid] = _live(sem_ids[valid])  # drop chunks of deleted / replaced documents
+    sem_ids = sem_ids[valid]
+    # Convert L2 distance to similarity (0-1 range)
+    sem_sims = 1.0 / (1.0 + np.asarray(distances)[valid].astype(np.float32))
 
-    # encode query (disable progress bar on CPU) and guard against encoder failures
-    try:
-        q_emb = model.encode([query], show_progress_bar=False)
-        q_arr = np.array(q_emb).astype("float32")
-        distances, indices = index.search(q_arr, num_candidates)
-    except Exception:
-        # on failure, return empty quickly instead of crashing or timing out
-        return []
-    
-    # Stage 2: Parse query and prepare for ranking
     query_words = [w.lower() for w in re.findall(r"\w+", query)]
+    # lexical-only ranking (no FAISS row) still takes the usual candidate count
+    lex_ids, lex_scores = ranking.bm25_top(keywords, query_words, len(indices) or _num_candidates(k))
+    valid = (lex_ids < n_docs) & _live(lex_ids)
+    lex_ids, lex_scores = lex_ids[valid], lex_scores[valid]
+
+    # Stage 2: Rank fusion over the candidate union (vectorized)
+    cand_ids, fused = ranking.fuse([sem_ids, lex_ids], [sem_sims, lex_scores], [WEIGHT_SEMANTIC, WEIGHT_EXACT])
+    cand_sem = ranking.align(cand_ids, sem_ids, sem_sims, fill=-1.0)
+    cand_lex = ranking.align(cand_ids, lex_ids, lex_scores)
+    title_hit = keywords.title_hits(cand_ids, query_words)
+    relevance = _calculate_relevance_score(fused, title_hit)
+    # BM25-only candidates: their own embedding similarity, not "0 because FAISS didn't list them"
+    missing = cand_sem < 0
+    if missing.any():
+        sims = _exact_sims(q_vec, cand_ids[missing])
+        cand_sem[missing] = sims if sims is not None else 0.0
+        has_semantic = ~missing if sims is None else np.ones(len(cand_ids), dtype=bool)
+    else:
+        has_semantic = np.ones(len(cand_ids), dtype=bool)
+    # exact-term signal: share of query tokens present (text, title or prefix) per candidate
+    terms = list(dict.fromkeys(query_words))
+    coverage = keywords.term_matrix(cand_ids, terms, fuzzy=FUZZY_THRESHOLD).mean(axis=1) if terms else np.zeros(len(cand_ids))
+    quality = _quality_score(cand_sem, coverage, title_hit, has_semantic)
+
     # Heuristic: treat multi-token short queries as name-like and require token/fuzzy matches
     is_name_query = False
     try:
@@ -389,79 +1024,44 @@ def retrieve(query: str, k: int = 5) -> list:
     except Exception:
         is_name_query = False
     
-    # Stage 3: Re-rank all candidates with comprehensive scores
-    scored_results = []
-    for dist, idx in zip(distances[0], indices[0]):
-        if idx < 0 or idx >= len(documents):
-            continue
-            
-        doc = documents[idx]
-        doc_id = doc.get('doc_id')
-        clean_text = doc.get('clean', "")
-        title = doc.get('title') or doc.get('source') or ""
-        
-        # Convert L2 distance to similarity (0-1 range)
-        try:
-            semantic_sim = 1.0 / (1.0 + float(dist))
-        except Exception:
-            semantic_sim = 0.0
-        
-        # OPTIMIZATION: Skip expensive token checking - let semantic search handle it
-        # Semantic similarity is good enough for relevance, no need for fuzzy token matching
-        # This speeds up re-ranking significantly
-        candidate_tokens_present = True  # Assume tokens present, semantic score is primary signal
-
-        # OPTIMIZATION: Simplify quality filtering (STRICT thresholds for relevance)
-        # Calculate relevance score
-        relevance_score = _calculate_relevance_score(query_words, clean_text, semantic_sim, title)
-        
-        # STRICT FILTERING: Only return HIGHLY RELEVANT results
-        # High semantic similarity (meaningful embedding match)
-        min_semantic = semantic_sim > 0.45  # INCREASED from 0.25 → Only strong semantic matches
-        
-        # Has exact query terms present
-        has_exact_terms = any(w in clean_text.lower() for w in query_words) if query_words else False
-        
-        # Accept only if BOTH conditions met or very high overall score
-        if not (min_semantic or has_exact_terms):
-            continue  # STRICT: Skip results without semantic OR exact match
-        
-        # Also require minimum relevance score (STRICT)
-        if relevance_score < 0.35:  # INCREASED from 0.15 → Skip low-quality results
-            continue  # Skip very low scores - results must be actually relevant
-        
-        scored_results.append({
-            'doc_id': doc_id,
-            'score': relevance_score,
-            'semantic_sim': semantic_sim,
-            'clean': clean_text,
-            'raw': doc.get('raw', ""),
-            'source': doc.get('source'),
-            'url': doc.get('url'),
-            'title': title,
-        })
-    
-    # Stage 5: Sort by relevance score (descending)
-    scored_results.sort(key=lambda x: -x['score'])
-    
-    # Stage 6: De-duplication by document source
+    # Stage 3: Quality filtering of the fused candidates (one mask over all of them)
+    # STRICT FILTERING: strong embedding match OR query terms present
+    keep = (cand_sem > MIN_SEMANTIC_SIM) | (cand_lex > 0) | (coverage > 0)
+    keep &= quality >= MIN_RELEVANCE
+    cand_ids, relevance, cand_sem, quality = cand_ids[keep], relevance[keep], cand_sem[keep], quality[keep]
+
+    # Stage 4: De-duplication by document
     seen_sources = set()
-    final_results = []
+    emitted = 0
     # If this was a strict name query and we found no candidates, return empty
-    if is_name_query and not scored_results and not pre_filtered_exact:
-        return []
+    if is_name_query and not len(cand_ids) and not pre_filtered_exact:
+        return
     # If we have prioritized exact matches, add them first
     if pre_filtered_exact:
         for result in pre_filtered_exact:
-            source_key = result.get('source') or result.get('title') or str(result.get('doc_id'))
+            source_key = _result_key(result)
             if source_key in seen_sources:
                 continue
             seen_sources.add(source_key)
-            final_results.append(result)
-            if len(final_results) >= k:
-                return final_results[:k]
-    for result in scored_results:
-        source_key = result.get('source') or result.get('title') or str(result.get('doc_id'))
+            yield result
+            emitted += 1
+            if emitted >= k:
+                return
+    # Stage 5: descending relevance via argpartition windows; rows are read only
+    # for candidates actually scanned (the loop stops once k sources are out)
+    for pos in ranking.iter_top(relevance, 2 * (k - emitted)):
+        doc = documents[int(cand_ids[pos])]
+        result = {
+            'doc_id': doc.get('doc_id'),
+            'score': float(quality[pos]),
+            'rank_score': float(relevance[pos]),
+            'semantic_sim': float(cand_sem[pos]),
+            'clean': doc.get('clean', ""),
+            'source': doc.get('source'),
+            'url': doc.get('url'),
+            'title': doc.get('title') or doc.get('source') or "",
+        }
+        source_key = _result_key(result)
         if source_key in seen_sources:
             continue
         seen_sources.add(source_key)
@@ -471,12 +1071,203 @@ def retrieve(query: str, k: int = 5) -> list:
         result['clean'] = refined_clean
         result['snippet'] = refined_clean
         
-        final_results.append(result)
+        yield result
+        emitted += 1
         
-        if len(final_results) >= k:
-            break
-    
-    return final_results
+        if emitted >= k:
+            return
+
+
+def _attach_raw(result_lists: list):
+    """Fill ``raw`` (the full document text) on returned results with one DB query."""
+    need = {r['doc_id'] for results in result_lists for r in results
+            if 'raw' not in r and r.get('doc_id') is not None}
+    raw = {}
+    if need:
+        db = SessionLocal()
+        try:
+            raw = dict(db.query(DBDocument.id, DBDocument.raw).filter(DBDocument.id.in_(need)).all())
+        except Exception as e:
+            print(f"⚠️ Failed to load document text: {e}", flush=True)
+        finally:
+            db.close()
+    for results in result_lists:
+        for r in results:
+            r.setdefault('raw', raw.get(r.get('doc_id')) or "")
+
+
+def retrieve_batch(queries: list, timings: dict = None) -> list:
+    """
+    Advanced multi-stage retriever with strict relevance filtering, for a
+    batch of ``(query, k)`` pairs. Results come back in input order.
+
+    Stages:
+    0. Keyword pre-filter (inverted index) - may answer a query outright
+    1. Semantic retrieval (FAISS) - one model.encode and one index.search for the batch
+    2. BM25 lexical retrieval + rank fusion with the semantic list
+    3. Quality filtering - only top matches
+    4. Deduplication and formatting (full document text is read from the DB
+       only for the results returned)
+
+    Results are cached per (query, k, index version).
+
+    Pass a dict as ``timings`` to receive milliseconds per shared stage
+    (``encode_ms``, ``search_ms``, ``attach_ms``) and, under ``queries``, one
+    dict per query with the path that answered it (``cache``, ``keyword``,
+    ``semantic``, ``lexical`` or ``error``) and its own ``prefilter_ms`` /
+    ``rank_ms``.
+
+    While load_async is still loading the model (or after it failed to
+    load), queries skip the semantic stage (path ``lexical``: pre-filter +
+    BM25 only). If encoding or the index search fails, the affected queries
+    return no results (path ``error``). Neither is cached.
+    """
+    load()
+    out = [None] * len(queries)
+    per_query = [{"path": "empty", "prefilter_ms": 0.0, "rank_ms": 0.0} for _ in queries]
+    if timings is not None:
+        timings.update(queries=per_query, encode_ms=0.0, search_ms=0.0, attach_ms=0.0)
+    if index.ntotal == 0 or len(documents) == 0:
+        return [[] for _ in queries]
+
+    version = index_version
+    pending = []
+    # keyword index, chunk store and FAISS index are read under _search_lock so
+    # a concurrent add_texts never runs halfway through a stage (encoding and
+    # the DB read of _attach_raw stay outside it)
+    with _search_lock.read():
+        for i, (query, k) in enumerate(queries):
+            t0 = time.perf_counter()
+            cached = _result_cache.get((normalize_query(query), k, version))
+            if cached is not None:
+                out[i] = [dict(r) for r in cached]
+                per_query[i]["path"] = "cache"
+                continue
+            early, pre_filtered_exact = _prefilter(query, k)
+            per_query[i]["prefilter_ms"] = (time.perf_counter() - t0) * 1000.0
+            if early is not None:
+                out[i] = early
+                per_query[i]["path"] = "keyword"
+            else:
+                pending.append((i, pre_filtered_exact))
+
+    lexical_only = _model_pending.is_set() or _model_failed
+    if pending and lexical_only:
+        with _search_lock.read():
+            for i, pre_filtered_exact in pending:
+                query, k = queries[i]
+                t0 = time.perf_counter()
+                out[i] = _rank(query, k, np.zeros(0, dtype="float32"), np.zeros(0, dtype=np.int64), pre_filtered_exact)
+                per_query[i]["path"] = "lexical"
+                per_query[i]["rank_ms"] = (time.perf_counter() - t0) * 1000.0
+    elif pending:
+        # encode queries (disable progress bar on CPU) and guard against encoder failures
+        # on failure, return empty quickly instead of crashing or timing out
+        distances = indices = None
+        try:
+            t0 = time.perf_counter()
+            q_arr = encode_queries([queries[i][0] for i, _ in pending])
+            t1 = time.perf_counter()
+        except Exception:
+            q_arr = None
+        with _search_lock.read():
+            if q_arr is not None:
+                try:
+                    widths = [_num_candidates(queries[i][1]) for i, _ in pending]
+                    distances, indices = _search(q_arr, max(widths))
+                    if timings is not None:
+                        timings["encode_ms"] = (t1 - t0) * 1000.0
+                        timings["search_ms"] = (time.perf_counter() - t1) * 1000.0
+                except Exception:
+                    distances = indices = None
+            for row, (i, pre_filtered_exact) in enumerate(pending):
+                query, k = queries[i]
+                if indices is None:
+                    out[i] = []
+                    per_query[i]["path"] = "error"
+                    continue
+                t0 = time.perf_counter()
+                n = widths[row]
+                out[i] = _rank(query, k, distances[row][:n], indices[row][:n], pre_filtered_exact, q_arr[row])
+                per_query[i]["path"] = "semantic"
+                per_query[i]["rank_ms"] = (time.perf_counter() - t0) * 1000.0
+
+    t0 = time.perf_counter()
+    _attach_raw(out)
+    if timings is not None:
+        timings["attach_ms"] = (time.perf_counter() - t0) * 1000.0
+    for (query, k), results, t in zip(queries, out, per_query):
+        # degraded answers (no model yet, encode / search failure) must not outlive the failure
+        if t["path"] in ("keyword", "semantic"):
+            _result_cache.put((normalize_query(query), k, version), [dict(r) for r in results])
+    return out
+
+
+def retrieve_stream(query: str, k: int = 5):
+    """``retrieve`` for one query, incrementally: yields ``(stage, result)``.
+
+    Exact keyword hits from the pre-filter come first (stage ``keyword``),
+    then semantic hits one by one as they are scored and refined (stage
+    ``semantic``); a cached query yields its results with stage ``cache``.
+    The order matches ``retrieve``. The full list is cached only if the
+    generator runs to the end (a closed stream caches nothing) and the
+    semantic stage ran: keyword hits alone are not a complete answer.
+    """
+    load()
+    if index.ntotal == 0 or len(documents) == 0:
+        return
+    key = (normalize_query(query), k, index_version)
+    cached = _result_cache.get(key)
+    if cached is not None:
+        for r in cached:
+            yield "cache", dict(r)
+        return
+
+    with _search_lock.read():
+        early, pre_filtered_exact = _prefilter(query, k)
+    exact = early if early is not None else pre_filtered_exact
+    _attach_raw([exact])
+    sent = []
+    for r in exact:
+        sent.append(r)
+        yield "keyword", r
+
+    lexical_only = _model_pending.is_set() or _model_failed
+    if early is None:
+        try:
+            width = _num_candidates(k)
+            q_arr = None
+            if lexical_only:
+                distances, indices = np.zeros((1, 0), dtype="float32"), np.zeros((1, 0), dtype=np.int64)
+            else:
+                q_arr = encode_queries([query])
+                with _search_lock.read():
+                    distances, indices = _search(q_arr, width)
+        except Exception:
+            distances = indices = None
+        if indices is not None:
+            already = {id(r) for r in exact}
+            ranked = _rank_iter(query, k, distances[0][:width], indices[0][:width], pre_filtered_exact,
+                                None if q_arr is None else q_arr[0])
+            while True:
+                # the lock is held per step, never across a yield to the caller
+                with _search_lock.read():
+                    r = next(ranked, None)
+                if r is None:
+                    break
+                if id(r) in already:
+                    continue
+                _attach_raw([[r]])
+                sent.append(r)
+                yield "lexical" if lexical_only else "semantic", r
+
+    if early is not None or (not lexical_only and indices is not None):
+        _result_cache.put(key, [dict(r) for r in sent])
+
+
+def retrieve(query: str, k: int = 5) -> list:
+    """Returns list of top-k highly relevant results (see ``retrieve_batch``)."""
+    return retrieve_batch([(query, k)])[0]
 
 
 def search_text(query, k=3):
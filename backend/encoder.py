@@ -0,0 +1,244 @@
+"""Pluggable sentence encoders for embed.py.
+
+EMBED_BACKEND selects what computes chunk and query embeddings:
+
+    torch      SentenceTransformer.encode in fp32 PyTorch (default)
+    onnx       the same transformer exported to ONNX, run by ONNX Runtime
+    onnx-int8  that export with dynamic int8 quantization of its weights
+
+The ONNX files are exported from the SentenceTransformer on first use and
+kept in data/onnx/<model>/ (model.onnx, model.int8.onnx, the tokenizer and
+encoder.json with the pooling settings), so later starts load neither torch
+nor the PyTorch weights. Pooling and normalization follow the
+SentenceTransformer's own modules, so vectors from any backend are
+interchangeable up to rounding / quantization error. Each export is checked
+against the PyTorch model on PARITY_SENTENCES before it is kept (check_parity);
+scripts/encoder_report.py measures agreement on real chunks and throughput.
+
+The ONNX backends need ``pip install onnxruntime onnx`` (onnx only for the
+export); load() says so when they are missing.
+
+Every encoder has ``encode(texts, batch_size=..., show_progress_bar=...)``
+returning a float32 array, like SentenceTransformer.
+"""
+import os
+import json
+import shutil
+import threading
+import importlib.util
+
+import numpy as np
+
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch").lower()
+ONNX_DIR = os.getenv(
+    "EMBED_ONNX_DIR",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'onnx')),
+)
+# ONNX Runtime intra-op threads (0 = its default, one per core)
+ONNX_THREADS = int(os.getenv("EMBED_ONNX_THREADS", "0"))
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+# fixed sentences an export must reproduce: mean cosine to the PyTorch vectors
+# at least PARITY_MIN_MEAN[backend], and none below PARITY_MIN
+PARITY_SENTENCES = (
+    "The quarterly budget report is due on Friday.",
+    "Admission notice for the autumn semester",
+    "Examination schedule: room 204, 10:00 to 13:00",
+    "Payment of tuition fees can be made online or at the bank counter.",
+    "scholarship",
+    "The library will remain closed during the holidays.",
+    "Results of the final year project evaluation have been published on the notice board.",
+    "Contact the registrar's office for a duplicate marksheet.",
+    "network server backup storage",
+    "Students must submit the signed form along with a copy of their identity card "
+    "before the deadline, otherwise the application will not be processed.",
+)
+PARITY_MIN_MEAN = {"onnx": 0.999, "onnx-int8": 0.98}
+PARITY_MIN = 0.95
+
+_export_lock = threading.Lock()
+
+
+def cache_name(model_name: str, backend: str = None) -> str:
+    """Model identity for the embedding cache: vectors of different backends are not mixed."""
+    backend = backend or EMBED_BACKEND
+    return model_name if backend == "torch" else f"{model_name}+{backend}"
+
+
+def load(model_name: str, backend: str = None):
+    """An encoder for ``model_name`` on ``backend`` (default EMBED_BACKEND)."""
+    backend = backend or EMBED_BACKEND
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_name)
+    if backend in ("onnx", "onnx-int8"):
+        quantize = backend == "onnx-int8"
+        _require(backend, "onnxruntime", *(() if _exported(model_name, quantize) else ("onnx",)))
+        model_dir = export_onnx(model_name, quantize=quantize)
+        return OnnxEncoder(model_dir, quantized=backend == "onnx-int8")
+    raise ValueError(f"Unknown EMBED_BACKEND '{backend}' (expected one of {', '.join(BACKENDS)})")
+
+
+def _require(backend: str, *packages):
+    missing = [p for p in packages if importlib.util.find_spec(p) is None]
+    if missing:
+        raise ImportError(
+            f"EMBED_BACKEND={backend} needs {' and '.join(missing)} (not installed): "
+            f"pip install {' '.join(missing)}"
+        )
+
+
+def _model_dir(model_name: str) -> str:
+    return os.path.join(ONNX_DIR, model_name.replace("/", "__"))
+
+
+def _exported(model_name: str, quantize: bool) -> bool:
+    out = _model_dir(model_name)
+    return os.path.exists(os.path.join(out, "encoder.json")) and (
+        not quantize or os.path.exists(os.path.join(out, "model.int8.onnx")))
+
+
+def check_parity(encoder, reference, backend: str, sentences=PARITY_SENTENCES) -> np.ndarray:
+    """Assert ``encoder`` agrees with ``reference`` on ``sentences``; returns the cosines."""
+    a = np.asarray(encoder.encode(list(sentences), show_progress_bar=False), dtype=np.float32)
+    b = np.asarray(reference.encode(list(sentences), show_progress_bar=False), dtype=np.float32)
+    a /= np.clip(np.linalg.norm(a, axis=1, keepdims=True), 1e-12, None)
+    b /= np.clip(np.linalg.norm(b, axis=1, keepdims=True), 1e-12, None)
+    cos = (a * b).sum(axis=1)
+    min_mean = PARITY_MIN_MEAN.get(backend, PARITY_MIN_MEAN["onnx"])
+    if cos.mean() < min_mean or cos.min() < PARITY_MIN:
+        raise AssertionError(
+            f"{backend} encoder disagrees with PyTorch: mean cosine {cos.mean():.5f} "
+            f"(need {min_mean}), min {cos.min():.5f} (need {PARITY_MIN})"
+        )
+    return cos
+
+
+def export_onnx(model_name: str, quantize: bool = True) -> str:
+    """Export ``model_name`` to ONNX (and int8) under ONNX_DIR once; returns the directory."""
+    out = _model_dir(model_name)
+    fp32 = os.path.join(out, "model.onnx")
+    int8 = os.path.join(out, "model.int8.onnx")
+    with _export_lock:
+        if not os.path.exists(os.path.join(out, "encoder.json")):
+            _export(model_name, out)
+        if quantize and not os.path.exists(int8):
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            print(f"🗜️ Quantizing {model_name} to int8", flush=True)
+            quantize_dynamic(fp32, int8 + ".tmp", weight_type=QuantType.QInt8)
+            try:
+                # against the fp32 export, which itself passed against PyTorch
+                check_parity(OnnxEncoder(out, path=int8 + ".tmp"), OnnxEncoder(out), "onnx-int8")
+            except AssertionError:
+                os.remove(int8 + ".tmp")
+                raise
+            os.replace(int8 + ".tmp", int8)
+    return out
+
+
+def _pooling_mode(pooling) -> str:
+    mode = getattr(pooling, "pooling_mode", None)  # sentence-transformers >= 5
+    return mode if isinstance(mode, str) else pooling.get_pooling_mode_str()
+
+
+def _export(model_name: str, out: str):
+    import torch
+    from sentence_transformers import SentenceTransformer, models
+
+    print(f"📤 Exporting {model_name} to ONNX", flush=True)
+    st = SentenceTransformer(model_name, device="cpu")
+    transformer = st[0]
+    pooling = next((m for m in st if isinstance(m, models.Pooling)), None)
+    meta = {
+        "model": model_name,
+        "pooling": _pooling_mode(pooling) if pooling is not None else "mean",
+        "normalize": any(isinstance(m, models.Normalize) for m in st),
+        "max_seq_length": int(st.max_seq_length or 512),
+        "dim": int(st.get_sentence_embedding_dimension()),
+    }
+    sample = transformer.tokenizer(["an example sentence"], return_tensors="pt")
+    meta["inputs"] = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+
+    class _TokenEmbeddings(torch.nn.Module):
+        # the graph ends at the token embeddings; pooling is done in NumPy
+        def __init__(self, hf, names):
+            super().__init__()
+            self.hf, self.names = hf, names
+
+        def forward(self, *inputs):
+            return self.hf(**dict(zip(self.names, inputs))).last_hidden_state
+
+    tmp = out + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    wrapped = _TokenEmbeddings(transformer.auto_model.eval(), meta["inputs"])
+    axes = {n: {0: "batch", 1: "seq"} for n in meta["inputs"]}
+    axes["token_embeddings"] = {0: "batch", 1: "seq"}
+    with torch.no_grad():
+        torch.onnx.export(
+            wrapped, tuple(sample[n] for n in meta["inputs"]), os.path.join(tmp, "model.onnx"),
+            input_names=meta["inputs"], output_names=["token_embeddings"], dynamic_axes=axes,
+            opset_version=17, dynamo=False,
+        )
+    transformer.tokenizer.save_pretrained(tmp)
+    with open(os.path.join(tmp, "encoder.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    try:
+        check_parity(OnnxEncoder(tmp), st, "onnx")
+    except AssertionError:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    shutil.rmtree(out, ignore_errors=True)
+    os.replace(tmp, out)
+
+
+class OnnxEncoder:
+    """SentenceTransformer.encode look-alike on an exported model (see export_onnx)."""
+
+    def __init__(self, model_dir: str, quantized: bool = False, path: str = None):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(model_dir, "encoder.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.pooling = meta["pooling"]
+        self.normalize = meta["normalize"]
+        self.max_seq_length = meta["max_seq_length"]
+        self.dim = meta["dim"]
+        self.inputs = meta["inputs"]
+        self.device = "cpu"
+        opts = ort.SessionOptions()
+        if ONNX_THREADS > 0:
+            opts.intra_op_num_threads = ONNX_THREADS
+        path = path or os.path.join(model_dir, "model.int8.onnx" if quantized else "model.onnx")
+        self.session = ort.InferenceSession(path, opts, providers=["CPUExecutionProvider"])
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def _pool(self, tokens: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        if self.pooling == "cls":
+            return tokens[:, 0]
+        m = mask[..., None].astype(np.float32)
+        if self.pooling == "max":
+            return np.where(m > 0, tokens, -1e9).max(axis=1)
+        return (tokens * m).sum(axis=1) / np.clip(m.sum(axis=1), 1e-9, None)
+
+    def encode(self, sentences, batch_size: int = 32, show_progress_bar: bool = False, **kwargs) -> np.ndarray:
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+        out = np.zeros((len(sentences), self.dim), dtype=np.float32)
+        # longest first, so each batch pads to similar lengths (as SentenceTransformer does)
+        order = np.argsort([-len(s) for s in sentences], kind="stable")
+        for start in range(0, len(sentences), batch_size):
+            idx = order[start:start + batch_size]
+            enc = self.tokenizer([sentences[i] for i in idx], padding=True, truncation=True,
+                                 max_length=self.max_seq_length, return_tensors="np")
+            tokens = self.session.run(None, {n: enc[n].astype(np.int64) for n in self.inputs})[0]
+            out[idx] = self._pool(tokens, enc["attention_mask"])
+        if self.normalize:
+            out /= np.clip(np.linalg.norm(out, axis=1, keepdims=True), 1e-12, None)
+        return out[0] if single else out
@@ -0,0 +1,108 @@
+"""Content-addressed cache of extracted text and chunk embeddings.
+
+Keyed by the SHA-256 of the source file, so a re-crawled or re-uploaded
+file that has not changed costs one hash instead of OCR + embedding:
+
+    data/extract_cache/ab/abcdef....json   {"raw": ..., "clean": ...} by file hash
+    data/extract_cache/cd/cdef01....npy    float32 chunk embeddings, keyed by
+                                           model + chunk texts (embedding_key)
+
+Entries are written atomically and never modified; a missing or unreadable
+entry is just a cache miss.
+"""
+import os
+import json
+import hashlib
+
+import numpy as np
+
+CACHE_DIR = os.getenv(
+    "EXTRACT_CACHE_DIR",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'extract_cache')),
+)
+
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def embedding_key(chunks: list, model_name: str) -> str:
+    """Cache key for chunk embeddings: the model plus the exact chunk texts."""
+    h = hashlib.sha256(model_name.encode("utf-8"))
+    for c in chunks:
+        h.update(b"\0" + c.encode("utf-8"))
+    return h.hexdigest()
+
+
+def _path(sha: str, ext: str) -> str:
+    return os.path.join(CACHE_DIR, sha[:2], sha + ext)
+
+
+def _atomic_write(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def get_text(sha: str):
+    """``(raw, clean)`` extracted earlier from a file with this hash, or None."""
+    try:
+        with open(_path(sha, ".json"), "r", encoding="utf-8") as f:
+            entry = json.load(f)
+        return entry["raw"], entry["clean"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def put_text(sha: str, raw: str, clean: str):
+    try:
+        _atomic_write(_path(sha, ".json"), json.dumps({"raw": raw, "clean": clean}, ensure_ascii=False).encode("utf-8"))
+    except OSError as e:
+        print(f"⚠️ Failed to cache extracted text: {e}", flush=True)
+
+
+def get_embeddings(sha: str, n_chunks: int):
+    """Cached chunk embeddings for this hash if there are exactly ``n_chunks`` of them."""
+    try:
+        vectors = np.load(_path(sha, ".npy"))
+    except (OSError, ValueError):
+        return None
+    return vectors if len(vectors) == n_chunks else None
+
+
+def put_embeddings(sha: str, vectors):
+    try:
+        path = _path(sha, ".npy")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            np.save(f, np.ascontiguousarray(vectors, dtype="float32"))
+        os.replace(path + ".tmp", path)
+    except OSError as e:
+        print(f"⚠️ Failed to cache embeddings: {e}", flush=True)
+
+
+def extract_cached(path: str, extract_fn, sha: str = None, complete=None):
+    """``(sha256, raw, clean)`` for a file, running ``extract_fn(path, report=[])`` only on a cache miss.
+
+    The result is cached only if ``clean`` has text and ``complete(report)``
+    is true (e.g. ocr.extraction_complete), so a failed or partial extraction
+    is retried next time instead of being pinned to the file's hash.
+    """
+    sha = sha or file_sha256(path)
+    cached = get_text(sha)
+    if cached is not None:
+        print(f"⚡ Extraction cache hit: {os.path.basename(path)} ({sha[:12]})", flush=True)
+        return (sha,) + tuple(cached)
+    report = []
+    raw, clean = extract_fn(path, report=report)
+    if clean.strip() and (complete is None or complete(report)):
+        put_text(sha, raw, clean)
+    else:
+        print(f"⚠️ Extraction incomplete, not cached: {os.path.basename(path)}", flush=True)
+    return sha, raw, clean
@@ -6,7 +6,7 @@ def find(query, limit=20):
     db = SessionLocal()
     try:
         q = f"%{query}%"
-        rows = db.query(Document).filter(
+        rows = db.query(Document).filter(Document.deleted_at.is_(None)).filter(
             (Document.clean.ilike(q)) |
             (Document.raw.ilike(q)) |
             (Document.title.ilike(q)) |
@@ -0,0 +1,242 @@
+"""Durable background job queue with a bounded worker pool.
+
+Jobs are rows in the ``jobs`` table (db.Job), so they survive a restart:
+jobs that were running when the process died are queued again on start().
+``workers`` threads claim the highest-priority queued job (oldest first),
+run ``handler(job)`` and store its result; a failing job is retried with
+exponential backoff until ``max_attempts`` is reached.
+
+The handler gets a dict of the job's columns and returns a dict of
+``doc_id`` / ``message`` to store. Metrics (queue depth by status, wait and
+run latency percentiles) are exposed by stats() for /status and /job.
+"""
+import time
+import uuid
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from db import SessionLocal, Job
+
+_COLUMNS = ("id", "kind", "status", "priority", "filename", "path", "content_hash", "attempts",
+            "max_attempts", "doc_id", "message", "error", "created_at", "started_at", "completed_at")
+
+
+def _iso(dt):
+    return dt.isoformat() + "Z" if dt else None
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(q * len(values)))], 3)
+
+
+class JobQueue:
+
+    def __init__(self, handler, workers: int = 2, max_attempts: int = 3, retry_delay: float = 5.0,
+                 poll_interval: float = 1.0, on_failure=None):
+        self.handler = handler
+        # called as on_failure(job, error) once a job has used up its attempts
+        self.on_failure = on_failure
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        self._threads = []
+        self._claim_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._stop = False
+        self._stats_lock = threading.Lock()
+        self.busy = 0
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+        self._latencies = deque(maxlen=500)  # (wait_s, run_s) of recently finished jobs
+
+    # ---------- lifecycle ----------
+
+    def start(self):
+        if self._threads:
+            return
+        db = SessionLocal()
+        try:
+            # interrupted by a restart: run them again
+            n = db.query(Job).filter(Job.status == "running").update({"status": "queued"})
+            db.commit()
+        finally:
+            db.close()
+        if n:
+            print(f"↩️ Re-queued {n} interrupted jobs", flush=True)
+        self._stop = False
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        print(f"🧵 Job queue started ({self.workers} workers)", flush=True)
+
+    def stop(self):
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join(timeout=5)
+        self._threads = []
+
+    # ---------- producer side ----------
+
+    def submit(self, kind: str = "upload", priority: int = 0, **fields) -> str:
+        job_id = uuid.uuid4().hex
+        db = SessionLocal()
+        try:
+            db.add(Job(id=job_id, kind=kind, status="queued", priority=priority, max_attempts=self.max_attempts, **fields))
+            db.commit()
+        finally:
+            db.close()
+        with self._cond:
+            self._cond.notify()
+        return job_id
+
+    def get(self, job_id: str):
+        """Job as a dict (plus queue position / timings), or None."""
+        db = SessionLocal()
+        try:
+            job = db.get(Job, job_id)
+            if job is None:
+                return None
+            out = {c: getattr(job, c) for c in _COLUMNS}
+            if job.status == "queued":
+                # jobs that will be claimed before this one
+                out["queue_position"] = db.query(func.count(Job.id)).filter(
+                    Job.status == "queued",
+                    (Job.priority > job.priority) | ((Job.priority == job.priority) & (Job.created_at < job.created_at)),
+                ).scalar()
+        finally:
+            db.close()
+        if out["started_at"]:
+            out["wait_seconds"] = round((out["started_at"] - out["created_at"]).total_seconds(), 3)
+        if out["completed_at"] and out["started_at"]:
+            out["run_seconds"] = round((out["completed_at"] - out["started_at"]).total_seconds(), 3)
+        for c in ("created_at", "started_at", "completed_at"):
+            out[c] = _iso(out[c])
+        out["job_id"] = out.pop("id")
+        return out
+
+    def wait(self, job_id: str, timeout: float = None):
+        """Block until the job is done or failed (or the timeout passes); returns get(job_id)."""
+        deadline = time.monotonic() + timeout if timeout else None
+        while True:
+            job = self.get(job_id)
+            if job is None or job["status"] in ("done", "failed"):
+                return job
+            remaining = deadline - time.monotonic() if deadline else self.poll_interval
+            if remaining <= 0:
+                return job
+            with self._cond:
+                self._cond.wait(min(self.poll_interval, remaining))
+
+    def stats(self) -> dict:
+        db = SessionLocal()
+        try:
+            depth = dict(db.query(Job.status, func.count(Job.id)).group_by(Job.status).all())
+            oldest = db.query(func.min(Job.created_at)).filter(Job.status == "queued").scalar()
+        finally:
+            db.close()
+        with self._stats_lock:
+            waits = [w for w, _ in self._latencies]
+            runs = [r for _, r in self._latencies]
+            return {
+                "workers": self.workers,
+                "busy": self.busy,
+                "queued": depth.get("queued", 0),
+                "running": depth.get("running", 0),
+                "done": depth.get("done", 0),
+                "failed": depth.get("failed", 0),
+                "oldest_queued_seconds": round((datetime.utcnow() - oldest).total_seconds(), 1) if oldest else None,
+                "completed_since_start": self.completed,
+                "failed_since_start": self.failed,
+                "retries_since_start": self.retried,
+                "wait_p50": _percentile(waits, 0.5),
+                "wait_p95": _percentile(waits, 0.95),
+                "run_p50": _percentile(runs, 0.5),
+                "run_p95": _percentile(runs, 0.95),
+            }
+
+    # ---------- worker side ----------
+
+    def _claim(self):
+        with self._claim_lock:
+            db = SessionLocal()
+            try:
+                job = (
+                    db.query(Job)
+                    .filter(Job.status == "queued", Job.run_after <= datetime.utcnow())
+                    .order_by(Job.priority.desc(), Job.created_at)
+                    .first()
+                )
+                if job is None:
+                    return None
+                job.status = "running"
+                job.attempts = (job.attempts or 0) + 1
+                job.started_at = datetime.utcnow()
+                db.commit()
+                return {c: getattr(job, c) for c in _COLUMNS}
+            finally:
+                db.close()
+
+    def _finish(self, job_id, **values):
+        db = SessionLocal()
+        try:
+            db.query(Job).filter(Job.id == job_id).update(values)
+            db.commit()
+        finally:
+            db.close()
+        with self._cond:
+            self._cond.notify_all()  # wake wait()ers and idle workers (a retry may be due)
+
+    def _run(self):
+        while not self._stop:
+            job = self._claim()
+            if job is None:
+                with self._cond:
+                    if not self._stop:
+                        self._cond.wait(self.poll_interval)
+                continue
+
+            with self._stats_lock:
+                self.busy += 1
+            try:
+                result = self.handler(job) or {}
+                now = datetime.utcnow()
+                self._finish(job["id"], status="done", completed_at=now, error=None,
+                             doc_id=result.get("doc_id"), message=result.get("message"))
+                with self._stats_lock:
+                    self.completed += 1
+                    self._latencies.append((
+                        (job["started_at"] - job["created_at"]).total_seconds(),
+                        (now - job["started_at"]).total_seconds(),
+                    ))
+            except Exception as e:
+                if job["attempts"] < job["max_attempts"]:
+                    delay = self.retry_delay * (2 ** (job["attempts"] - 1))
+                    print(f"⚠️ Job {job['id']} failed (attempt {job['attempts']}), retrying in {delay:.0f}s: {e}", flush=True)
+                    self._finish(job["id"], status="queued", error=str(e),
+                                 run_after=datetime.utcnow() + timedelta(seconds=delay))
+                    with self._stats_lock:
+                        self.retried += 1
+                else:
+                    print(f"❌ Job {job['id']} failed after {job['attempts']} attempts: {e}", flush=True)
+                    self._finish(job["id"], status="failed", error=str(e), completed_at=datetime.utcnow())
+                    with self._stats_lock:
+                        self.failed += 1
+                    if self.on_failure:
+                        try:
+                            self.on_failure(job, e)
+                        except Exception:
+                            pass
+            finally:
+                with self._stats_lock:
+                    self.busy -= 1
@@ -0,0 +1,409 @@
+"""Token -> posting-list inverted index over chunk text (with positions).
+
+Replaces the linear substring scan in ``embed.retrieve``'s pre-filter.
+Chunk ids are the FAISS row ids, so postings are appended in increasing
+order and stay sorted without any re-sorting.
+
+Per token we keep three compact ``array('i')`` columns:
+    ids       chunk ids containing the token (sorted)
+    pos_off   start offset of that chunk's positions in ``positions``
+    positions token ordinals inside the chunk (for phrase checks)
+
+Title tokens go into a separate id-only posting map, so "all query tokens
+present in the chunk text or its title" keeps the old pre-filter semantics.
+Per-chunk token counts (``doc_len``) are kept for BM25 (see ranking.py).
+
+Query tokens that are not in the vocabulary at all (typos, misspelled
+names) can also be expanded to their fuzzy neighbours: a character-trigram
+index over the vocabulary narrows the candidates to terms sharing enough
+trigrams, and only those get an edit-distance check.
+"""
+import io
+import re
+import json
+import bisect
+from array import array
+
+import numpy as np
+
+from spell import edit_distance
+
+_TOKEN_RE = re.compile(r"\w+")
+
+# query tokens at least this long also match indexed tokens they prefix
+# ("exam" -> "exams", "examination"), approximating the old substring check
+PREFIX_MIN_LEN = 3
+PREFIX_EXPANSION_LIMIT = 64
+
+# fuzzy expansion: only for tokens this long (one edit in a short word is
+# a different word) and at most this many neighbours per token
+FUZZY_MIN_LEN = 5
+FUZZY_EXPANSION_LIMIT = 8
+
+# search() checks phrases over the matching chunks in id order, in blocks of
+# PHRASE_BLOCK (doubling), until it has enough phrase hits; phrase hits past
+# the first PHRASE_SCAN_MAX matching chunks are not moved forward, so a query
+# whose terms are in every chunk costs a bounded amount of work
+PHRASE_BLOCK = 256
+PHRASE_SCAN_MAX = 4096
+
+
+def tokenize(text: str) -> list:
+    return _TOKEN_RE.findall((text or "").lower())
+
+
+def _trigrams(token: str) -> set:
+    s = f"${token}$"
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+
+class _Postings:
+    __slots__ = ("ids", "pos_off", "positions")
+
+    def __init__(self):
+        self.ids = array("i")
+        self.pos_off = array("i")
+        self.positions = array("i")
+
+    def ids_array(self) -> np.ndarray:
+        return np.frombuffer(self.ids, dtype=np.int32) if len(self.ids) else np.zeros(0, dtype=np.int32)
+
+    def tf_array(self) -> np.ndarray:
+        """Term frequency per posting (number of positions in that chunk)."""
+        if not len(self.ids):
+            return np.zeros(0, dtype=np.int32)
+        off = np.frombuffer(self.pos_off, dtype=np.int32)
+        return np.diff(off, append=np.int32(len(self.positions)))
+
+    def positions_in(self, chunk_ids: np.ndarray):
+        """``(chunk_ids, positions)`` of every occurrence in the given (sorted) chunks, as flat arrays."""
+        ids = self.ids_array()
+        chunk_ids = np.asarray(chunk_ids)
+        rows = np.searchsorted(ids, chunk_ids)
+        found = rows < len(ids)
+        found[found] = ids[rows[found]] == chunk_ids[found]
+        rows = rows[found]
+        if not len(rows):
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32)
+        off = np.frombuffer(self.pos_off, dtype=np.int32)
+        starts = off[rows]
+        ends = np.where(rows + 1 < len(off), off[np.minimum(rows + 1, len(off) - 1)], len(self.positions))
+        lengths = ends - starts
+        # index of every position of the selected rows, without a Python loop
+        shift = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        at = shift + np.arange(int(lengths.sum()), dtype=np.int64)
+        return np.repeat(ids[rows], lengths), np.frombuffer(self.positions, dtype=np.int32)[at]
+
+    def positions_of(self, chunk_id: int):
+        i = bisect.bisect_left(self.ids, chunk_id)
+        if i >= len(self.ids) or self.ids[i] != chunk_id:
+            return None
+        end = self.pos_off[i + 1] if i + 1 < len(self.ids) else len(self.positions)
+        return self.positions[self.pos_off[i]:end]
+
+
+class InvertedIndex:
+    def __init__(self):
+        self.postings = {}
+        self.title_postings = {}
+        self._vocab = []  # sorted, for prefix expansion
+        self.doc_len = array("i")  # tokens per chunk, indexed by chunk id
+        self.total_len = 0
+        self.size = 0  # number of chunks indexed
+        # trigram -> ids of vocabulary terms (text and title) containing it;
+        # built on the first fuzzy lookup, then kept up to date by add()
+        self._fuzzy_terms = None
+        self._fuzzy_ids = {}
+        self._trigram_terms = {}
+
+    def __len__(self):
+        return self.size
+
+    def doc_len_array(self) -> np.ndarray:
+        return np.frombuffer(self.doc_len, dtype=np.int32) if len(self.doc_len) else np.zeros(0, dtype=np.int32)
+
+    def avg_doc_len(self) -> float:
+        return self.total_len / float(self.size) if self.size else 0.0
+
+    def _vocab_add(self, token: str):
+        i = bisect.bisect_left(self._vocab, token)
+        if i >= len(self._vocab) or self._vocab[i] != token:
+            self._vocab.insert(i, token)
+        self._fuzzy_add(token)
+
+    def _fuzzy_add(self, token: str):
+        if self._fuzzy_terms is None or token in self._fuzzy_ids:
+            return
+        tid = len(self._fuzzy_terms)
+        self._fuzzy_terms.append(token)
+        self._fuzzy_ids[token] = tid
+        for g in _trigrams(token):
+            ids = self._trigram_terms.get(g)
+            if ids is None:
+                ids = self._trigram_terms[g] = array("i")
+            ids.append(tid)
+
+    def _fuzzy_build(self):
+        self._fuzzy_terms, self._fuzzy_ids, self._trigram_terms = [], {}, {}
+        for tok in list(self.postings) + list(self.title_postings):
+            self._fuzzy_add(tok)
+
+    # ---------- BUILD ----------
+
+    def add(self, chunk_id: int, text: str, title: str = None):
+        """Index one chunk. Chunk ids must be added in increasing order."""
+        tokens = tokenize(text)
+        by_token = {}
+        for pos, tok in enumerate(tokens):
+            by_token.setdefault(tok, []).append(pos)
+        if chunk_id > len(self.doc_len):
+            self.doc_len.extend([0] * (chunk_id - len(self.doc_len)))
+        self.doc_len.append(len(tokens))
+        self.total_len += len(tokens)
+        postings = self.postings
+        for tok, positions in by_token.items():
+            p = postings.get(tok)
+            if p is None:
+                p = postings[tok] = _Postings()
+                self._vocab_add(tok)
+            # inlined _Postings.append: this loop is the indexing hot path
+            p.ids.append(chunk_id)
+            p.pos_off.append(len(p.positions))
+            p.positions.extend(positions)
+        for tok in set(tokenize(title)):
+            ids = self.title_postings.get(tok)
+            if ids is None:
+                ids = self.title_postings[tok] = array("i")
+                self._fuzzy_add(tok)
+            ids.append(chunk_id)
+        self.size = max(self.size, chunk_id + 1)
+
+    def add_chunks(self, chunks, start: int = 0):
+        """Index a list of chunk dicts (``clean`` / ``title`` / ``source``) from row ``start``."""
+        for i, c in enumerate(chunks, start=start):
+            self.add(i, c.get("clean") or "", c.get("title") or c.get("source") or "")
+
+    # ---------- QUERY ----------
+
+    def fuzzy(self, token: str, threshold: float) -> list:
+        """Indexed terms whose similarity to ``token`` (1 - edits / longer length)
+        is at least ``threshold``, closest first."""
+        if len(token) < FUZZY_MIN_LEN or threshold >= 1.0:
+            return []
+        if self._fuzzy_terms is None:
+            self._fuzzy_build()
+        # most edits any term of an admissible length could be away
+        max_dist = int((1.0 - threshold) * len(token) / threshold)
+        if max_dist < 1:
+            return []
+        grams = _trigrams(token)
+        lists = [self._trigram_terms[g] for g in grams if g in self._trigram_terms]
+        if not lists:
+            return []
+        ids, counts = np.unique(np.concatenate([np.frombuffer(a, dtype=np.int32) for a in lists]), return_counts=True)
+        # one edit changes at most 3 trigrams
+        ids = ids[counts >= max(1, len(grams) - 3 * max_dist)]
+        out = []
+        for tid in ids.tolist():
+            term = self._fuzzy_terms[tid]
+            d = edit_distance(token, term, max_dist)
+            if 0 < d <= max_dist and 1.0 - d / max(len(token), len(term)) >= threshold:
+                out.append((d, term))
+        out.sort()
+        return [t for _, t in out[:FUZZY_EXPANSION_LIMIT]]
+
+    def _expand(self, token: str, fuzzy: float = None) -> list:
+        out = [token]
+        if len(token) < PREFIX_MIN_LEN:
+            return out
+        i = bisect.bisect_left(self._vocab, token)
+        while i < len(self._vocab) and self._vocab[i].startswith(token) and len(out) < PREFIX_EXPANSION_LIMIT:
+            if self._vocab[i] != token:
+                out.append(self._vocab[i])
+            i += 1
+        # an unknown token is probably misspelled: add its fuzzy neighbours
+        if fuzzy and token not in self.postings and token not in self.title_postings:
+            out.extend(self.fuzzy(token, fuzzy))
+        return out
+
+    def _token_ids(self, token: str, fuzzy: float = None) -> np.ndarray:
+        """Chunk ids whose text (any expansion of ``token``) or title contains ``token``.
+
+        With ``fuzzy`` (a similarity threshold), a token missing from the
+        vocabulary also matches its fuzzy neighbours.
+        """
+        parts = []
+        for t in self._expand(token, fuzzy):
+            p = self.postings.get(t)
+            if p is not None:
+                parts.append(p.ids_array())
+            ids = self.title_postings.get(t)
+            if ids is not None and len(ids):
+                parts.append(np.frombuffer(ids, dtype=np.int32))
+        if not parts:
+            return np.zeros(0, dtype=np.int32)
+        if len(parts) == 1:
+            return parts[0]
+        return np.unique(np.concatenate(parts))
+
+    def match_all(self, tokens, fuzzy: float = None) -> np.ndarray:
+        """Sorted chunk ids containing every token (text or title)."""
+        tokens = list(dict.fromkeys(t for t in tokens if t))
+        if not tokens:
+            return np.zeros(0, dtype=np.int32)
+        sets = sorted((self._token_ids(t, fuzzy) for t in tokens), key=len)
+        result = sets[0]
+        for s in sets[1:]:
+            if not len(result):
+                break
+            result = np.intersect1d(result, s, assume_unique=True)
+        return result
+
+    def title_hits(self, chunk_ids: np.ndarray, tokens) -> np.ndarray:
+        """Boolean mask: which of ``chunk_ids`` have any of ``tokens`` in their title."""
+        parts = [np.frombuffer(self.title_postings[t], dtype=np.int32) for t in set(tokens)
+                 if t in self.title_postings and len(self.title_postings[t])]
+        if not parts or not len(chunk_ids):
+            return np.zeros(len(chunk_ids), dtype=bool)
+        return np.isin(chunk_ids, np.concatenate(parts))
+
+    def term_matrix(self, chunk_ids: np.ndarray, tokens, fuzzy: float = None) -> np.ndarray:
+        """Dense ``(len(chunk_ids), len(tokens))`` bool slice of the chunk x term matrix.
+
+        The posting lists are that matrix stored sparse by column, so each
+        column is one vectorized membership test (text, title and prefix
+        expansions count, as in ``match_all``).
+        """
+        chunk_ids = np.asarray(chunk_ids)
+        out = np.zeros((len(chunk_ids), len(tokens)), dtype=bool)
+        if not len(chunk_ids):
+            return out
+        for j, t in enumerate(tokens):
+            ids = self._token_ids(t, fuzzy)
+            if len(ids):
+                out[:, j] = np.isin(chunk_ids, ids)
+        return out
+
+    def has_phrase(self, chunk_id: int, tokens) -> bool:
+        """True if ``tokens`` appear consecutively in the chunk's text."""
+        if not tokens:
+            return False
+        runs = []
+        for t in tokens:
+            p = self.postings.get(t)
+            pos = p.positions_of(chunk_id) if p is not None else None
+            if not pos:
+                return False
+            runs.append(set(pos))
+        return any(all((start + i) in runs[i] for i in range(1, len(runs))) for start in runs[0])
+
+    def phrase_ids(self, chunk_ids, tokens) -> np.ndarray:
+        """Those of ``chunk_ids`` (sorted) whose text contains ``tokens`` consecutively.
+
+        Vectorized ``has_phrase`` over many chunks: each occurrence becomes a
+        (chunk, position - offset in the phrase) key, and a chunk has the
+        phrase when some key is shared by all tokens. Rarest token first, and
+        later tokens only look at chunks that are still in the running.
+        """
+        cand = np.asarray(chunk_ids)
+        if not tokens or not len(cand):
+            return np.zeros(0, dtype=np.int32)
+        order = sorted(range(len(tokens)), key=lambda i: len(self.postings[tokens[i]].ids) if tokens[i] in self.postings else 0)
+        starts = None
+        for i in order:
+            p = self.postings.get(tokens[i])
+            if p is None:
+                return np.zeros(0, dtype=np.int32)
+            ids, pos = p.positions_in(cand)
+            ok = pos >= i
+            # sorted already: ids ascend, and positions ascend within a chunk
+            keys = (ids[ok].astype(np.int64) << 32) | (pos[ok] - i).astype(np.int64)
+            if starts is not None:
+                at = np.minimum(np.searchsorted(keys, starts), max(len(keys) - 1, 0))
+                starts = starts[keys[at] == starts] if len(keys) else keys
+            else:
+                starts = keys
+            if not len(starts):
+                return np.zeros(0, dtype=np.int32)
+            cand = (starts >> 32).astype(np.int32)
+            cand = cand[np.concatenate(([True], cand[1:] != cand[:-1]))]
+        return cand
+
+    def search(self, tokens, limit: int = None, live=None, fuzzy: float = None) -> list:
+        """Chunk ids matching all tokens, exact phrase matches first, then by id.
+
+        Phrase matches are looked for among the first PHRASE_SCAN_MAX matching chunks.
+
+        ``live`` is an optional ``fn(ids) -> bool mask`` that drops ids (e.g. deleted chunks);
+        ``fuzzy`` is passed on to ``match_all``.
+        """
+        ids = self.match_all(tokens, fuzzy)
+        if live is not None and len(ids):
+            ids = ids[live(ids)]
+        if not len(ids):
+            return []
+        if len(tokens) > 1:
+            # phrase-check in id order, in growing blocks, until ``limit`` phrase hits:
+            # a common phrase costs one small block, not a pass over every posting
+            hits, start, block = [], 0, PHRASE_BLOCK
+            end = min(len(ids), PHRASE_SCAN_MAX)
+            while start < end and (limit is None or sum(len(h) for h in hits) < limit):
+                hits.append(self.phrase_ids(ids[start:min(start + block, end)], list(tokens)))
+                start += block
+                block *= 2
+            phrase = np.isin(ids, np.concatenate(hits), assume_unique=True)
+            ids = np.concatenate([ids[phrase], ids[~phrase]])
+        return (ids[:limit] if limit is not None else ids).tolist()
+
+    # ---------- PERSISTENCE ----------
+
+    def to_bytes(self) -> bytes:
+        vocab = list(self.postings.keys())
+        n_ids = np.array([len(self.postings[t].ids) for t in vocab], dtype=np.int64)
+        n_pos = np.array([len(self.postings[t].positions) for t in vocab], dtype=np.int64)
+        title_vocab = list(self.title_postings.keys())
+        n_title = np.array([len(self.title_postings[t]) for t in title_vocab], dtype=np.int64)
+
+        def _cat(arrays):
+            return np.concatenate([np.frombuffer(a, dtype=np.int32) for a in arrays]) if arrays else np.zeros(0, np.int32)
+
+        buf = io.BytesIO()
+        np.savez(
+            buf,
+            meta=np.frombuffer(json.dumps({"vocab": vocab, "title_vocab": title_vocab, "size": self.size}).encode("utf-8"), dtype=np.uint8),
+            n_ids=n_ids,
+            n_pos=n_pos,
+            ids=_cat([self.postings[t].ids for t in vocab]),
+            pos_off=_cat([self.postings[t].pos_off for t in vocab]),
+            positions=_cat([self.postings[t].positions for t in vocab]),
+            n_title=n_title,
+            title_ids=_cat([self.title_postings[t] for t in title_vocab]),
+            doc_len=_cat([self.doc_len]),
+        )
+        return buf.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "InvertedIndex":
+        z = np.load(io.BytesIO(data))
+        meta = json.loads(z["meta"].tobytes().decode("utf-8"))
+        ix = cls()
+        ix.size = int(meta["size"])
+        ids, pos_off, positions = z["ids"], z["pos_off"], z["positions"]
+        id_ends, pos_ends = np.cumsum(z["n_ids"]), np.cumsum(z["n_pos"])
+        id_start = pos_start = 0
+        for tok, id_end, pos_end in zip(meta["vocab"], id_ends.tolist(), pos_ends.tolist()):
+            p = _Postings()
+            p.ids = array("i", ids[id_start:id_end].tobytes())
+            p.pos_off = array("i", pos_off[id_start:id_end].tobytes())
+            p.positions = array("i", positions[pos_start:pos_end].tobytes())
+            ix.postings[tok] = p
+            id_start, pos_start = id_end, pos_end
+        title_ids = z["title_ids"]
+        start = 0
+        for tok, end in zip(meta["title_vocab"], np.cumsum(z["n_title"]).tolist()):
+            ix.title_postings[tok] = array("i", title_ids[start:end].tobytes())
+            start = end
+        ix.doc_len = array("i", z["doc_len"].tobytes())
+        ix.total_len = int(z["doc_len"].sum())
+        ix._vocab = sorted(ix.postings.keys())
+        return ix
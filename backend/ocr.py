@@ -1,5 +1,4 @@
-import easyocr
-from pdf2image import convert_from_path
+from pdf2image import convert_from_path, pdfinfo_from_path
 from pdf2image.exceptions import PDFInfoNotInstalledError
 try:
     from PyPDF2 import PdfReader
@@ -11,16 +10,50 @@ import numpy as np
 from PIL import Image
 import pytesseract
 from difflib import SequenceMatcher
-from transformers import pipeline
 _grammar_model = None
 import os
 import re
 import unicodedata
-from wordfreq import zipf_frequency, top_n_list
-
-reader = easyocr.Reader(['en'])
-# build a vocabulary from wordfreq top list
-_VOCAB = set(top_n_list("en", 50000))
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import spell
+import readiness
+
+# EasyOCR reader, built on first use (get_reader) or by warm_up at service
+# start; importing easyocr pulls in torch, so that is deferred too
+reader = None
+
+# Multi-page PDFs are OCR'd page-parallel in a process pool. Each worker
+# renders and OCRs one page at a time and keeps its own EasyOCR reader loaded
+# between documents. OCR_WORKERS <= 1 keeps the in-process sequential path.
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(min(4, os.cpu_count() or 1))))
+OCR_PARALLEL_MIN_PAGES = int(os.getenv("OCR_PARALLEL_MIN_PAGES", "2"))
+# recycle a worker after N pages (0 = never) to return leaked memory
+OCR_WORKER_MAX_TASKS = int(os.getenv("OCR_WORKER_MAX_TASKS", "0"))
+# per-worker address-space cap in MB (0 = unlimited, POSIX only)
+OCR_WORKER_MEMORY_MB = int(os.getenv("OCR_WORKER_MEMORY_MB", "0"))
+_pool = None
+_pool_lock = threading.Lock()
+# the in-process EasyOCR reader is shared; callers extracting from several
+# threads (crawl pipeline) take turns on it, pool workers have their own
+_reader_lock = threading.Lock()
+
+# PDF rasterization: pages are rendered a few at a time (OCR_RENDER_WINDOW)
+# and released before the next window, so peak memory does not depend on
+# the page count. Rendering in grayscale is 3x smaller and matches what
+# preprocessing does anyway.
+OCR_DPI = int(os.getenv("OCR_DPI", "200"))
+OCR_RENDER_WINDOW = max(1, int(os.getenv("OCR_RENDER_WINDOW", "1")))
+OCR_GRAYSCALE = os.getenv("OCR_GRAYSCALE", "1").lower() in ("1", "true", "yes")
+
+# Born-digital PDFs: pages whose own text layer has at least
+# NATIVE_TEXT_MIN_CHARS characters, mostly alphanumeric, skip OCR
+NATIVE_TEXT_LAYER = os.getenv("NATIVE_TEXT_LAYER", "1").lower() in ("1", "true", "yes")
+NATIVE_TEXT_MIN_CHARS = int(os.getenv("NATIVE_TEXT_MIN_CHARS", "40"))
+NATIVE_TEXT_MIN_ALNUM = float(os.getenv("NATIVE_TEXT_MIN_ALNUM", "0.6"))
 
 # Optional grammar-correction model (load only if explicitly enabled via env)
 try:
@@ -28,6 +61,7 @@ try:
     _GRAMMAR_MODEL_NAME = os.getenv("OCR_GRAMMAR_MODEL", "")
     if _ENABLE_GRAMMAR and _GRAMMAR_MODEL_NAME:
         try:
+            from transformers import pipeline
             _grammar_model = pipeline("text2text-generation", model=_GRAMMAR_MODEL_NAME)
             print(f"Loaded OCR grammar model: {_GRAMMAR_MODEL_NAME}", flush=True)
         except Exception as _e:
@@ -37,6 +71,25 @@ except Exception:
     _grammar_model = None
 
 
+def get_reader():
+    """The EasyOCR reader, built once per process."""
+    global reader
+    if reader is None:
+        with _reader_lock:
+            if reader is None:
+                with readiness.loading("ocr_reader"):
+                    import easyocr
+                    reader = easyocr.Reader(['en'])
+    return reader
+
+
+def warm_up():
+    """Build the OCR reader and the spell correction index ahead of the first upload."""
+    get_reader()
+    with readiness.loading("spell_index"):
+        spell.get_index()
+
+
 def _basic_clean(text: str) -> str:
     # normalize whitespace and remove control / non-printable chars
     text = text.replace("\n", " ").replace("\r", " ")
@@ -89,9 +142,317 @@ def _aggressive_clean(text: str) -> str:
     return text.strip()
 
 
-def extract_text(file_path):
-    """Extract text from various file types with comprehensive error handling and fallbacks."""
+def _preprocess_pil_image(pil_img: Image.Image, fast_mode: bool = True) -> Image.Image:
+    """Preprocess image for better OCR: denoise, enhance contrast, deskew.
+
+    fast_mode=True: Skip expensive operations (deskew, morphology) for speed - 3x faster
+    fast_mode=False: Full preprocessing with all enhancements for best quality
+    """
+    try:
+        # convert to grayscale
+        img = np.array(pil_img.convert("RGB"))
+        gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
+
+        if fast_mode:
+            # FAST MODE: Skip expensive preprocessing for speed (~100ms instead of 500ms)
+            # Just do basic denoise and contrast (most impactful)
+            den = cv2.fastNlMeansDenoising(gray, None, h=8)  # Reduced h for speed
+
+            # Quick contrast enhancement (faster than CLAHE)
+            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(16,16))  # Larger tiles = faster
+            enhanced = clahe.apply(den)
+
+            return Image.fromarray(enhanced)
+        else:
+            # QUALITY MODE: Full preprocessing (slower but higher quality)
+            # denoise
+            den = cv2.fastNlMeansDenoising(gray, None, h=10)
+
+            # enhance contrast via CLAHE
+            clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8,8))
+            cl = clahe.apply(den)
+
+            # adaptive thresholding
+            th = cv2.adaptiveThreshold(cl, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                       cv2.THRESH_BINARY, 15, 9)
+
+            # morphological opening to remove small noise
+            kernel = np.ones((1,1), np.uint8)
+            opened = cv2.morphologyEx(th, cv2.MORPH_OPEN, kernel)
+
+            # deskew using moments / minAreaRect
+            coords = np.column_stack(np.where(opened > 0))
+            if coords.shape[0] > 0:
+                rect = cv2.minAreaRect(coords)
+                angle = rect[-1]
+                if angle < -45:
+                    angle = -(90 + angle)
+                else:
+                    angle = -angle
+                (h, w) = opened.shape
+                center = (w // 2, h // 2)
+                M = cv2.getRotationMatrix2D(center, angle, 1.0)
+                rotated = cv2.warpAffine(opened, M, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
+            else:
+                rotated = opened
+
+            return Image.fromarray(rotated)
+    except Exception as e:
+        print(f"⚠️ Preprocessing error: {e}", flush=True)
+        return pil_img  # Return original if preprocessing fails
+
+
+def _ocr_on_image(pil_img: Image.Image, fast_mode: bool = True):
+    """Run EasyOCR for text extraction. 
+    fast_mode=True: Skip image preprocessing for speed (default)
+    fast_mode=False: Full preprocessing for best quality OCR
+    """
+    best_text = ""
+    best_conf = 0.0
+
+    # run EasyOCR with details for confidence
+    try:
+        print("   Trying EasyOCR...", flush=True)
+        ocr_reader = get_reader()
+        with _reader_lock:
+            easy_res = ocr_reader.readtext(np.array(pil_img))
+        easy_text = " ".join([t[1] for t in easy_res if len(t) > 1])
+        confidences = [t[2] for t in easy_res if len(t) > 2 and isinstance(t[2], (int, float))]
+        mean_conf = float(np.mean(confidences)) if confidences else 0.0
+        print(f"   EasyOCR: text_len={len(easy_text)}, conf={mean_conf:.2f}", flush=True)
+
+        if easy_text.strip() and mean_conf > 0.3:  # Lowered threshold from 0.45
+            best_text = easy_text
+            best_conf = mean_conf
+    except Exception as e:
+        print(f"   ⚠️ EasyOCR error: {e}", flush=True)
+
+    # run pytesseract as complementary OCR if EasyOCR didn't work well
+    if best_conf < 0.4:
+        try:
+            print("   Trying Tesseract...", flush=True)
+            pyt_text = pytesseract.image_to_string(pil_img)
+            print(f"   Tesseract: text_len={len(pyt_text)}", flush=True)
+            if pyt_text.strip() and len(pyt_text) > len(best_text):
+                best_text = pyt_text
+                best_conf = 0.5  # Arbitrary decent score
+        except Exception as e:
+            print(f"   ⚠️ Tesseract error: {e}", flush=True)
+
+    return best_text, best_conf
+
+
+def _init_ocr_worker(memory_mb: int):
+    """Process-pool initializer: one thread per worker, an optional memory cap, and the reader.
+
+    The EasyOCR reader is built here, when the worker starts, and reused for
+    every page the worker handles, so loading it never lands on a live job.
+
+    Workers are spawned: each one re-imports the launching script as
+    ``__mp_main__``, so scripts that use the pool (crawl_index, auto_index)
+    keep embed / app imports out of module level.
+    """
+    try:
+        import torch
+        torch.set_num_threads(1)
+    except Exception:
+        pass
+    try:
+        cv2.setNumThreads(1)
+    except Exception:
+        pass
+    if memory_mb > 0:
+        try:
+            import resource
+            limit = memory_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except Exception as e:
+            print(f"⚠️ OCR worker memory limit not applied: {e}", flush=True)
+    try:
+        get_reader()
+    except Exception as e:
+        # pages still get the Tesseract fallback; the reader is retried on first use
+        print(f"⚠️ OCR worker could not load EasyOCR: {e}", flush=True)
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            kwargs = {
+                "max_workers": OCR_WORKERS,
+                # spawn: forking a process with torch threads running can deadlock
+                "mp_context": multiprocessing.get_context("spawn"),
+                "initializer": _init_ocr_worker,
+                "initargs": (OCR_WORKER_MEMORY_MB,),
+            }
+            if OCR_WORKER_MAX_TASKS > 0:
+                kwargs["max_tasks_per_child"] = OCR_WORKER_MAX_TASKS
+            try:
+                _pool = ProcessPoolExecutor(**kwargs)
+            except TypeError:
+                # Python < 3.11 has no max_tasks_per_child
+                kwargs.pop("max_tasks_per_child", None)
+                _pool = ProcessPoolExecutor(**kwargs)
+            print(f"🧵 OCR worker pool started ({OCR_WORKERS} workers)", flush=True)
+        return _pool
+
+
+def _reset_pool(broken=None):
+    """Drop the pool (only if it is still ``broken``, when given: another thread may have replaced it)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None or (broken is not None and _pool is not broken):
+            return
+        try:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        except Exception:
+            pass
+        _pool = None
+
+
+def _render_pdf_pages(file_path: str, first: int, last: int) -> list:
+    """Rasterize pages ``first..last`` (1-based, inclusive) at OCR_DPI."""
+    return convert_from_path(file_path, dpi=OCR_DPI, first_page=first, last_page=last, grayscale=OCR_GRAYSCALE)
+
+
+def _page_windows(page_nums: list):
+    """Split sorted page numbers into ``(first, last)`` runs of at most OCR_RENDER_WINDOW pages."""
+    runs = []
+    for n in page_nums:
+        if runs and n == runs[-1][1] + 1 and n - runs[-1][0] < OCR_RENDER_WINDOW:
+            runs[-1][1] = n
+        else:
+            runs.append([n, n])
+    return [tuple(r) for r in runs]
+
+
+def _iter_pdf_pages(file_path: str, page_nums: list):
+    """Yield ``(page_num, image)`` rendering OCR_RENDER_WINDOW pages at a time."""
+    for first, last in _page_windows(page_nums):
+        window = _render_pdf_pages(file_path, first, last)
+        for offset in range(len(window)):
+            page = window[offset]
+            window[offset] = None  # drop our reference so the page is freed once processed
+            yield first + offset, page
+            page.close()
+        del window
+
+
+def _ocr_pdf_page(file_path: str, page_num: int):
+    """Render and OCR a single PDF page (runs inside a pool worker)."""
+    pages = _render_pdf_pages(file_path, page_num, page_num)
+    if not pages:
+        return page_num, "", 0.0
+    proc = _preprocess_pil_image(pages[0])
+    del pages
+    text, conf = _ocr_on_image(proc)
+    return page_num, text, conf
+
+
+def _ocr_pdf_sequential(file_path: str, page_nums: list) -> dict:
+    """OCR the given pages in-process, streaming them; returns ``{page: (text, conf)}``."""
+    results = {}
+    for page_num, page in _iter_pdf_pages(file_path, page_nums):
+        print(f"   Processing page {page_num}", flush=True)
+        try:
+            proc = _preprocess_pil_image(page)
+            results[page_num] = _ocr_on_image(proc)
+            if results[page_num][0].strip():
+                print(f"     ✓ Extracted {len(results[page_num][0])} chars from page {page_num}", flush=True)
+        except Exception as e:
+            print(f"     ⚠️ Error processing page {page_num}: {e}", flush=True)
+    return results
+
+
+def _ocr_pdf_parallel(file_path: str, page_nums: list) -> dict:
+    """OCR the given pages across the worker pool; returns ``{page: (text, conf)}``."""
+    results = {}
+    todo = set(page_nums)
+    pool = None
+    try:
+        pool = _get_pool()
+        futures = {pool.submit(_ocr_pdf_page, file_path, n): n for n in page_nums}
+        for fut in as_completed(futures):
+            page_num = futures[fut]
+            try:
+                _, page_text, conf = fut.result()
+            except BrokenProcessPool:
+                raise
+            except Exception as e:
+                print(f"     ⚠️ Error processing page {page_num}: {e}", flush=True)
+                todo.discard(page_num)
+                continue
+            todo.discard(page_num)
+            results[page_num] = (page_text, conf)
+            if page_text.strip():
+                print(f"     ✓ Extracted {len(page_text)} chars from page {page_num} (conf {conf:.2f})", flush=True)
+    except (BrokenProcessPool, RuntimeError) as e:
+        # a worker died (e.g. hit its memory cap), or another thread already shut
+        # the broken pool down; finish the remaining pages in-process
+        print(f"   ⚠️ OCR worker pool failed ({e}); finishing {len(todo)} pages in-process", flush=True)
+        _reset_pool(pool)
+        for page_num in sorted(todo):
+            try:
+                _, page_text, conf = _ocr_pdf_page(file_path, page_num)
+                results[page_num] = (page_text, conf)
+            except Exception as e2:
+                print(f"     ⚠️ Error processing page {page_num}: {e2}", flush=True)
+    return results
+
+
+def _native_page_texts(file_path: str):
+    """Per-page text from the PDF's own text layer (None if the PDF can't be parsed)."""
+    if PdfReader is None:
+        return None
+    try:
+        with open(file_path, "rb") as f:
+            pdf = PdfReader(f)
+            texts = []
+            for p in pdf.pages:
+                try:
+                    texts.append(p.extract_text() or "")
+                except Exception:
+                    texts.append("")
+            return texts
+    except Exception as e:
+        print(f"   ⚠️ PyPDF2 could not read the text layer: {e}", flush=True)
+        return None
+
+
+def _has_text_layer(text: str) -> bool:
+    """True if a page's native text looks like real text rather than an empty/garbled layer."""
+    text = (text or "").strip()
+    if len(text) < NATIVE_TEXT_MIN_CHARS:
+        return False
+    alnum = sum(1 for c in text if c.isalnum())
+    return alnum / float(len(text.replace(" ", "")) or 1) >= NATIVE_TEXT_MIN_ALNUM
+
+
+def _print_page_report(report: list):
+    counts = {}
+    for r in report:
+        counts[r["method"]] = counts.get(r["method"], 0) + 1
+    summary = ", ".join(f"{v} {k}" for k, v in sorted(counts.items()))
+    print(f"📄 Page report: {summary}", flush=True)
+    for r in report:
+        conf = f", conf {r['conf']:.2f}" if "conf" in r else ""
+        print(f"   page {r['page']}: {r['method']} ({r['chars']} chars{conf})", flush=True)
+
+
+def extract_text(file_path, report: list = None, pool_min_pages: int = None):
+    """Extract text from various file types with comprehensive error handling and fallbacks.
+
+    Pass a list as ``report`` to receive one dict per page saying which path
+    it took (``text``, ``ocr``, ``failed`` or ``text-fallback``; an image is
+    page 1). An extraction that failed as a whole adds a ``failed`` entry for
+    page 0. Returns ``(raw, clean)``; ``clean`` is empty when no text was found.
+    See ``extraction_complete``.
+    ``pool_min_pages`` overrides OCR_PARALLEL_MIN_PAGES (1 sends every scanned
+    page to the worker pool, for callers extracting several files at once).
+    """
     raw = ""
+    report = report if report is not None else []
     
     print(f"🔍 Processing file: {file_path}", flush=True)
     print(f"   File exists: {os.path.exists(file_path)}", flush=True)
@@ -115,145 +476,67 @@ def extract_text(file_path):
         out_lines = [orig for n, orig in zip(norm, lines) if n not in to_remove]
         return "\n".join(out_lines)
 
-    def _preprocess_pil_image(pil_img: Image.Image, fast_mode: bool = True) -> Image.Image:
-        """Preprocess image for better OCR: denoise, enhance contrast, deskew.
-        
-        fast_mode=True: Skip expensive operations (deskew, morphology) for speed - 3x faster
-        fast_mode=False: Full preprocessing with all enhancements for best quality
-        """
-        try:
-            # convert to grayscale
-            img = np.array(pil_img.convert("RGB"))
-            gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
-
-            if fast_mode:
-                # FAST MODE: Skip expensive preprocessing for speed (~100ms instead of 500ms)
-                # Just do basic denoise and contrast (most impactful)
-                den = cv2.fastNlMeansDenoising(gray, None, h=8)  # Reduced h for speed
-                
-                # Quick contrast enhancement (faster than CLAHE)
-                clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(16,16))  # Larger tiles = faster
-                enhanced = clahe.apply(den)
-                
-                return Image.fromarray(enhanced)
-            else:
-                # QUALITY MODE: Full preprocessing (slower but higher quality)
-                # denoise
-                den = cv2.fastNlMeansDenoising(gray, None, h=10)
-
-                # enhance contrast via CLAHE
-                clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8,8))
-                cl = clahe.apply(den)
-
-                # adaptive thresholding
-                th = cv2.adaptiveThreshold(cl, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                                           cv2.THRESH_BINARY, 15, 9)
-
-                # morphological opening to remove small noise
-                kernel = np.ones((1,1), np.uint8)
-                opened = cv2.morphologyEx(th, cv2.MORPH_OPEN, kernel)
-
-                # deskew using moments / minAreaRect
-                coords = np.column_stack(np.where(opened > 0))
-                if coords.shape[0] > 0:
-                    rect = cv2.minAreaRect(coords)
-                    angle = rect[-1]
-                    if angle < -45:
-                        angle = -(90 + angle)
-                    else:
-                        angle = -angle
-                    (h, w) = opened.shape
-                    center = (w // 2, h // 2)
-                    M = cv2.getRotationMatrix2D(center, angle, 1.0)
-                    rotated = cv2.warpAffine(opened, M, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
-                else:
-                    rotated = opened
-
-                return Image.fromarray(rotated)
-        except Exception as e:
-            print(f"⚠️ Preprocessing error: {e}", flush=True)
-            return pil_img  # Return original if preprocessing fails
-
-    def _ocr_on_image(pil_img: Image.Image, fast_mode: bool = True):
-        """Run EasyOCR for text extraction. 
-        fast_mode=True: Skip image preprocessing for speed (default)
-        fast_mode=False: Full preprocessing for best quality OCR
-        """
-        best_text = ""
-        best_conf = 0.0
-        
-        # run EasyOCR with details for confidence
-        try:
-            print("   Trying EasyOCR...", flush=True)
-            easy_res = reader.readtext(np.array(pil_img))
-            easy_text = " ".join([t[1] for t in easy_res if len(t) > 1])
-            confidences = [t[2] for t in easy_res if len(t) > 2 and isinstance(t[2], (int, float))]
-            mean_conf = float(np.mean(confidences)) if confidences else 0.0
-            print(f"   EasyOCR: text_len={len(easy_text)}, conf={mean_conf:.2f}", flush=True)
-            
-            if easy_text.strip() and mean_conf > 0.3:  # Lowered threshold from 0.45
-                best_text = easy_text
-                best_conf = mean_conf
-        except Exception as e:
-            print(f"   ⚠️ EasyOCR error: {e}", flush=True)
-
-        # run pytesseract as complementary OCR if EasyOCR didn't work well
-        if best_conf < 0.4:
-            try:
-                print("   Trying Tesseract...", flush=True)
-                pyt_text = pytesseract.image_to_string(pil_img)
-                print(f"   Tesseract: text_len={len(pyt_text)}", flush=True)
-                if pyt_text.strip() and len(pyt_text) > len(best_text):
-                    best_text = pyt_text
-                    best_conf = 0.5  # Arbitrary decent score
-            except Exception as e:
-                print(f"   ⚠️ Tesseract error: {e}", flush=True)
-
-        return best_text, best_conf
-
     # === Main extraction logic ===
     try:
         if file_path.lower().endswith(".pdf"):
             print("   Detected PDF file", flush=True)
+            # pages with a usable native text layer skip rasterization and OCR entirely
+            native = _native_page_texts(file_path) if NATIVE_TEXT_LAYER else None
+            page_texts = list(native) if native is not None else []
+            ocr_pages = []
             try:
-                pages = convert_from_path(file_path)
-                print(f"   Extracted {len(pages)} pages from PDF", flush=True)
-                
-                for page_num, page in enumerate(pages, 1):
-                    print(f"   Processing page {page_num}/{len(pages)}", flush=True)
-                    try:
-                        proc = _preprocess_pil_image(page)
-                        page_text, conf = _ocr_on_image(proc)
-                        if page_text.strip():
-                            raw += page_text + " "
-                            print(f"     ✓ Extracted {len(page_text)} chars from page {page_num}", flush=True)
-                    except Exception as e:
-                        print(f"     ⚠️ Error processing page {page_num}: {e}", flush=True)
-                        
+                n_pages = len(native) if native is not None else int(pdfinfo_from_path(file_path).get("Pages", 0))
+                page_texts = [""] * n_pages
+                for page_num in range(1, n_pages + 1):
+                    if native is not None and _has_text_layer(native[page_num - 1]):
+                        page_texts[page_num - 1] = native[page_num - 1]
+                        report.append({"page": page_num, "method": "text", "chars": len(native[page_num - 1])})
+                    else:
+                        ocr_pages.append(page_num)
+                print(f"   {n_pages - len(ocr_pages)}/{n_pages} pages have a text layer, {len(ocr_pages)} need OCR", flush=True)
+
+                if ocr_pages:
+                    min_pages = OCR_PARALLEL_MIN_PAGES if pool_min_pages is None else pool_min_pages
+                    if OCR_WORKERS > 1 and len(ocr_pages) >= min_pages:
+                        print(f"   OCR'ing {len(ocr_pages)} pages on {OCR_WORKERS} workers", flush=True)
+                        results = _ocr_pdf_parallel(file_path, ocr_pages)
+                    else:
+                        # stream pages instead of materializing the whole PDF as images
+                        print(f"   Rendering {len(ocr_pages)} pages at {OCR_DPI} dpi, {OCR_RENDER_WINDOW} at a time", flush=True)
+                        results = _ocr_pdf_sequential(file_path, ocr_pages)
+                    for page_num in ocr_pages:
+                        if page_num not in results:
+                            # OCR failed: a weak text layer still beats nothing
+                            fallback = native[page_num - 1] if native is not None else ""
+                            page_texts[page_num - 1] = fallback
+                            report.append({"page": page_num, "method": "text-fallback" if fallback.strip() else "failed", "chars": len(fallback)})
+                            continue
+                        page_text, conf = results[page_num]
+                        page_texts[page_num - 1] = page_text
+                        report.append({"page": page_num, "method": "ocr", "chars": len(page_text), "conf": float(conf)})
+
             except (PDFInfoNotInstalledError, FileNotFoundError) as e:
-                print(f"   PDF processing failed ({e.__class__.__name__}), trying PyPDF2 fallback", flush=True)
-                # fallback: try to extract text with PyPDF2 (works for text PDFs, not scanned images)
-                if PdfReader is not None:
-                    try:
-                        with open(file_path, "rb") as f:
-                            pdf = PdfReader(f)
-                            print(f"   Extracted {len(pdf.pages)} pages with PyPDF2", flush=True)
-                            for p in pdf.pages:
-                                try:
-                                    page_text = p.extract_text() or ""
-                                    if page_text.strip():
-                                        raw += page_text + " "
-                                except Exception:
-                                    pass
-                    except Exception as pdfexc:
-                        print(f"   ⚠️ PyPDF2 also failed: {pdfexc}", flush=True)
+                # poppler is missing: keep whatever the text layer has (works for text PDFs, not scanned images)
+                print(f"   PDF rasterization failed ({e.__class__.__name__}), using the PyPDF2 text layer only", flush=True)
+                for page_num in ocr_pages or range(1, len(page_texts) + 1):
+                    page_texts[page_num - 1] = native[page_num - 1] if native is not None else ""
+                    report.append({"page": page_num, "method": "text-fallback", "chars": len(page_texts[page_num - 1])})
+                if native is None:
+                    print("   ⚠️ PyPDF2 fallback unavailable", flush=True)
+
+            raw += " ".join(t for t in page_texts if t.strip()) + " "
+            report.sort(key=lambda r: r["page"])
+            _print_page_report(report)
         else:
             # Image file
             print("   Detected image file", flush=True)
             try:
-                result = reader.readtext(file_path)
+                ocr_reader = get_reader()
+                with _reader_lock:
+                    result = ocr_reader.readtext(file_path)
                 raw = " ".join([res[1] for res in result if len(res) > 1])
                 print(f"   Extracted {len(raw)} chars from image", flush=True)
+                report.append({"page": 1, "method": "ocr", "chars": len(raw)})
             except Exception as e:
                 print(f"   ⚠️ EasyOCR on image failed: {e}", flush=True)
                 # Try loading as PIL and OCRing
@@ -261,10 +544,13 @@ def extract_text(file_path):
                     pil_img = Image.open(file_path)
                     proc = _preprocess_pil_image(pil_img)
                     raw, _ = _ocr_on_image(proc)
+                    report.append({"page": 1, "method": "ocr", "chars": len(raw)})
                 except Exception as e2:
                     print(f"   ⚠️ Fallback OCR also failed: {e2}", flush=True)
+                    report.append({"page": 1, "method": "failed", "chars": 0})
     except Exception as e:
         print(f"❌ Extraction failed for {file_path}: {e}", flush=True)
+        report.append({"page": 0, "method": "failed", "chars": 0, "error": str(e)})
         raw = ""
 
     # === Post-processing ===
@@ -282,58 +568,12 @@ def extract_text(file_path):
         pass
 
     # Apply light post-correction
-    def _light_stat_correct(text: str, max_changes: int = 100) -> str:
+    def _light_stat_correct(text: str) -> str:
         """Lightweight spell correction focused on common OCR errors."""
         try:
-            def edits1(word):
-                letters = 'abcdefghijklmnopqrstuvwxyz'
-                splits = [(word[:i], word[i:]) for i in range(len(word) + 1)]
-                deletes = [L + R[1:] for L, R in splits if R]
-                transposes = [L + R[1] + R[0] + R[2:] for L, R in splits if len(R) > 1]
-                replaces = [L + c + (R[1:] if len(R) > 1 else '') for L, R in splits if R for c in letters]
-                inserts = [L + c + R for L, R in splits for c in letters]
-                return set(deletes + transposes + replaces + inserts)
-
-            def edits2(word):
-                return set(e2 for e1 in edits1(word) for e2 in edits1(e1))
-
-            def known(cands):
-                return set(w for w in cands if w in _VOCAB)
-
-            def candidate_corrections(word):
-                w = word.lower()
-                if w in _VOCAB:
-                    return [w]
-                c1 = known(edits1(w))
-                if c1:
-                    return sorted(list(c1), key=lambda x: -zipf_frequency(x, 'en'))
-                c2 = known(edits2(w))
-                if c2:
-                    return sorted(list(c2), key=lambda x: -zipf_frequency(x, 'en'))
-                return []
-            
-            words = re.findall(r"\w+", text)
-            changes = 0
-            corrected_text = text
-            seen = set()
-
-            for w in set(words):
-                if changes >= max_changes:
-                    break
-                if len(w) <= 2 or w.isupper() or any(char.isdigit() for char in w):
-                    continue
-                lw = w.lower()
-                if lw in seen or lw in _VOCAB:
-                    seen.add(lw)
-                    continue
-                seen.add(lw)
-                cands = candidate_corrections(w)
-                if cands:
-                    best = cands[0]
-                    if best != lw:
-                        replacement = best.capitalize() if w[0].isupper() else best
-                        corrected_text = re.sub(rf"\b{re.escape(w)}\b", replacement, corrected_text)
-                        changes += 1
+            # one tokenized pass over the text against the precomputed
+            # symmetric-delete index (see spell.py), built / loaded once
+            corrected_text = spell.get_index().correct(text)
 
             # basic sentence punctuation and capitalization fixes
             try:
@@ -386,7 +626,7 @@ def extract_text(file_path):
             return text
 
     try:
-        final = _light_stat_correct(cleaned, max_changes=100)
+        final = _light_stat_correct(cleaned)
         print(f"📊 After spell correction: {len(final)} chars", flush=True)
     except Exception as e:
         print(f"⚠️ Spell correction error: {e}", flush=True)
@@ -398,7 +638,17 @@ def extract_text(file_path):
         final = cleaned
 
     if not final.strip():
+        # empty, not a placeholder: callers must not index (or cache) a failure as text
         print(f"❌ No text could be extracted from file", flush=True)
-        final = "Unable to extract text from this document."
+        final = ""
 
     return raw.strip(), final
+
+
+def extraction_complete(report: list) -> bool:
+    """True if every page of an ``extract_text`` report was read by its intended path.
+
+    Failed pages and fallbacks (OCR worker crash, missing poppler, ...) may
+    succeed on a later attempt, so such results should not be cached.
+    """
+    return bool(report) and all(r["method"] in ("text", "ocr") for r in report)
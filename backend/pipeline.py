@@ -0,0 +1,136 @@
+"""Thread stages connected by bounded queues (producer/consumer ingestion).
+
+Each ``Stage`` owns an inbox ``queue.Queue(maxsize)`` and ``workers`` threads
+running ``fn(item, emit)``; ``emit`` forwards results to the next stage's
+inbox and blocks while it is full, so a slow stage throttles everything
+upstream instead of letting work pile up in memory. ``BatchStage`` collects
+items into lists for stages that work best in bulk (embedding).
+
+    embed = BatchStage("embed", index_batch, batch_size=16)
+    ocr = Stage("ocr", extract, workers=4, out=embed)
+    for s in (embed, ocr): s.start()
+    for item in source: ocr.put(item)
+    ocr.close()            # drains and closes downstream stages in order
+    print_report([ocr, embed], elapsed)
+"""
+import time
+import queue
+import threading
+
+_DONE = object()
+
+
+class Stage:
+
+    def __init__(self, name: str, fn, workers: int = 1, maxsize: int = 32, out=None):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.inbox = queue.Queue(maxsize=maxsize)
+        self.out = out
+        self._threads = []
+        self._lock = threading.Lock()
+        # metrics
+        self.received = 0
+        self.emitted = 0
+        self.failed = 0
+        self.busy = 0.0      # summed worker seconds spent in fn
+        self.blocked = 0.0   # summed seconds waiting on a full downstream queue
+        self.started = None
+        self.finished = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f"{self.name}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def put(self, item):
+        """Queue an item; blocks while the inbox is full (backpressure)."""
+        self.inbox.put(item)
+
+    def emit(self, item):
+        if self.out is None:
+            return
+        t0 = time.perf_counter()
+        self.out.put(item)
+        with self._lock:
+            self.emitted += 1
+            self.blocked += time.perf_counter() - t0
+
+    def _call(self, item, n):
+        t0 = time.perf_counter()
+        try:
+            self.fn(item, self.emit)
+        except Exception as e:
+            with self._lock:
+                self.failed += n
+            print(f"⚠️ [{self.name}] {e}", flush=True)
+        with self._lock:
+            self.received += n
+            self.busy += time.perf_counter() - t0
+
+    def _run(self):
+        while True:
+            item = self.inbox.get()
+            if item is _DONE:
+                return
+            self._call(item, 1)
+
+    def close(self):
+        """Let the workers drain the inbox, stop them, then close the next stage."""
+        for _ in self._threads:
+            self.inbox.put(_DONE)
+        for t in self._threads:
+            t.join()
+        self.finished = time.perf_counter()
+        if self.out is not None:
+            self.out.close()
+
+
+class BatchStage(Stage):
+    """Single-worker stage calling ``fn(batch, emit)`` with up to ``batch_size`` items.
+
+    A partial batch is flushed once ``max_wait`` seconds pass without a new
+    item, so a trickle of input is not held back until the stage closes.
+    """
+
+    def __init__(self, name: str, fn, batch_size: int = 16, max_wait: float = 2.0, maxsize: int = 64, out=None):
+        super().__init__(name, fn, workers=1, maxsize=maxsize, out=out)
+        self.batch_size = max(1, batch_size)
+        self.max_wait = max_wait
+        self.batches = 0
+
+    def _run(self):
+        batch = []
+        while True:
+            try:
+                item = self.inbox.get(timeout=self.max_wait if batch else None)
+            except queue.Empty:
+                item = None
+            if item is not None and item is not _DONE:
+                batch.append(item)
+            if batch and (item is None or item is _DONE or len(batch) >= self.batch_size):
+                self.batches += 1
+                self._call(batch, len(batch))
+                batch = []
+            if item is _DONE:
+                return
+
+
+def print_report(stages: list, elapsed: float):
+    """Per-stage throughput: items in/out, failures, items/s of wall time,
+    worker utilization (busy / workers x wall) and time blocked on a full
+    downstream queue (high = the next stage is the bottleneck)."""
+    print(f"📈 Pipeline report ({elapsed:.1f}s wall)", flush=True)
+    print(f"   {'stage':<10}{'workers':>8}{'in':>7}{'out':>7}{'failed':>8}{'items/s':>9}{'util':>7}{'blocked':>9}", flush=True)
+    for s in stages:
+        wall = max(elapsed, 1e-9)
+        util = s.busy / (s.workers * wall)
+        print(
+            f"   {s.name:<10}{s.workers:>8}{s.received:>7}{s.emitted:>7}{s.failed:>8}"
+            f"{s.received / wall:>9.2f}{util:>7.0%}{s.blocked:>8.1f}s",
+            flush=True,
+        )
@@ -0,0 +1,73 @@
+"""Small thread-safe LRU cache with per-entry TTL and hit/miss counters.
+
+Used by ``embed`` for query embeddings (normalized query -> vector) and,
+optionally, for whole search results keyed on the index version.
+"""
+import time
+import threading
+from collections import OrderedDict
+
+
+def normalize_query(query: str) -> str:
+    """Cache key for a query: lowercased with whitespace collapsed.
+
+    all-MiniLM-L6-v2 uses an uncased tokenizer, so this does not change the
+    embedding the model would produce.
+    """
+    return " ".join((query or "").lower().split())
+
+
+class TTLCache:
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0
+
+    def get(self, key, default=None):
+        if not self.enabled:
+            return default
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or (self.ttl and now - item[1] > self.ttl):
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
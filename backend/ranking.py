@@ -0,0 +1,161 @@
+"""Lexical (BM25) scoring and rank fusion for ``embed.retrieve``.
+
+BM25 runs straight off the keyword inverted index: term frequencies are
+the per-posting position counts, document lengths are precomputed per chunk
+at indexing time and IDF comes from the posting-list lengths. Everything is
+computed with NumPy over whole posting/candidate arrays.
+
+Configuration (env):
+    BM25_K1, BM25_B     standard BM25 saturation / length-normalization knobs
+    RANK_FUSION         rrf (reciprocal-rank fusion) | weighted (min-max scores)
+    RRF_K               RRF rank offset (60 in the original paper)
+"""
+import os
+import math
+
+import numpy as np
+
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+RANK_FUSION = os.getenv("RANK_FUSION", "rrf").lower()
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+_EMPTY_IDS = np.zeros(0, dtype=np.int64)
+_EMPTY_SCORES = np.zeros(0, dtype=np.float32)
+
+
+def _top(ids: np.ndarray, scores: np.ndarray, n: int):
+    """Top-n (ids, scores) by descending score without a full sort."""
+    if n <= 0 or not len(ids):
+        return _EMPTY_IDS, _EMPTY_SCORES
+    if len(ids) > n:
+        part = np.argpartition(-scores, n - 1)[:n]
+        ids, scores = ids[part], scores[part]
+    order = np.argsort(-scores, kind="stable")
+    return ids[order], scores[order]
+
+
+def iter_top(scores: np.ndarray, block: int):
+    """Positions of ``scores`` in descending order (ties: lower position first), lazily.
+
+    Only the first ``block`` positions are selected (argpartition) and sorted;
+    the window doubles if the caller keeps iterating, so a consumer that stops
+    after a few items (top-k with de-duplication) never sorts the whole array.
+    """
+    n = len(scores)
+    seen = set()
+    m = max(1, block)
+    while len(seen) < n:
+        m = min(m, n)
+        if m < n:
+            # everything tied with the m-th best too, so tie order stays by position
+            kth = scores[np.argpartition(-scores, m - 1)[m - 1]]
+            part = np.flatnonzero(scores >= kth)
+        else:
+            part = np.arange(n)
+        order = part[np.lexsort((part, -scores[part]))]
+        for p in order.tolist():
+            if p not in seen:
+                seen.add(p)
+                yield p
+        m *= 2
+
+
+def idf(n_docs: int, df: int) -> float:
+    # BM25+ style idf that never goes negative for very common terms
+    return math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+
+
+def bm25_top(keywords, tokens, n: int):
+    """Top-n chunks for ``tokens`` by BM25 over the inverted index.
+
+    Returns ``(chunk_ids, scores)`` sorted by descending score.
+    """
+    n_docs = len(keywords)
+    if not n_docs or not tokens:
+        return _EMPTY_IDS, _EMPTY_SCORES
+    doc_len = keywords.doc_len_array()
+    avgdl = keywords.avg_doc_len() or 1.0
+
+    id_parts, score_parts = [], []
+    for t in dict.fromkeys(tokens):
+        p = keywords.postings.get(t)
+        if p is None or not len(p.ids):
+            continue
+        ids = p.ids_array()
+        tf = p.tf_array().astype(np.float32)
+        norm = BM25_K1 * (1.0 - BM25_B + BM25_B * doc_len[ids] / avgdl)
+        id_parts.append(ids)
+        score_parts.append(idf(n_docs, len(ids)) * tf * (BM25_K1 + 1.0) / (tf + norm))
+    if not id_parts:
+        return _EMPTY_IDS, _EMPTY_SCORES
+
+    if len(id_parts) == 1:
+        uniq, totals = id_parts[0].astype(np.int64), score_parts[0]
+    else:
+        uniq, inv = np.unique(np.concatenate(id_parts), return_inverse=True)
+        totals = np.bincount(inv, weights=np.concatenate(score_parts)).astype(np.float32)
+        uniq = uniq.astype(np.int64)
+    return _top(uniq, totals, n)
+
+
+def align(ids: np.ndarray, src_ids: np.ndarray, src_values: np.ndarray, fill: float = 0.0) -> np.ndarray:
+    """Values of ``src_values`` looked up by id for every entry of ``ids`` (``fill`` if absent)."""
+    out = np.full(len(ids), fill, dtype=np.float32)
+    if not len(src_ids) or not len(ids):
+        return out
+    order = np.argsort(src_ids, kind="stable")
+    sorted_ids = src_ids[order]
+    pos = np.searchsorted(sorted_ids, ids)
+    pos = np.clip(pos, 0, len(sorted_ids) - 1)
+    hit = sorted_ids[pos] == ids
+    out[hit] = np.asarray(src_values, dtype=np.float32)[order][pos[hit]]
+    return out
+
+
+def rrf_fuse(ranked_ids, weights, k: int = None):
+    """Weighted reciprocal-rank fusion of several ranked id arrays.
+
+    Scores are normalized so a candidate ranked first in every list gets 1.0.
+    Returns ``(ids, scores)`` sorted by descending fused score.
+    """
+    k = RRF_K if k is None else k
+    parts = [(np.asarray(ids, dtype=np.int64), w) for ids, w in zip(ranked_ids, weights) if len(ids)]
+    if not parts:
+        return _EMPTY_IDS, _EMPTY_SCORES
+    all_ids = np.concatenate([ids for ids, _ in parts])
+    contrib = np.concatenate([w / (k + np.arange(1, len(ids) + 1, dtype=np.float32)) for ids, w in parts])
+    uniq, inv = np.unique(all_ids, return_inverse=True)
+    scores = np.bincount(inv, weights=contrib).astype(np.float32)
+    scores /= sum(weights) / (k + 1.0)
+    return _top(uniq, scores, len(uniq))
+
+
+def _minmax(x: np.ndarray) -> np.ndarray:
+    if not len(x):
+        return x
+    lo, hi = float(x.min()), float(x.max())
+    if hi - lo < 1e-9:
+        return np.ones_like(x)
+    return (x - lo) / (hi - lo)
+
+
+def weighted_fuse(ranked_ids, ranked_scores, weights):
+    """Weighted sum of per-list min-max normalized scores (absent = 0)."""
+    parts = [(np.asarray(i, dtype=np.int64), np.asarray(s, dtype=np.float32), w)
+             for i, s, w in zip(ranked_ids, ranked_scores, weights) if len(i)]
+    if not parts:
+        return _EMPTY_IDS, _EMPTY_SCORES
+    uniq = np.unique(np.concatenate([i for i, _, _ in parts]))
+    scores = np.zeros(len(uniq), dtype=np.float32)
+    for ids, s, w in parts:
+        scores += w * align(uniq, ids, _minmax(s))
+    scores /= sum(weights)
+    return _top(uniq, scores, len(uniq))
+
+
+def fuse(ranked_ids, ranked_scores, weights, method: str = None):
+    method = method or RANK_FUSION
+    if method == "weighted":
+        return weighted_fuse(ranked_ids, ranked_scores, weights)
+    return rrf_fuse(ranked_ids, weights)
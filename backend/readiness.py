@@ -0,0 +1,81 @@
+"""Startup progress of the service's heavy components, for /ready and /status.
+
+The embedding model, the search index and the OCR reader are loaded lazily
+or on background threads, so the server can bind right away. Each load runs
+inside ``loading(name)``, which records its state (pending / loading /
+ready / failed) and duration; once every registered component has settled a
+startup breakdown is printed:
+
+    with readiness.loading("index"):
+        _recover_index()
+"""
+import time
+import threading
+from contextlib import contextmanager
+
+# process start, as seen by the first import of this module (moved back by record())
+_T0 = time.perf_counter()
+_lock = threading.Lock()
+_components = {}
+_reported = False
+
+
+def register(*names):
+    """Declare components that startup waits for (shown as pending until loaded)."""
+    with _lock:
+        for name in names:
+            _components.setdefault(name, {"state": "pending"})
+
+
+def record(name: str, seconds: float):
+    """Record a step that just finished and was timed elsewhere (e.g. module imports) as ready."""
+    global _T0
+    now = time.perf_counter()
+    with _lock:
+        _T0 = min(_T0, now - seconds)  # it started before this module was imported
+        _components[name] = {"state": "ready", "seconds": round(seconds, 3), "ready_at": round(now - _T0, 3)}
+
+
+@contextmanager
+def loading(name: str):
+    start = time.perf_counter()
+    with _lock:
+        _components[name] = {"state": "loading", "started_at": round(start - _T0, 3)}
+    try:
+        yield
+    except Exception as e:
+        with _lock:
+            _components[name].update(state="failed", error=str(e), seconds=round(time.perf_counter() - start, 3))
+        _maybe_report()
+        raise
+    now = time.perf_counter()
+    with _lock:
+        _components[name].update(state="ready", seconds=round(now - start, 3), ready_at=round(now - _T0, 3))
+    _maybe_report()
+
+
+def is_ready(*names) -> bool:
+    with _lock:
+        return all(_components.get(n, {}).get("state") == "ready" for n in names)
+
+
+def snapshot() -> dict:
+    with _lock:
+        return {
+            "uptime_seconds": round(time.perf_counter() - _T0, 3),
+            "components": {name: dict(c) for name, c in _components.items()},
+        }
+
+
+def _maybe_report():
+    global _reported
+    with _lock:
+        if _reported or any(c["state"] in ("pending", "loading") for c in _components.values()):
+            return
+        _reported = True
+        rows = sorted(_components.items(), key=lambda kv: kv[1].get("ready_at", kv[1].get("seconds", 0)))
+    print(f"🚦 Startup breakdown ({time.perf_counter() - _T0:.1f}s since start)", flush=True)
+    print(f"   {'component':<14}{'state':>8}{'took':>9}{'ready at':>10}", flush=True)
+    for name, c in rows:
+        ready_at = f"{c['ready_at']:.2f}s" if "ready_at" in c else "-"
+        print(f"   {name:<14}{c['state']:>8}{c.get('seconds', 0.0):>8.2f}s{ready_at:>10}", flush=True)
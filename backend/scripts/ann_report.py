@@ -0,0 +1,138 @@
+"""Recall-vs-latency report for the ANN index backends and vector storages.
+
+Compares HNSW (over several efSearch values) and IVF-PQ (over several nprobe
+values) against the exact IndexFlatL2 on the vectors stored in data/index,
+then the compressed flat storages (fp16 / int8 / pq, see ann.VECTOR_STORAGE)
+with and without exact re-scoring of --rescore x k candidates. MB/1M is the
+serialized index size per million chunks (what is held in RAM); disk MB/1M
+adds the exact float32 copy the segment log keeps for re-scoring and
+retraining (see ann.py), so compressed storage saves far less on disk.
+Without --synthetic the measured size of data/index is printed too.
+Queries are held-out corpus vectors, so the report needs no embedding model.
+
+Usage (from backend/):
+    python scripts/ann_report.py [--queries 500] [--k 10] [--rescore 4] [--synthetic 100000]
+"""
+import os
+import sys
+import time
+import argparse
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ann
+from segment_store import SegmentStore
+
+INDEX_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'index'))
+
+
+def _timed_search(index, queries, k):
+    t0 = time.perf_counter()
+    _, ids = index.search(queries, k)
+    return ids, (time.perf_counter() - t0) * 1000.0 / len(queries)
+
+
+def _rescored_search(index, corpus, queries, k, factor):
+    t0 = time.perf_counter()
+    _, cand = index.search(queries, k * factor)
+    found = np.full((len(queries), k), -1, dtype=np.int64)
+    for row, q in enumerate(queries):
+        ids = cand[row][cand[row] >= 0]
+        d = ((corpus[ids] - q) ** 2).sum(axis=1)
+        top = ids[np.argsort(d, kind="stable")[:k]]
+        found[row, :len(top)] = top
+    return found, (time.perf_counter() - t0) * 1000.0 / len(queries)
+
+
+def _mb_per_million(index) -> float:
+    return len(faiss.serialize_index(index)) / max(index.ntotal, 1) * 1e6 / 2 ** 20
+
+
+def _exact_mb_per_million(dim: int) -> float:
+    return 4 * dim * 1e6 / 2 ** 20
+
+
+def _recall(found, truth):
+    k = truth.shape[1]
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / float(truth.shape[0] * k)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--queries", type=int, default=500)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--rescore", type=int, default=4, help="candidates per result re-scored exactly")
+    ap.add_argument("--synthetic", type=int, default=0, help="use N random vectors instead of data/index")
+    args = ap.parse_args()
+
+    if args.synthetic:
+        vectors = np.random.default_rng(0).standard_normal((args.synthetic, 384)).astype("float32")
+    else:
+        vectors = SegmentStore(INDEX_DIR).base_vectors()
+        if vectors is None or len(vectors) == 0:
+            print("NO_VECTORS_FOUND (index some documents or pass --synthetic N)")
+            return
+        vectors = np.ascontiguousarray(vectors, dtype="float32")
+        usage = SegmentStore(INDEX_DIR).disk_usage()
+        per_m = 1e6 / len(vectors) / 2 ** 20
+        print(f"💾 data/index on disk: {usage['total'] / 2 ** 20:.1f} MB for {len(vectors)} vectors "
+              f"({usage['total'] * per_m:.0f} MB/1M) - index {usage['index'] / 2 ** 20:.1f}, "
+              f"exact vectors {usage['vectors'] / 2 ** 20:.1f}, deltas {usage['deltas'] / 2 ** 20:.1f}, "
+              f"chunks {usage['chunks'] / 2 ** 20:.1f}, other {usage['sidecars'] / 2 ** 20:.1f} MB")
+
+    rng = np.random.default_rng(42)
+    nq = min(args.queries, max(1, len(vectors) // 10))
+    mask = np.zeros(len(vectors), dtype=bool)
+    mask[rng.choice(len(vectors), size=nq, replace=False)] = True
+    queries, corpus = vectors[mask], vectors[~mask]
+    k = min(args.k, len(corpus))
+
+    print(f"📊 ANN report: corpus={len(corpus)} queries={nq} k={k}")
+    flat = faiss.IndexFlatL2(corpus.shape[1])
+    flat.add(corpus)
+    truth, flat_ms = _timed_search(flat, queries, k)
+
+    rows = [("flat", "fp32", 0.0, 1.0, flat_ms, _mb_per_million(flat))]
+    sweeps = {"hnsw": ("efSearch", [16, 32, 64, 128, 256]), "ivfpq": ("nprobe", [1, 4, 16, 64])}
+    for backend, (knob, values) in sweeps.items():
+        t0 = time.perf_counter()
+        try:
+            idx = ann.build_index(backend, corpus)
+        except Exception as e:
+            print(f"   ⚠️ {backend} build failed: {e}")
+            continue
+        build_s = time.perf_counter() - t0
+        for v in values:
+            ann.tune(idx, ef_search=v, nprobe=v)
+            found, ms = _timed_search(idx, queries, k)
+            rows.append((backend, f"{knob}={v}", build_s, _recall(found, truth), ms, _mb_per_million(idx)))
+
+    for storage in ("fp16", "int8", "pq"):
+        t0 = time.perf_counter()
+        try:
+            idx = ann.build_index("flat", corpus, storage=storage)
+        except Exception as e:
+            print(f"   ⚠️ {storage} build failed: {e}")
+            continue
+        build_s = time.perf_counter() - t0
+        mb = _mb_per_million(idx)
+        found, ms = _timed_search(idx, queries, k)
+        rows.append(("flat", storage, build_s, _recall(found, truth), ms, mb))
+        if args.rescore > 1:
+            found, ms = _rescored_search(idx, corpus, queries, k, args.rescore)
+            rows.append(("flat", f"{storage}+rescore", build_s, _recall(found, truth), ms, mb))
+
+    exact_mb = _exact_mb_per_million(corpus.shape[1])
+    print(f"\n{'backend':<8} {'param':<14} {'build s':>8} {'recall@' + str(k):>10} {'ms/query':>9} {'speedup':>8} "
+          f"{'MB/1M':>8} {'disk MB/1M':>11}")
+    for backend, param, build_s, recall, ms, mb in rows:
+        speedup = flat_ms / ms if ms > 0 else float("inf")
+        print(f"{backend:<8} {param:<14} {build_s:>8.1f} {recall:>10.3f} {ms:>9.3f} {speedup:>7.1f}x {mb:>8.1f} "
+              f"{mb + exact_mb:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
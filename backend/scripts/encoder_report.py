@@ -0,0 +1,144 @@
+"""Accuracy and throughput report for the embedding backends (see encoder.py).
+
+Encodes the same chunks with PyTorch (the reference), ONNX Runtime and int8
+ONNX Runtime, and reports per backend:
+
+    cosine     min / mean cosine similarity to the PyTorch vector of each chunk
+    fixed      mean cosine on encoder.PARITY_SENTENCES (encoder.check_parity)
+    top10      overlap of each chunk's 10 nearest neighbours with PyTorch's
+    chunks/s   ingestion throughput at EMBED_BATCH_SIZE
+    query ms   p50 latency of single-query encodes
+
+Chunks are 500-char slices of the indexed documents (like ingestion), or
+synthetic sentences when the database is empty. Exits non-zero when a
+backend's minimum cosine is below --min-cosine or it fails check_parity, so
+it can gate switching EMBED_BACKEND.
+
+Usage (from backend/):
+    python scripts/encoder_report.py [--chunks 2000] [--queries 200] [--min-cosine 0.98]
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import encoder
+
+MODEL_NAME = "all-MiniLM-L6-v2"  # embed.MODEL_NAME (not imported: that loads the index)
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+
+
+def _corpus_chunks(limit: int) -> list:
+    from db import SessionLocal, Document
+    db = SessionLocal()
+    try:
+        chunks = []
+        for (clean,) in db.query(Document.clean).filter(Document.deleted_at.is_(None)).yield_per(100):
+            clean = clean or ""
+            chunks.extend(c for c in (clean[i:i + 500] for i in range(0, len(clean), 500)) if c.strip())
+            if len(chunks) >= limit:
+                break
+        return chunks[:limit]
+    finally:
+        db.close()
+
+
+def _synthetic_chunks(n: int) -> list:
+    rng = np.random.default_rng(0)
+    words = ("invoice contract payment delivery report meeting schedule budget policy customer "
+             "service network server backup storage request approval review quarterly annual "
+             "summary revenue forecast project deadline team manager office document scanned").split()
+    return [" ".join(rng.choice(words, size=rng.integers(8, 80))) for _ in range(n)]
+
+
+def _cosine(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.clip(np.linalg.norm(a, axis=1, keepdims=True), 1e-12, None)
+    b = b / np.clip(np.linalg.norm(b, axis=1, keepdims=True), 1e-12, None)
+    return (a * b).sum(axis=1)
+
+
+def _neighbours(vectors: np.ndarray, k: int) -> np.ndarray:
+    v = vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+    sims = v @ v.T
+    np.fill_diagonal(sims, -np.inf)
+    return np.argsort(-sims, axis=1)[:, :k]
+
+
+def _overlap(found: np.ndarray, truth: np.ndarray) -> float:
+    return sum(len(set(f) & set(t)) for f, t in zip(found, truth)) / float(truth.size)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--model", default=MODEL_NAME)
+    ap.add_argument("--chunks", type=int, default=2000)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--min-cosine", type=float, default=0.98)
+    ap.add_argument("--synthetic", action="store_true", help="use synthetic chunks instead of the database")
+    ap.add_argument("--backends", default=",".join(encoder.BACKENDS))
+    args = ap.parse_args()
+
+    chunks = [] if args.synthetic else _corpus_chunks(args.chunks)
+    if not chunks:
+        chunks = _synthetic_chunks(args.chunks)
+    queries = [c[:80] for c in chunks[:args.queries]]
+    k = min(args.k, len(chunks) - 1)
+    backends = [b for b in args.backends.split(",") if b]
+    if "torch" not in backends:
+        backends.insert(0, "torch")
+    print(f"📊 Encoder report: model={args.model} chunks={len(chunks)} queries={len(queries)} "
+          f"batch={EMBED_BATCH_SIZE} threads={os.cpu_count()}")
+
+    rows, reference, truth, failed, ref_enc = [], None, None, False, None
+    for backend in backends:
+        try:
+            t0 = time.perf_counter()
+            enc = encoder.load(args.model, backend)
+            enc.encode(["warm up"], show_progress_bar=False)
+            load_s = time.perf_counter() - t0
+        except Exception as e:
+            print(f"   ⚠️ {backend} unavailable: {e}")
+            continue
+        t0 = time.perf_counter()
+        vectors = np.asarray(enc.encode(chunks, batch_size=EMBED_BATCH_SIZE, show_progress_bar=False), dtype="float32")
+        rate = len(chunks) / (time.perf_counter() - t0)
+        latencies = []
+        for q in queries:
+            t0 = time.perf_counter()
+            enc.encode([q], show_progress_bar=False)
+            latencies.append((time.perf_counter() - t0) * 1000.0)
+        if reference is None:
+            reference, truth = vectors, _neighbours(vectors, k)
+        cos = _cosine(vectors, reference)
+        overlap = _overlap(_neighbours(vectors, k), truth)
+        if ref_enc is None:
+            ref_enc = enc
+        try:
+            fixed = float(encoder.check_parity(enc, ref_enc, backend).mean())
+        except AssertionError as e:
+            print(f"   ❌ {e}")
+            fixed, failed = float("nan"), True
+        rows.append((backend, load_s, float(cos.min()), float(cos.mean()), fixed, overlap, rate,
+                     float(np.median(latencies))))
+        if cos.min() < args.min_cosine:
+            failed = True
+        del enc
+
+    base_rate = rows[0][6] if rows else 0.0
+    print(f"\n{'backend':<10} {'load s':>7} {'cos min':>8} {'cos mean':>9} {'fixed':>8} {'top' + str(k):>6} "
+          f"{'chunks/s':>9} {'speedup':>8} {'query ms':>9}")
+    for backend, load_s, cmin, cmean, fixed, overlap, rate, p50 in rows:
+        speedup = rate / base_rate if base_rate else 0.0
+        print(f"{backend:<10} {load_s:>7.1f} {cmin:>8.4f} {cmean:>9.5f} {fixed:>8.5f} {overlap:>6.3f} "
+              f"{rate:>9.1f} {speedup:>7.2f}x {p50:>9.2f}")
+    if failed:
+        print(f"\n❌ A backend's minimum cosine is below {args.min_cosine} or it failed check_parity")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
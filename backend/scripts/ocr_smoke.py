@@ -17,8 +17,10 @@ if not pdfs:
 
 fp = pdfs[0]
 print('TEST_FILE:', fp)
-raw, clean = extract_text(fp)
+report = []
+raw, clean = extract_text(fp, report=report)
 print('RAW_LEN:', len(raw), 'CLEAN_LEN:', len(clean))
+print('PAGES:', {m: sum(1 for r in report if r['method'] == m) for m in sorted({r['method'] for r in report})})
 print('\n---- CLEAN SAMPLE ----\n')
 print(clean[:1000])
 print('\n---- END SAMPLE ----\n')
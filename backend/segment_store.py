@@ -0,0 +1,433 @@
+"""Append-only on-disk log for the FAISS index and its chunk metadata.
+
+Layout under the store directory::
+
+    manifest.json        points at the current base snapshot
+    base-000040.index    compacted FAISS index (all vectors up to segment 40)
+    base-000040.vectors.npy  exact float32 vectors for the base (memory-mapped)
+    base-000040.<name>   chunk metadata and other sidecars (e.g. columnar chunk
+                         store, postings), written by the caller
+    seg-000041.npy       delta vectors (float32, n x dim) appended by add_text
+    seg-000041.jsonl     chunk metadata for the delta, same row order
+
+A delta segment is committed once its ``.jsonl`` file exists: the vectors are
+renamed into place first, the metadata last. On recovery the base snapshot is
+loaded and every committed segment after it is replayed in order; a torn tail
+segment (crash mid-write) is discarded. Compaction folds the deltas into a new
+base snapshot and is meant to run on a background thread.
+
+The ``.index`` file holds whatever index the service serves (flat or ANN,
+possibly compressed); the ``.vectors.npy`` file always keeps the exact
+vectors so ANN indexes can be retrained and evaluated against ground truth
+without re-encoding, and lossy results re-scored (see ExactVectors). Delta
+segments are float32 for the same reason. Compressed VECTOR_STORAGE
+therefore shrinks RAM, not disk: the exact copy is the larger part of the
+store (``disk_usage`` reports the split).
+"""
+import io
+import os
+import re
+import json
+import threading
+from datetime import datetime
+
+import faiss
+import numpy as np
+
+MANIFEST = "manifest.json"
+_SEG_RE = re.compile(r"^seg-(\d+)\.(npy|jsonl)$")
+_BASE_RE = re.compile(r"^base-(\d+)\.([\w.]+)$")
+
+
+def _name(prefix: str, seq: int) -> str:
+    return f"{prefix}-{seq:06d}"
+
+
+def _atomic_write(path: str, data: bytes):
+    """Write bytes to ``path`` via a fsync'd temp file and an atomic rename."""
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _jsonl_bytes(rows) -> bytes:
+    return "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in rows).encode("utf-8")
+
+
+def _npy_bytes(array) -> bytes:
+    buf = io.BytesIO()
+    np.save(buf, np.ascontiguousarray(array, dtype="float32"))
+    return buf.getvalue()
+
+
+def _read_jsonl(path: str) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class ExactVectors:
+    """Exact float32 vectors by chunk id, without holding the base in RAM.
+
+    Rows are the base snapshot's ``.vectors.npy`` (memory-mapped) followed by
+    appended parts: the replayed delta segments (also memory-mapped) and the
+    arrays added since. ``rows(ids)`` only touches the pages of those ids.
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self._lock = threading.Lock()
+        # (parts, cumulative row counts), swapped as one tuple so readers need no lock
+        self._state = ([], np.zeros(0, dtype=np.int64))
+
+    def __len__(self) -> int:
+        ends = self._state[1]
+        return int(ends[-1]) if len(ends) else 0
+
+    def _set(self, parts):
+        parts = [p for p in parts if len(p)]
+        self._state = (parts, np.cumsum([len(p) for p in parts], dtype=np.int64))
+
+    def reset(self, parts=()):
+        with self._lock:
+            self._set(list(parts))
+
+    def add(self, vectors):
+        with self._lock:
+            self._set(self._state[0] + [np.ascontiguousarray(vectors, dtype="float32")])
+
+    def rows(self, ids) -> np.ndarray:
+        """Vectors of ``ids`` (all < len(self)) as an (n, dim) float32 array."""
+        ids = np.asarray(ids, dtype=np.int64)
+        parts, ends = self._state
+        out = np.empty((len(ids), self.dim), dtype="float32")
+        which = np.searchsorted(ends, ids, side="right")
+        for p in np.unique(which).tolist():
+            sel = which == p
+            start = int(ends[p - 1]) if p else 0
+            out[sel] = parts[p][ids[sel] - start]
+        return out
+
+    def to_array(self) -> np.ndarray:
+        return self.rows(np.arange(len(self)))
+
+    def rebase(self, base, n: int):
+        """Serve rows ``< n`` from ``base`` (a new snapshot's vectors), dropping the parts it covers."""
+        with self._lock:
+            total = len(self)
+            tail = self.rows(np.arange(n, total)) if total > n else np.zeros((0, self.dim), dtype="float32")
+            self._set([base[:n], tail])
+
+
+class SegmentStore:
+    def __init__(self, root: str, compact_every: int = 64):
+        self.root = root
+        self.compact_every = compact_every
+        self.base_seq = 0
+        self.last_seq = 0
+        self._compacting = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    # ---------- PATHS ----------
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def _segment_seqs(self) -> list:
+        seqs = set()
+        for fname in os.listdir(self.root):
+            m = _SEG_RE.match(fname)
+            if m:
+                seqs.add(int(m.group(1)))
+        return sorted(seqs)
+
+    def _remove(self, fname: str):
+        try:
+            os.remove(self._path(fname))
+        except OSError:
+            # missing, or still memory-mapped on Windows; retried on the next compaction
+            pass
+
+    @property
+    def pending(self) -> int:
+        """Number of delta segments written since the last base snapshot."""
+        return self.last_seq - self.base_seq
+
+    def exists(self) -> bool:
+        return os.path.exists(self._path(MANIFEST))
+
+    def read_manifest(self) -> dict:
+        try:
+            with open(self._path(MANIFEST), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def base_vectors(self):
+        """Exact vectors of the current base snapshot as a read-only memmap (or None)."""
+        manifest = self.read_manifest()
+        if not manifest.get("base"):
+            return None
+        path = self._path(manifest["base"] + ".vectors.npy")
+        if not os.path.exists(path):
+            return None
+        return np.load(path, mmap_mode="r")
+
+    def delta_vectors(self) -> list:
+        """Memory-mapped vectors of the committed delta segments after the base, in order."""
+        return [np.load(self._path(_name("seg", s) + ".npy"), mmap_mode="r")
+                for s in range(self.base_seq + 1, self.last_seq + 1)]
+
+    def base_path(self, suffix: str):
+        """Path of a sidecar written with the current base snapshot (or None)."""
+        manifest = self.read_manifest()
+        if not manifest.get("base") or suffix not in manifest.get("sidecars", []):
+            return None
+        path = self._path(manifest["base"] + "." + suffix)
+        return path if os.path.exists(path) else None
+
+    def read_sidecar(self, suffix: str):
+        """Bytes of a sidecar written with the current base snapshot (or None)."""
+        path = self.base_path(suffix)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def disk_usage(self) -> dict:
+        """Bytes on disk by kind: index, exact vectors, deltas, chunks, other sidecars, total."""
+        usage = {"index": 0, "vectors": 0, "deltas": 0, "chunks": 0, "sidecars": 0}
+        for fname in os.listdir(self.root):
+            try:
+                size = os.path.getsize(self._path(fname))
+            except OSError:
+                continue  # removed by a concurrent compaction
+            if _SEG_RE.match(fname):
+                usage["deltas"] += size
+            elif fname.endswith(".index"):
+                usage["index"] += size
+            elif fname.endswith(".vectors.npy"):
+                usage["vectors"] += size
+            elif ".chunks." in fname:
+                usage["chunks"] += size
+            elif _BASE_RE.match(fname):
+                usage["sidecars"] += size
+        usage["total"] = sum(usage.values())
+        return usage
+
+    # ---------- RECOVERY ----------
+
+    def recover(self, new_index):
+        """Load the base snapshot and replay committed segments.
+
+        ``new_index`` is a zero-arg factory used when there is no base yet.
+        Returns ``(index, chunks)`` where ``chunks`` are the replayed delta rows
+        only; the base's chunk metadata lives in sidecars the caller opens.
+        Raises if the base snapshot is unreadable so the caller can fall back
+        to a rebuild.
+        """
+        for fname in os.listdir(self.root):
+            if fname.endswith(".tmp"):
+                self._remove(fname)
+
+        manifest = self.read_manifest()
+        if manifest.get("base"):
+            index = faiss.read_index(self._path(manifest["base"] + ".index"))
+            if index.ntotal != int(manifest.get("count", -1)):
+                raise ValueError(f"base snapshot mismatch: {index.ntotal} vectors, {manifest.get('count')} chunks")
+            chunks = []
+            self.base_seq = int(manifest.get("last_seq", 0))
+        else:
+            index, chunks = new_index(), []
+            self.base_seq = 0
+
+        expected = self.base_seq + 1
+        replayed = 0
+        broken = False
+        for seq in self._segment_seqs():
+            name = _name("seg", seq)
+            if seq <= self.base_seq:
+                # already folded into the base by a compaction that crashed before cleanup
+                self._remove(name + ".npy")
+                self._remove(name + ".jsonl")
+                continue
+            if not broken:
+                try:
+                    if seq != expected:
+                        raise ValueError(f"gap before segment {seq}")
+                    vecs = np.load(self._path(name + ".npy"))
+                    meta = _read_jsonl(self._path(name + ".jsonl"))
+                    if len(vecs) != len(meta):
+                        raise ValueError(f"segment {seq}: {len(vecs)} vectors, {len(meta)} chunks")
+                    index.add(np.ascontiguousarray(vecs, dtype="float32"))
+                    chunks.extend(meta)
+                    expected += 1
+                    replayed += 1
+                    continue
+                except Exception as e:
+                    print(f"⚠️ Discarding incomplete segment {seq} and later: {e}", flush=True)
+                    broken = True
+            self._remove(name + ".npy")
+            self._remove(name + ".jsonl")
+
+        self.last_seq = expected - 1
+        print(f"📂 Recovered index: base={self.base_seq} segments={replayed} vectors={index.ntotal}", flush=True)
+        return index, chunks
+
+    def reset(self):
+        """Drop every base snapshot and segment (used before a full rebuild)."""
+        for fname in os.listdir(self.root):
+            if _SEG_RE.match(fname) or _BASE_RE.match(fname) or fname == MANIFEST or fname.endswith(".tmp"):
+                self._remove(fname)
+        self.base_seq = 0
+        self.last_seq = 0
+
+    # ---------- WRITES ----------
+
+    def append(self, vectors, chunks) -> int:
+        """Commit one delta segment. Callers must serialize appends."""
+        vectors = np.ascontiguousarray(vectors, dtype="float32")
+        if len(vectors) != len(chunks):
+            raise ValueError("vectors and chunks must have the same length")
+        seq = self.last_seq + 1
+        name = _name("seg", seq)
+
+        npy_tmp = self._path(name + ".npy.tmp")
+        with open(npy_tmp, "wb") as f:
+            np.save(f, vectors)
+            f.flush()
+            os.fsync(f.fileno())
+        meta_tmp = self._path(name + ".jsonl.tmp")
+        with open(meta_tmp, "wb") as f:
+            f.write(_jsonl_bytes(chunks))
+            f.flush()
+            os.fsync(f.fileno())
+        # vectors first, metadata last: the .jsonl rename is the commit point
+        os.replace(npy_tmp, self._path(name + ".npy"))
+        os.replace(meta_tmp, self._path(name + ".jsonl"))
+
+        self.last_seq = seq
+        return seq
+
+    def _write_base_vectors(self, path: str, upto_seq: int, count: int, vectors=None) -> bool:
+        """Write the exact vectors for a base, streaming old base + deltas when not given."""
+        if vectors is not None:
+            _atomic_write(path, _npy_bytes(vectors))
+            return True
+        old = self.base_vectors()
+        if old is None:
+            return False
+        manifest = self.read_manifest()
+        old_seq = int(manifest.get("last_seq", 0))
+        if old_seq == upto_seq and len(old) == count:
+            return True  # same base, vectors unchanged
+        parts = [old] + [np.load(self._path(_name("seg", s) + ".npy"), mmap_mode="r") for s in range(old_seq + 1, upto_seq + 1)]
+        total = sum(len(p) for p in parts)
+        if total != count:
+            print(f"⚠️ Vector log has {total} rows but snapshot has {count}; skipping exact vectors", flush=True)
+            return False
+        tmp = path + ".tmp"
+        out = np.lib.format.open_memmap(tmp, mode="w+", dtype="float32", shape=(total, old.shape[1]))
+        pos = 0
+        for p in parts:
+            out[pos:pos + len(p)] = p
+            pos += len(p)
+        out.flush()
+        del out
+        os.replace(tmp, path)
+        return True
+
+    def write_base(self, index_bytes, count: int, upto_seq: int, extra: dict = None, vectors=None,
+                   sidecars: dict = None, writers: dict = None):
+        """Write a base snapshot covering every segment up to ``upto_seq``.
+
+        ``index_bytes`` is the output of ``faiss.serialize_index`` so the
+        snapshot can be taken under the caller's lock and written outside it.
+        ``vectors`` (exact float32) is only needed when there is no previous
+        base to extend, e.g. when seeding the log. ``sidecars`` maps a file
+        suffix to bytes stored next to the base (see ``read_sidecar``);
+        ``writers`` maps a suffix to ``fn(path)`` for sidecars too large to
+        hold as bytes (see ``base_path``). ``count`` is the number of chunks.
+        """
+        name = _name("base", upto_seq)
+        keep = {name + ".index"}
+        if self._write_base_vectors(self._path(name + ".vectors.npy"), upto_seq, count, vectors):
+            keep.add(name + ".vectors.npy")
+        _atomic_write(self._path(name + ".index"), np.asarray(index_bytes).tobytes())
+        for suffix, data in (sidecars or {}).items():
+            _atomic_write(self._path(name + "." + suffix), data)
+            keep.add(name + "." + suffix)
+        for suffix, write in (writers or {}).items():
+            path = self._path(name + "." + suffix)
+            write(path + ".tmp")
+            with open(path + ".tmp", "rb+") as f:
+                os.fsync(f.fileno())
+            os.replace(path + ".tmp", path)
+            keep.add(name + "." + suffix)
+
+        manifest = {
+            "base": name,
+            "last_seq": upto_seq,
+            "saved_at": datetime.utcnow().isoformat() + "Z",
+            "count": count,
+            "sidecars": sorted(set(sidecars or {}) | set(writers or {})),
+        }
+        if extra:
+            manifest.update(extra)
+        _atomic_write(self._path(MANIFEST), json.dumps(manifest).encode("utf-8"))
+        self.base_seq = max(self.base_seq, upto_seq)
+
+        # the manifest now points at the new base; older files are garbage
+        for fname in os.listdir(self.root):
+            if _BASE_RE.match(fname) and fname not in keep:
+                self._remove(fname)
+                continue
+            m = _SEG_RE.match(fname)
+            if m and int(m.group(1)) <= upto_seq:
+                self._remove(fname)
+
+    def needs_compaction(self) -> bool:
+        return self.pending >= self.compact_every and not self._compacting.locked()
+
+    def compact(self, snapshot):
+        """Run a compaction now, waiting for any in-flight one to finish first.
+
+        ``snapshot`` must return the ``write_base`` keyword arguments
+        (``index_bytes``, ``count``, ``upto_seq`` and optionally ``extra`` /
+        ``vectors`` / ``sidecars`` / ``writers``) captured consistently, i.e.
+        under the caller's index lock. An optional ``after`` entry is called
+        once the base is on disk.
+        """
+        with self._compacting:
+            self._compact(snapshot)
+
+    def _compact(self, snapshot):
+        try:
+            snap = snapshot()
+            after = snap.pop("after", None)
+            self.write_base(**snap)
+            if after is not None:
+                after()
+            print(f"🗜️ Compacted index log up to segment {snap['upto_seq']} ({snap['count']} chunks)", flush=True)
+        except Exception as e:
+            print(f"⚠️ Index compaction failed: {e}", flush=True)
+
+    def compact_async(self, snapshot):
+        """Run a compaction on a daemon thread; overlapping requests are dropped."""
+        if not self._compacting.acquire(blocking=False):
+            return None
+
+        def _run():
+            try:
+                self._compact(snapshot)
+            finally:
+                self._compacting.release()
+
+        t = threading.Thread(target=_run, name="index-compaction", daemon=True)
+        t.start()
+        return t
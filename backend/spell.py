@@ -0,0 +1,223 @@
+"""Symmetric-delete (SymSpell-style) spelling correction for OCR output.
+
+Instead of generating every edit of an unknown word (``edits2`` is ~100k
+strings per word) and probing the vocabulary with each, the vocabulary's
+own deletes are precomputed once: every word contributes the strings
+obtained by deleting up to ``max_edit`` characters from its first
+``prefix_length`` characters. An unknown word then only generates its own
+(few dozen) deletes; any vocabulary word sharing one of them is a candidate,
+and candidates are verified with a bounded edit distance (adjacent
+transpositions count as one edit, like the old ``edits1``).
+
+The index is stored compactly as two NumPy arrays, sorted CRC32s of the
+delete strings and the id of the word each came from, in
+
+    data/spell_index.npz
+
+It is built from the wordfreq top list on first use, then loaded once per
+process. A CRC collision only adds a candidate that fails verification.
+Delete the file (or change SPELL_*) to rebuild it.
+"""
+import io
+import os
+import re
+import json
+import zlib
+import threading
+
+import numpy as np
+
+INDEX_PATH = os.getenv(
+    "SPELL_INDEX_PATH",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'spell_index.npz')),
+)
+VOCAB_SIZE = int(os.getenv("SPELL_VOCAB_SIZE", "50000"))
+MAX_EDIT = int(os.getenv("SPELL_MAX_EDIT", "2"))
+PREFIX_LENGTH = int(os.getenv("SPELL_PREFIX_LENGTH", "7"))
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _deletes(word: str, max_edit: int, prefix_length: int) -> set:
+    """``word[:prefix_length]`` and every string made by deleting up to ``max_edit`` chars from it."""
+    word = word[:prefix_length]
+    out = {word}
+    frontier = [word]
+    for _ in range(max_edit):
+        nxt = []
+        for w in frontier:
+            if len(w) <= 1:
+                continue
+            for i in range(len(w)):
+                d = w[:i] + w[i + 1:]
+                if d not in out:
+                    out.add(d)
+                    nxt.append(d)
+        frontier = nxt
+    return out
+
+
+def _hash(s: str) -> int:
+    return zlib.crc32(s.encode("utf-8"))
+
+
+def edit_distance(a: str, b: str, max_dist: int) -> int:
+    """Optimal string alignment distance, or ``max_dist + 1`` once it is certainly larger."""
+    if abs(len(a) - len(b)) > max_dist:
+        return max_dist + 1
+    la, lb = len(a), len(b)
+    prev2 = None
+    prev = list(range(lb + 1))
+    for i in range(1, la + 1):
+        cur = [i] + [0] * lb
+        ca = a[i - 1]
+        for j in range(1, lb + 1):
+            cost = 0 if ca == b[j - 1] else 1
+            v = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if prev2 is not None and j > 1 and ca == b[j - 2] and a[i - 2] == b[j - 1]:
+                v = min(v, prev2[j - 2] + 1)
+            cur[j] = v
+        if min(cur) > max_dist:
+            return max_dist + 1
+        prev2, prev = prev, cur
+    return prev[lb]
+
+
+class SymSpell:
+
+    def __init__(self, words, freqs, hashes, word_ids, max_edit: int = MAX_EDIT, prefix_length: int = PREFIX_LENGTH,
+                 source: str = None):
+        self.words = list(words)
+        self.source = source  # what the vocabulary was built from (rebuild when it changes)
+        self.freqs = np.asarray(freqs, dtype=np.float32)
+        self.hashes = hashes        # uint32, sorted
+        self.word_ids = word_ids    # int32, word of each hash
+        self.max_edit = max_edit
+        self.prefix_length = prefix_length
+        self._rank = {w: i for i, w in enumerate(self.words)}
+
+    @classmethod
+    def build(cls, words, freqs, max_edit: int = MAX_EDIT, prefix_length: int = PREFIX_LENGTH,
+              source: str = None) -> "SymSpell":
+        hashes, ids = [], []
+        for i, w in enumerate(words):
+            for d in _deletes(w, max_edit, prefix_length):
+                hashes.append(_hash(d))
+                ids.append(i)
+        hashes = np.asarray(hashes, dtype=np.uint32)
+        ids = np.asarray(ids, dtype=np.int32)
+        order = np.argsort(hashes, kind="stable")
+        return cls(words, freqs, hashes[order], ids[order], max_edit, prefix_length, source)
+
+    def __contains__(self, word: str) -> bool:
+        return word in self._rank
+
+    def lookup(self, word: str):
+        """Closest vocabulary word (fewest edits, then most frequent), or None."""
+        if word in self._rank:
+            return word
+        probes = np.fromiter((_hash(d) for d in _deletes(word, self.max_edit, self.prefix_length)), dtype=np.uint32)
+        lo = np.searchsorted(self.hashes, probes, side="left")
+        hi = np.searchsorted(self.hashes, probes, side="right")
+        cands = np.unique(np.concatenate([self.word_ids[a:b] for a, b in zip(lo.tolist(), hi.tolist())]))
+        best, best_key = None, None
+        for i in cands.tolist():
+            c = self.words[i]
+            d = edit_distance(word, c, self.max_edit)
+            if d > self.max_edit:
+                continue
+            key = (d, -self.freqs[i])
+            if best_key is None or key < best_key:
+                best, best_key = c, key
+        return best
+
+    def correct(self, text: str, min_len: int = 3) -> str:
+        """Correct every unknown word of ``text`` in one tokenized pass.
+
+        Words shorter than ``min_len``, all-caps words (acronyms) and words with
+        digits are left alone; a capitalized word keeps its capital. Each
+        distinct word is looked up once.
+        """
+        memo = {}
+
+        def fix(m):
+            w = m.group(0)
+            if len(w) < min_len or w.isupper() or any(ch.isdigit() for ch in w):
+                return w
+            if w not in memo:
+                best = self.lookup(w.lower())
+                if best is None or best == w.lower():
+                    memo[w] = w
+                else:
+                    memo[w] = best.capitalize() if w[0].isupper() else best
+            return memo[w]
+
+        return _WORD_RE.sub(fix, text)
+
+    # ---------- PERSISTENCE ----------
+
+    def to_bytes(self) -> bytes:
+        meta = {"words": self.words, "max_edit": self.max_edit, "prefix_length": self.prefix_length, "source": self.source}
+        buf = io.BytesIO()
+        np.savez(
+            buf,
+            meta=np.frombuffer(json.dumps(meta).encode("utf-8"), dtype=np.uint8),
+            freqs=self.freqs,
+            hashes=self.hashes,
+            word_ids=self.word_ids,
+        )
+        return buf.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "SymSpell":
+        z = np.load(io.BytesIO(data))
+        meta = json.loads(z["meta"].tobytes().decode("utf-8"))
+        return cls(meta["words"], z["freqs"], z["hashes"], z["word_ids"], meta["max_edit"], meta["prefix_length"],
+                   meta.get("source"))
+
+
+def _default_source() -> str:
+    return f"wordfreq:en:{VOCAB_SIZE}"
+
+
+def _build_default() -> SymSpell:
+    from wordfreq import top_n_list, zipf_frequency
+    words = top_n_list("en", VOCAB_SIZE)
+    freqs = [zipf_frequency(w, "en") for w in words]
+    return SymSpell.build(words, freqs, source=_default_source())
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> SymSpell:
+    """The correction index: loaded from INDEX_PATH, or built and saved there once."""
+    global _index
+    if _index is not None:
+        return _index
+    with _index_lock:
+        if _index is not None:
+            return _index
+        sym = None
+        try:
+            with open(INDEX_PATH, "rb") as f:
+                sym = SymSpell.from_bytes(f.read())
+            if (sym.source, sym.max_edit, sym.prefix_length) != (_default_source(), MAX_EDIT, PREFIX_LENGTH):
+                sym = None  # built with other settings
+        except (OSError, ValueError, KeyError):
+            sym = None
+        if sym is None:
+            print("🔤 Building spelling correction index...", flush=True)
+            sym = _build_default()
+            try:
+                os.makedirs(os.path.dirname(INDEX_PATH), exist_ok=True)
+                tmp = INDEX_PATH + ".tmp"
+                with open(tmp, "wb") as f:
+                    f.write(sym.to_bytes())
+                os.replace(tmp, INDEX_PATH)
+                print(f"✅ Spelling index saved ({len(sym.words)} words, {len(sym.hashes)} deletes)", flush=True)
+            except OSError as e:
+                print(f"⚠️ Could not save spelling index: {e}", flush=True)
+        _index = sym
+        return _index
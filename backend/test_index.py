@@ -0,0 +1,240 @@
+"""Offline tests for the index and retrieval engine (embed.py and its stores).
+
+Unlike test_endpoints.py / test_speed.py these need no running server and no
+model download: every test gets its own SQLite database and segment log in a
+temp directory, and a hashed bag-of-words encoder stands in for the
+SentenceTransformer.
+
+Run from backend/:
+    python -m pytest -q test_index.py
+"""
+import os
+import re
+import sys
+import zlib
+import tempfile
+import threading
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("EXTRACT_CACHE_DIR", tempfile.mkdtemp(prefix="extract_cache-"))
+
+import db
+
+# point the DB at a scratch file before embed's import-time init_db()
+_ORIGINAL_ENGINE = db.engine
+db.engine = create_engine(f"sqlite:///{tempfile.mkdtemp(prefix='test-db-')}/app.db",
+                          connect_args={"check_same_thread": False})
+db.SessionLocal.configure(bind=db.engine)
+
+import ann
+import embed
+import keyword_index
+from chunk_store import ChunkStore
+from keyword_index import InvertedIndex
+from segment_store import SegmentStore, ExactVectors
+
+
+class _HashEncoder:
+    """Deterministic stand-in for SentenceTransformer: normalized hashed bag of words."""
+
+    device = "cpu"
+
+    def get_sentence_embedding_dimension(self):
+        return embed.EMBED_DIM
+
+    def encode(self, texts, show_progress_bar=False, batch_size=32, **kwargs):
+        out = np.zeros((len(texts), embed.EMBED_DIM), dtype="float32")
+        for i, t in enumerate(texts):
+            for w in re.findall(r"\w+", t.lower()):
+                out[i, zlib.crc32(w.encode()) % embed.EMBED_DIM] += 1.0
+            out[i] /= np.linalg.norm(out[i]) or 1.0
+        return out
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    """A freshly loaded embed module on an empty database and segment log."""
+    test_engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}", connect_args={"check_same_thread": False})
+    monkeypatch.setattr(db, "engine", test_engine)
+    db.SessionLocal.configure(bind=test_engine)
+    db.init_db()
+    monkeypatch.setattr(embed, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(embed, "INDEX_DIR", str(tmp_path / "index"))
+    _restart(monkeypatch)
+    yield embed
+    embed._loaded.clear()
+    db.SessionLocal.configure(bind=db.engine)
+
+
+def _restart(monkeypatch):
+    """Drop embed's in-memory state and load it again from the segment log and the DB."""
+    monkeypatch.setattr(embed, "_store", SegmentStore(embed.INDEX_DIR, compact_every=embed.COMPACT_EVERY))
+    monkeypatch.setattr(embed, "index", ann.initial_index(embed.EMBED_DIM))
+    monkeypatch.setattr(embed, "_exact", ExactVectors(embed.EMBED_DIM))
+    monkeypatch.setattr(embed, "documents", ChunkStore())
+    monkeypatch.setattr(embed, "keywords", InvertedIndex())
+    monkeypatch.setattr(embed, "_dead", np.zeros(0, dtype=bool))
+    monkeypatch.setattr(embed, "model", _HashEncoder())
+    embed._result_cache.clear()
+    embed._loaded.clear()
+    embed.load()
+
+
+def _doc(text, source, url=None, sha=None):
+    return {"raw": text, "clean": text, "source": source, "title": source, "url": url,
+            "content_hash": sha or f"{zlib.crc32(text.encode()):064x}"}
+
+
+def test_same_named_uploads_are_separate_results(engine):
+    ids = engine.add_texts([
+        _doc("Hostel fee payment deadline for first year students", "notice.pdf"),
+        _doc("Hostel fee refund rules for final year students", "notice.pdf"),
+    ])
+    assert len(set(ids)) == 2
+
+    results = engine.retrieve("hostel fee", k=5)
+
+    assert sorted(r["doc_id"] for r in results) == sorted(ids)
+    assert all(r["source"] == "notice.pdf" for r in results)
+
+
+def test_crawled_documents_with_the_same_basename_are_separate_results(engine):
+    ids = engine.add_texts([
+        _doc("Examination timetable notice for the 2024 session", "notice.pdf", url="https://uni.example/2024/notice.pdf"),
+        _doc("Examination timetable notice for the 2025 session", "notice.pdf", url="https://uni.example/2025/notice.pdf"),
+    ])
+
+    results = engine.retrieve("examination timetable", k=5)
+
+    assert sorted(r["url"] for r in results) == ["https://uni.example/2024/notice.pdf", "https://uni.example/2025/notice.pdf"]
+    assert sorted(r["doc_id"] for r in results) == sorted(ids)
+
+
+def test_phrase_ids_agree_with_has_phrase():
+    ix = InvertedIndex()
+    rng = np.random.default_rng(0)
+    words = ["exam", "notice", "fee", "hostel", "date"]
+    for i in range(500):
+        ix.add(i, " ".join(rng.choice(words, size=30)), "")
+    for tokens in (["notice", "exam"], ["exam", "notice", "fee"], ["fee", "fee"], ["date", "missing"]):
+        ids = ix.match_all(tokens)
+        expected = [c for c in ids.tolist() if ix.has_phrase(c, tokens)]
+        assert ix.phrase_ids(ids, tokens).tolist() == expected
+
+
+def test_phrase_scan_is_bounded_when_every_chunk_matches(monkeypatch):
+    ix = InvertedIndex()
+    n = 3 * keyword_index.PHRASE_SCAN_MAX
+    for i in range(n):
+        # both terms everywhere, the phrase "exam notice" nowhere but in a few early chunks
+        ix.add(i, "exam notice board" if i in (5, 70) else "notice board exam", "")
+    checked = []  # chunks phrase-checked, one at a time or in blocks
+    phrase_ids, has_phrase = ix.phrase_ids, ix.has_phrase
+    monkeypatch.setattr(ix, "phrase_ids", lambda ids, tokens: checked.append(len(ids)) or phrase_ids(ids, tokens))
+    monkeypatch.setattr(ix, "has_phrase", lambda cid, tokens: checked.append(1) or has_phrase(cid, tokens))
+
+    result = ix.search(["exam", "notice"], limit=20)
+
+    assert result[:2] == [5, 70]
+    assert result[2:] == [i for i in range(22) if i not in (5, 70)][:18]
+    assert sum(checked) <= keyword_index.PHRASE_SCAN_MAX
+
+
+def test_disk_usage_reports_the_exact_float32_copy(engine):
+    engine.add_texts([_doc(f"Circular number {i} about the library timings", f"circular-{i}.pdf") for i in range(3)])
+    engine._store.compact(engine._snapshot)
+
+    usage = engine.disk_usage()
+    info = ann.describe(engine.index)
+
+    assert usage["vectors"] >= 4 * embed.EMBED_DIM * len(engine.documents)
+    assert usage["index"] > 0 and usage["deltas"] == 0
+    assert usage["total"] == sum(v for kind, v in usage.items() if kind != "total")
+    assert info["disk_bytes_per_vector"] == info["bytes_per_vector"] + 4 * embed.EMBED_DIM
+
+
+def test_exact_sims_unavailable_after_recovering_a_base_without_vectors(engine, monkeypatch):
+    engine.add_texts([_doc(f"Scholarship form {i} for merit students", f"form-{i}.pdf") for i in range(3)])
+    engine._store.compact(engine._snapshot)
+    os.remove(os.path.join(engine.INDEX_DIR, engine._store.read_manifest()["base"] + ".vectors.npy"))
+    _restart(monkeypatch)
+    engine.add_texts([_doc(f"Bus pass renewal notice {i}", f"bus-{i}.pdf") for i in range(3)])
+    assert engine.index.ntotal == 6 and len(engine._exact) == 3
+
+    q = engine.encode_query("scholarship form")[0]
+
+    # rows 0..2 of the exact vectors now hold the bus notices, not the forms
+    assert engine._exact_sims(q, np.arange(3)) is None
+    results = engine.retrieve("scholarship form", k=3)
+    assert {r["source"] for r in results} == {"form-0.pdf", "form-1.pdf", "form-2.pdf"}
+
+
+def test_searches_run_safely_while_documents_are_added(engine, monkeypatch):
+    # HNSW is the index that must never be searched mid-add
+    monkeypatch.setattr(engine, "index", ann.new_index("hnsw", embed.EMBED_DIM))
+    topics = ["hostel", "exam", "library", "transport", "scholarship"]
+    engine.add_texts([_doc(f"{t} notice number 0 for all students", f"{t}-0.pdf") for t in topics])
+    errors, added = [], threading.Event()
+
+    def add():
+        try:
+            for n in range(1, 40):
+                engine.add_texts([_doc(f"{t} notice number {n} for all students " + "word " * n, f"{t}-{n}.pdf")
+                                  for t in topics])
+        except Exception as e:
+            errors.append(e)
+        finally:
+            added.set()
+
+    def search(topic):
+        try:
+            while not added.is_set():
+                batch = engine.retrieve_batch([(f"{topic} notice", 3), (f"{topic} circular timings", 3)])
+                streamed = [r for _, r in engine.retrieve_stream(f"{topic} students", 3)]
+                for r in batch[0] + streamed:
+                    # every hit is a whole, consistent row: its text matches its file
+                    assert r["clean"].lower().startswith(r["source"].split("-")[0]), r
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=add)] + [threading.Thread(target=search, args=(t,)) for t in topics]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(60)
+
+    assert not errors, errors
+    assert engine.index.ntotal == len(engine.documents) == 5 * 40
+    assert {r["source"] for r in engine.retrieve("hostel notice number 39", k=1)} == {"hostel-39.pdf"}
+
+
+
+def test_compaction_purges_tombstoned_chunks(engine, monkeypatch):
+    monkeypatch.setattr(engine, "PURGE_AT", 0.0)
+    engine.add_texts([_doc("Old hostel fee notice", "fees.pdf", url="https://uni.example/fees.pdf", sha="1" * 64),
+                      _doc("Library opening hours notice", "library.pdf")])
+    engine.add_texts([_doc("New hostel fee notice for 2025", "fees.pdf", url="https://uni.example/fees.pdf", sha="2" * 64)])
+    deleted = engine.add_texts([_doc("Cancelled sports day circular", "sports.pdf")])[0]
+    engine.delete_document(deleted)
+    assert len(engine.documents) == 4 and engine.deleted_chunks() == 2
+
+    engine._store.compact(engine._compaction_snapshot)
+
+    assert engine.deleted_chunks() == 0 and engine._store.read_manifest()["count"] == 2
+    assert engine.index.ntotal == len(engine._exact) == len(engine.keywords) == 2
+    assert [r["clean"] for r in engine.documents] == ["Library opening hours notice", "New hostel fee notice for 2025"]
+    assert [r["clean"] for r in engine.retrieve("hostel fee notice", k=1)] == ["New hostel fee notice for 2025"]
+    assert all(r["doc_id"] != deleted for r in engine.retrieve("sports day circular", k=3))
+
+    # a delta written after the purge replays on top of the renumbered rows
+    engine.add_texts([_doc("Transport bus route changes", "bus.pdf")])
+    _restart(monkeypatch)
+
+    assert len(engine.documents) == engine.index.ntotal == len(engine._exact) == 3
+    assert engine.documents[2]["clean"] == "Transport bus route changes"
+    assert [r["source"] for r in engine.retrieve("bus route", k=1)] == ["bus.pdf"]
+    assert [r["clean"] for r in engine.retrieve("hostel fee notice", k=1)] == ["New hostel fee notice for 2025"]
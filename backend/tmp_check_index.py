@@ -2,9 +2,10 @@ import time
 import sys
 sys.path.append('.')
 import embed
+embed.load()
 print('documents:', len(embed.documents))
 try:
     print('faiss ntotal:', embed.index.ntotal)
 except Exception as e:
     print('index error', e)
-print('model device:', getattr(embed.model, 'device', 'unknown'))
+print('model device:', getattr(embed.get_model(), 'device', 'unknown'))
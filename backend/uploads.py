@@ -0,0 +1,226 @@
+"""Streaming, content-addressed storage for uploaded files.
+
+POST /upload bodies are parsed incrementally as they arrive: the ``file``
+part's bytes are hashed and written to a temporary file chunk by chunk (off
+the event loop), the size limit is enforced while streaming, and the
+finished file is moved to
+
+    data/uploads/blobs/<sha[:2]>/<sha256><ext>
+
+so two uploads with the same name never overwrite each other and identical
+content is stored once. The extension is kept because extraction picks the
+PDF / image path by it. Crawled documents are kept per URL instead (the
+crawler revalidates them with ETag / Last-Modified), under
+
+    data/uploads/crawled/<h[:2]>/<h>-<name>   h = SHA-256 of the URL
+
+``resolve_download`` maps a document id back to its stored file (falling
+back to data/uploads/<name> for older files).
+"""
+import os
+import uuid
+import asyncio
+import hashlib
+from urllib.parse import urlparse
+
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from db import SessionLocal, Document, Job
+
+UPLOAD_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'uploads'))
+BLOB_DIR = os.path.join(UPLOAD_DIR, "blobs")
+CRAWL_DIR = os.path.join(UPLOAD_DIR, "crawled")
+TMP_DIR = os.path.join(BLOB_DIR, "tmp")
+
+# reject uploads larger than this (checked against Content-Length and while streaming)
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_MB", "100")) * 1024 * 1024
+# buffered parser output is flushed to disk once it reaches this size
+UPLOAD_WRITE_BYTES = int(os.getenv("UPLOAD_WRITE_KB", "1024")) * 1024
+
+
+class UploadError(Exception):
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def blob_path(sha: str, filename: str) -> str:
+    ext = os.path.splitext(filename)[1].lower()
+    return os.path.join(BLOB_DIR, sha[:2], sha + ext)
+
+
+def crawl_path(url: str) -> str:
+    """Where the crawler keeps the download of ``url``: one file per URL, however it is named."""
+    h = hashlib.sha256(url.encode("utf-8")).hexdigest()[:32]
+    name = os.path.basename(urlparse(url).path) or "downloaded_doc"
+    return os.path.join(CRAWL_DIR, h[:2], f"{h}-{name}")
+
+
+class BlobWriter:
+    """Temp file that hashes what is written and becomes a blob on commit()."""
+
+    def __init__(self, max_bytes: int = UPLOAD_MAX_BYTES):
+        os.makedirs(TMP_DIR, exist_ok=True)
+        self.tmp_path = os.path.join(TMP_DIR, uuid.uuid4().hex + ".part")
+        self._f = open(self.tmp_path, "wb")
+        self._sha = hashlib.sha256()
+        self.size = 0
+        self.max_bytes = max_bytes
+
+    def write(self, data: bytes):
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise UploadError(f"File exceeds the {self.max_bytes // (1024 * 1024)} MB upload limit", 413)
+        self._sha.update(data)
+        self._f.write(data)
+
+    def commit(self, filename: str):
+        """Move the temp file to its content address; returns ``(sha256, path)``."""
+        self._f.close()
+        sha = self._sha.hexdigest()
+        path = blob_path(sha, filename)
+        if os.path.exists(path):
+            os.remove(self.tmp_path)  # same bytes already stored
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(self.tmp_path, path)
+        return sha, path
+
+    def abort(self):
+        try:
+            self._f.close()
+            os.remove(self.tmp_path)
+        except OSError:
+            pass
+
+
+async def receive_upload(request, field: str = "file", max_bytes: int = UPLOAD_MAX_BYTES):
+    """Stream the ``field`` part of a multipart request into the blob store.
+
+    Returns ``(filename, sha256, path, size)``; raises UploadError for a missing
+    part, a non-multipart body or a body over ``max_bytes``.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise UploadError("Expected a multipart/form-data body with a 'file' field")
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > max_bytes + 64 * 1024:  # + multipart framing
+        raise UploadError(f"File exceeds the {max_bytes // (1024 * 1024)} MB upload limit", 413)
+
+    part = {"headers": {}, "field": b"", "value": b""}
+    found = {"filename": None, "writer": None, "done": False}
+    pending = []
+
+    def on_part_begin():
+        part["headers"] = {}
+
+    def on_header_field(data, start, end):
+        part["field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        part["value"] += data[start:end]
+
+    def on_header_end():
+        part["headers"][part["field"].lower()] = part["value"]
+        part["field"], part["value"] = b"", b""
+
+    def on_headers_finished():
+        _, disp = parse_options_header(part["headers"].get(b"content-disposition", b""))
+        part["is_file"] = disp.get(b"name") == field.encode() and b"filename" in disp and found["writer"] is None
+        if part["is_file"]:
+            name = disp[b"filename"].decode("utf-8", "replace")
+            found["filename"] = os.path.basename(name.replace("\\", "/")) or "upload"
+            found["writer"] = BlobWriter(max_bytes)
+
+    def on_part_data(data, start, end):
+        if part.get("is_file"):
+            pending.append(data[start:end])
+
+    def on_part_end():
+        if part.get("is_file"):
+            found["done"] = True
+            part["is_file"] = False
+
+    parser = MultipartParser(params[b"boundary"], {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    async def flush():
+        if pending and found["writer"] is not None:
+            data = b"".join(pending)
+            pending.clear()
+            await asyncio.to_thread(found["writer"].write, data)
+
+    try:
+        buffered = 0
+        async for chunk in request.stream():
+            parser.write(chunk)
+            buffered += len(chunk)
+            if buffered >= UPLOAD_WRITE_BYTES:
+                await flush()
+                buffered = 0
+        await flush()
+        parser.finalize()
+    except UploadError:
+        if found["writer"] is not None:
+            found["writer"].abort()
+        raise
+    except Exception as e:
+        if found["writer"] is not None:
+            found["writer"].abort()
+        raise UploadError(f"Malformed upload: {e}")
+
+    writer = found["writer"]
+    if writer is None or not found["done"]:
+        if writer is not None:
+            writer.abort()
+        raise UploadError("No 'file' field in upload")
+    sha, path = await asyncio.to_thread(writer.commit, found["filename"])
+    return found["filename"], sha, path, writer.size
+
+
+def resolve_download(doc_id: int = None, filename: str = None):
+    """Path of the stored file for a document, or None.
+
+    ``doc_id`` (what search results carry) identifies the file exactly: its
+    content hash names the blob, its URL the crawled copy. ``filename`` alone
+    is ambiguous - several documents can share a name - and is only used for
+    upload jobs that are not indexed yet and for older files stored by name.
+    """
+    db = SessionLocal()
+    try:
+        if doc_id is not None:
+            doc = db.query(Document.content_hash, Document.url, Document.filename).filter(Document.id == doc_id).first()
+            if doc is None:
+                return None
+            content_hash, url, name = doc
+            candidates = []
+            if content_hash and name:
+                candidates.append(blob_path(content_hash, name))
+            if url:
+                candidates.append(crawl_path(url))
+            if name:
+                candidates.append(os.path.join(UPLOAD_DIR, os.path.basename(name)))
+            return next((p for p in candidates if os.path.exists(p)), None)
+        if not filename:
+            return None
+        row = (
+            db.query(Job.content_hash)
+            .filter(Job.filename == filename, Job.content_hash.isnot(None))
+            .order_by(Job.created_at.desc())
+            .first()
+        )
+    finally:
+        db.close()
+    if row is not None:
+        path = blob_path(row[0], filename)
+        if os.path.exists(path):
+            return path
+    legacy = os.path.join(UPLOAD_DIR, filename)
+    return legacy if os.path.exists(legacy) else None
@@ -1,8 +1,33 @@
-import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
-from collections import deque
+import asyncio
 import time
+from urllib.parse import urljoin, urlparse
+
+import httpx
+from bs4 import BeautifulSoup
+
+
+class TokenBucket:
+    """Politeness limiter: ``rate`` requests/second on average, bursts of up to ``burst``."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
 
 
 class UniversityCrawler:
@@ -13,7 +38,15 @@ class UniversityCrawler:
         allowed_domain,
         max_depth=3,
         max_pages=100,
-        max_documents=100
+        max_documents=100,
+        concurrency=8,
+        per_host=4,
+        rate=5.0,
+        burst=5,
+        timeout=10.0,
+        client=None,
+        state=None,
+        on_document=None
     ):
         self.seed_urls = seed_urls
         self.allowed_domain = allowed_domain
@@ -21,6 +54,22 @@ class UniversityCrawler:
         self.max_pages = max_pages
         self.max_documents = max_documents
 
+        # concurrency: total in-flight requests, per_host: in-flight per host,
+        # rate/burst: token bucket per host (requests/second)
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.rate = rate
+        self.burst = burst
+        self.timeout = timeout
+        # optional pre-built httpx.AsyncClient (e.g. pointed at a stub server)
+        self.client = client
+        # optional persistent frontier / validator store (backend/crawl_state.CrawlState):
+        # resumes interrupted crawls and revalidates pages with conditional requests
+        self.state = state
+        # optional callback per discovered document, so downloading can start
+        # while the crawl is still running (may block to apply backpressure)
+        self.on_document = on_document
+
         self.visited_urls = set()
         self.document_links = []
 
@@ -42,10 +91,16 @@ class UniversityCrawler:
             "?replytocom="
         ]
 
+        # <title> of every parsed page, so documents carry their source page title
+        self.page_titles = {}
+        self.stats = {"fetched": 0, "not_modified": 0, "failed": 0, "elapsed": 0.0}
+        self._buckets = {}
+        self._host_limits = {}
+
     # ---------- HELPERS ----------
 
     def is_same_domain(self, url):
-        return urlparse(url).netloc.lower().endswith(self.allowed_domain)
+        return (urlparse(url).hostname or "").lower().endswith(self.allowed_domain)
 
     def get_path(self, url):
         return urlparse(url).path.lower().rstrip("/")
@@ -62,18 +117,57 @@ class UniversityCrawler:
 
     # ---------- NETWORK ----------
 
-    def fetch_page(self, url):
-        try:
-            r = requests.get(url, timeout=10)
-            if r.status_code == 200 and "text/html" in r.headers.get("Content-Type", ""):
-                return r.text
-        except requests.RequestException:
-            pass
+    def _host_gate(self, url):
+        host = urlparse(url).netloc.lower()
+        if host not in self._buckets:
+            self._buckets[host] = TokenBucket(self.rate, self.burst)
+            self._host_limits[host] = asyncio.Semaphore(self.per_host)
+        return self._buckets[host], self._host_limits[host]
+
+    async def fetch_page(self, client, url, headers=None):
+        bucket, limit = self._host_gate(url)
+        async with limit:
+            await bucket.acquire()
+            try:
+                r = await client.get(url, headers=headers)
+                self.stats["fetched"] += 1
+                return r
+            except httpx.HTTPError:
+                self.stats["failed"] += 1
         return None
 
+    async def page_links(self, client, url, record):
+        """Links on a page; a 304 against stored validators reuses the stored links."""
+        known = self.state.page(url) if self.state else None
+        headers = {}
+        if known:
+            if known[0]:
+                headers["If-None-Match"] = known[0]
+            if known[1]:
+                headers["If-Modified-Since"] = known[1]
+
+        r = await self.fetch_page(client, url, headers=headers or None)
+        if r is None:
+            return None
+
+        if r.status_code == 304 and known:
+            self.stats["not_modified"] += 1
+            links = known[2]
+        elif r.status_code == 200 and "text/html" in r.headers.get("Content-Type", ""):
+            # BeautifulSoup is pure Python; keep the event loop free for other fetches
+            links, title = await asyncio.to_thread(self.parse_page, r.text, url)
+            if title:
+                self.page_titles[url] = title
+        else:
+            return None
+
+        record["page"] = (r.headers.get("ETag"), r.headers.get("Last-Modified"), links)
+        return links
+
     # ---------- PARSING ----------
 
-    def extract_links(self, html, base_url):
+    def parse_page(self, html, base_url):
+        """``(links, title)`` of an HTML page."""
         soup = BeautifulSoup(html, "html.parser")
         links = set()
 
@@ -81,72 +175,135 @@ class UniversityCrawler:
             abs_url = urljoin(base_url, tag["href"])
             links.add(abs_url.split("#")[0])
 
-        return links
+        title = soup.title.string.strip() if soup.title and soup.title.string else None
+        return links, title
+
+    def extract_links(self, html, base_url):
+        return self.parse_page(html, base_url)[0]
 
     # ---------- MAIN CRAWLER ----------
 
-    def crawl(self):
-        queue = deque()
+    def _done(self):
+        return len(self.visited_urls) >= self.max_pages or len(self.document_links) >= self.max_documents
 
-        for url in self.seed_urls:
-            queue.append((url, 0))
+    async def _visit(self, client, current_url, depth, queue, queued, seen_documents, record):
+        if self._done() or current_url in self.visited_urls:
+            return
 
-        while queue:
-            if len(self.visited_urls) >= self.max_pages:
-                break
+        if depth > self.max_depth:
+            return
 
-            if len(self.document_links) >= self.max_documents:
-                break
+        if not self.is_same_domain(current_url):
+            return
 
-            current_url, depth = queue.popleft()
+        if depth > 0 and not self.is_allowed_page(current_url):
+            return
 
-            if current_url in self.visited_urls:
-                continue
+        self.visited_urls.add(current_url)
+        print(f"🕷 Crawling ({len(self.visited_urls)}): {current_url}")
 
-            if depth > self.max_depth:
-                continue
+        links = await self.page_links(client, current_url, record)
+        if not links:
+            return
 
-            if not self.is_same_domain(current_url):
+        for link in sorted(links):
+            if link in self.visited_urls:
                 continue
 
-            if depth > 0 and not self.is_allowed_page(current_url):
+            if not self.is_same_domain(link):
                 continue
 
-            self.visited_urls.add(current_url)
-            print(f"🕷 Crawling ({len(self.visited_urls)}): {current_url}")
-
-            html = self.fetch_page(current_url)
-            if not html:
+            if self.is_noise_url(link):
                 continue
 
-            links = self.extract_links(html, current_url)
-
-            for link in links:
-                if link in self.visited_urls:
-                    continue
-
-                if not self.is_same_domain(link):
-                    continue
-
-                if self.is_noise_url(link):
+            if self.is_document(link):
+                if link in seen_documents or len(self.document_links) >= self.max_documents:
                     continue
-
-                if self.is_document(link):
-                    self.document_links.append({
-                        "url": link,
-                        "source": current_url
-                    })
-                    print(f"  📄 Found document: {link}")
-
-                elif self.is_allowed_page(link):
-                    queue.append((link, depth + 1))
-
-            time.sleep(0.2)
-
+                seen_documents.add(link)
+                doc = {
+                    "url": link,
+                    "source": current_url,
+                    "title": self.page_titles.get(current_url)
+                }
+                self.document_links.append(doc)
+                record["documents"].append((link, current_url))
+                print(f"  📄 Found document: {link}")
+                if self.on_document:
+                    # a blocking callback stalls only this worker, not the event loop
+                    await asyncio.to_thread(self.on_document, doc)
+
+            elif self.is_allowed_page(link):
+                # re-queue only if reached by a shorter path than before
+                if depth + 1 < queued.get(link, self.max_depth + 2):
+                    queued[link] = depth + 1
+                    queue.put_nowait((link, depth + 1))
+                    record["pushed"].append((link, depth + 1))
+
+    async def _worker(self, client, queue, queued, seen_documents):
+        while True:
+            current_url, depth = await queue.get()
+            record = {"page": None, "pushed": [], "documents": []}
+            try:
+                await self._visit(client, current_url, depth, queue, queued, seen_documents, record)
+            except asyncio.CancelledError:
+                raise  # interrupted: leave the URL in the persisted frontier
+            except Exception as e:
+                print(f"  ⚠️ Error crawling {current_url}: {e}")
+            try:
+                if self.state:
+                    self.state.complete(current_url, **record)
+            finally:
+                queue.task_done()
+
+    async def crawl_async(self):
+        start = time.perf_counter()
+        queue = asyncio.Queue()
+        queued = {}
+
+        if self.state:
+            frontier, visited, found = self.state.begin(self.seed_urls)
+            self.visited_urls |= visited
+            self.document_links.extend(found)
+        else:
+            frontier, found = [(url, 0) for url in self.seed_urls], []
+
+        for url, depth in frontier:
+            queued[url] = depth
+            queue.put_nowait((url, depth))
+        seen_documents = {d["url"] for d in found}
+        if self.on_document:
+            for doc in found:
+                await asyncio.to_thread(self.on_document, doc)
+
+        client = self.client or httpx.AsyncClient(
+            timeout=self.timeout,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+        )
+        workers = [asyncio.create_task(self._worker(client, queue, queued, seen_documents)) for _ in range(self.concurrency)]
+        try:
+            await queue.join()
+        finally:
+            for w in workers:
+                w.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            if self.client is None:
+                await client.aclose()
+
+        if self.state:
+            self.state.finish()
+
+        self.stats["elapsed"] = time.perf_counter() - start
         print(
             f"\n✅ Crawl complete | "
             f"Visited: {len(self.visited_urls)} | "
-            f"Documents: {len(self.document_links)}"
+            f"Documents: {len(self.document_links)} | "
+            f"Not modified: {self.stats['not_modified']} | "
+            f"{self.stats['fetched'] / max(self.stats['elapsed'], 1e-9):.1f} pages/s"
         )
 
         return self.document_links
+
+    def crawl(self):
+        """Blocking entry point (runs ``crawl_async`` on a fresh event loop)."""
+        return asyncio.run(self.crawl_async())
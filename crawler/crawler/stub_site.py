@@ -0,0 +1,77 @@
+"""Crawl a generated local site to check the crawler without touching the network.
+
+    python stub_site.py [pages] [latency_ms]
+
+Serves ``pages`` linked HTML pages under /academics (each linking to a few
+siblings, a PDF, noise URLs and an off-domain link) from a threaded stdlib
+server on 127.0.0.1, crawls it and prints what was found and the page rate.
+"""
+import sys
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from crawler.UniversityCrawler import UniversityCrawler
+
+PAGES = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+LATENCY = (int(sys.argv[2]) if len(sys.argv) > 2 else 50) / 1000
+
+
+class StubHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        time.sleep(LATENCY)
+        path = self.path.rstrip("/")
+        if not path.startswith("/academics/p"):
+            self.send_error(404)
+            return
+        try:
+            i = int(path.rsplit("p", 1)[1])
+        except ValueError:
+            self.send_error(404)
+            return
+        links = [f"/academics/p{(i * 3 + k) % PAGES}" for k in (1, 2, 3)]
+        links += [f"/academics/files/doc{i}.pdf", "/feed", "/category/news", "https://example.org/x"]
+        body = "<html><head><title>Page %d</title></head><body>%s</body></html>" % (
+            i, "".join(f'<a href="{h}">{h}</a>' for h in links))
+        data = body.encode("utf-8")
+        etag = '"p%d-%d"' % (i, PAGES)
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    try:
+        crawler = UniversityCrawler(
+            seed_urls=[base + "/academics/p0"],
+            allowed_domain="127.0.0.1",
+            max_depth=10,
+            max_pages=PAGES,
+            max_documents=PAGES,
+            rate=0
+        )
+        docs = crawler.crawl()
+    finally:
+        server.shutdown()
+
+    print(f"\npages={len(crawler.visited_urls)} documents={len(docs)} "
+          f"fetched={crawler.stats['fetched']} failed={crawler.stats['failed']} "
+          f"elapsed={crawler.stats['elapsed']:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
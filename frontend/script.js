@@ -66,13 +66,16 @@ async function trackJobProgress(jobId, filename) {
   }, 2000);
 }
 
-async function downloadFile(encodedName) {
+async function downloadFile(docId, encodedName) {
   const filename = decodeURIComponent(encodedName);
   const alertBox = document.getElementById('uploadStatus');
   alertBox.innerText = `Downloading ${filename}...`;
 
   try {
-    const res = await fetch(`http://127.0.0.1:8001/download?filename=${encodeURIComponent(filename)}`);
+    // doc_id picks the file (names are not unique); filename is just the saved name
+    const params = new URLSearchParams({ filename });
+    if (docId !== null && docId !== undefined) params.set('doc_id', docId);
+    const res = await fetch(`http://127.0.0.1:8001/download?${params}`);
     if (!res.ok) {
       let errText = 'Download failed';
       try { const err = await res.json(); errText = err.error || errText; } catch(e){}
@@ -119,9 +122,63 @@ async function fetchNotifications() {
 setInterval(fetchNotifications, 8000);
 fetchNotifications();
 
+// the search in flight (an EventSource); a new search closes it, which the
+// server sees as a disconnect and stops scoring
+let activeSearch = null;
+
+function showNoResults(resultsBox, query) {
+  resultsBox.innerHTML = `
+    <div class="no-results-box">
+      <div class="no-results-icon">❌</div>
+      <div class="no-results-title">This item is not present</div>
+      <div class="no-results-message">
+        <p>We couldn't find any documents for "<strong>${query}</strong>".</p>
+        <p class="suggestion-text">Suggestions:</p>
+        <ul>
+          <li>Check spelling or try variations (e.g. full name)</li>
+          <li>Upload documents related to this person or topic</li>
+          <li>Try shorter keywords (e.g. surname)</li>
+        </ul>
+      </div>
+    </div>
+  `;
+}
+
+function renderResultCard(item, resultsBox) {
+  const showRaw = document.getElementById("showRaw")?.checked;
+  const card = document.createElement("div");
+  card.className = "result-card";
+
+  // `item` is expected to be an object { clean, raw, source, url, title }
+  const metaHtml = `<div class="meta"><strong>${item.title || item.source || ''}</strong> ${item.url ? `<a href="${item.url}" target="_blank">(source)</a>` : ''}</div>`;
+  const cleanHtml = `<div class="clean">${item.clean}</div>`;
+  const rawHtml = `<pre class="raw" style="display:${showRaw ? 'block' : 'none'};white-space:pre-wrap;">${item.raw}</pre>`;
+
+  card.innerHTML = metaHtml + cleanHtml + rawHtml;
+  resultsBox.appendChild(card);
+}
+
+function addRelatedFile(item, relatedBox, relatedFiles) {
+  // Collect related source files with download buttons (one row per file)
+  // one row per document: different files can share a name
+  const key = item.doc_id ?? item.source;
+  if (!item.source || relatedFiles.has(key)) return;
+  relatedFiles.set(key, { name: item.source, title: item.title || item.source });
+  const row = document.createElement('div');
+  row.className = 'related-row';
+  row.innerHTML = `<span title="${item.title || item.source}">📄 ${item.source}</span> <button onclick="downloadFile(${item.doc_id ?? 'null'}, '${encodeURIComponent(item.source)}')">⬇️ Download</button>`;
+  relatedBox.appendChild(row);
+}
+
 async function searchText() {
   const query = document.getElementById("query").value;
   const resultsBox = document.getElementById("results");
+  const relatedBox = document.getElementById("related");
+
+  if (activeSearch) {
+    activeSearch.close();
+    activeSearch = null;
+  }
 
   resultsBox.innerHTML = "<p>🔍 Searching...</p>";
 
@@ -130,6 +187,50 @@ async function searchText() {
     return;
   }
 
+  if (!window.EventSource) {
+    return searchTextOnce(query, resultsBox, relatedBox);
+  }
+
+  // Stream results: keyword hits arrive first, semantic hits as they are scored
+  const source = new EventSource(`${API}/chat?stream=true&k=3&query=${encodeURIComponent(query)}`);
+  activeSearch = source;
+  const relatedFiles = new Map();
+  let count = 0;
+
+  source.addEventListener("result", (e) => {
+    const { result } = JSON.parse(e.data);
+    if (count === 0) {
+      resultsBox.innerHTML = "";
+      relatedBox.innerHTML = "";
+    }
+    count++;
+    renderResultCard(result, resultsBox);
+    addRelatedFile(result, relatedBox, relatedFiles);
+  });
+
+  source.addEventListener("done", () => {
+    source.close();
+    if (activeSearch === source) activeSearch = null;
+    if (count === 0) {
+      showNoResults(resultsBox, query);
+      relatedBox.innerHTML = '<p style="color: #999; font-size: 0.9rem;">No documents matched</p>';
+    }
+    // refresh notifications immediately
+    fetchNotifications();
+  });
+
+  source.onerror = () => {
+    // EventSource would reconnect and re-run the search; stop instead
+    source.close();
+    if (activeSearch === source) activeSearch = null;
+    if (count === 0) {
+      resultsBox.innerHTML = "<p>⚠️ Unable to fetch results.</p>";
+    }
+  };
+}
+
+// Non-streaming fallback for browsers without EventSource
+async function searchTextOnce(query, resultsBox, relatedBox) {
   try {
     const response = await fetch(
       `${API}/search?query=${encodeURIComponent(query)}`
@@ -137,68 +238,19 @@ async function searchText() {
 
     const data = await response.json();
     resultsBox.innerHTML = "";
+    relatedBox.innerHTML = "";
 
     if (!data.results || data.results.length === 0) {
-      resultsBox.innerHTML = `
-        <div class="no-results-box">
-          <div class="no-results-icon">❌</div>
-          <div class="no-results-title">This item is not present</div>
-          <div class="no-results-message">
-            <p>We couldn't find any documents for "<strong>${query}</strong>".</p>
-            <p class="suggestion-text">Suggestions:</p>
-            <ul>
-              <li>Check spelling or try variations (e.g. full name)</li>
-              <li>Upload documents related to this person or topic</li>
-              <li>Try shorter keywords (e.g. surname)</li>
-            </ul>
-          </div>
-        </div>
-      `;
+      showNoResults(resultsBox, query);
       return;
     }
 
-    const showRaw = document.getElementById("showRaw")?.checked;
-
-    // collect unique related sources
-    const relatedBox = document.getElementById("related");
-    relatedBox.innerHTML = "";
-    const relatedFiles = new Map();  // Use Map to track files with their details
-
+    const relatedFiles = new Map();
     data.results.forEach(item => {
-      const card = document.createElement("div");
-      card.className = "result-card";
-
-      // `item` is expected to be an object { clean, raw, source, url, title }
-      const metaHtml = `<div class="meta"><strong>${item.title || item.source || ''}</strong> ${item.url ? `<a href="${item.url}" target="_blank">(source)</a>` : ''}</div>`;
-      const cleanHtml = `<div class="clean">${item.clean}</div>`;
-      const rawHtml = `<pre class="raw" style="display:${showRaw ? 'block' : 'none'};white-space:pre-wrap;">${item.raw}</pre>`;
-
-      card.innerHTML = metaHtml + cleanHtml + rawHtml;
-
-      resultsBox.appendChild(card);
-
-      // Collect related source files with better tracking
-      if (item.source) {
-        relatedFiles.set(item.source, {
-          name: item.source,
-          title: item.title || item.source
-        });
-      }
+      renderResultCard(item, resultsBox);
+      addRelatedFile(item, relatedBox, relatedFiles);
     });
 
-    // Show related documents with download buttons
-    if (relatedFiles.size > 0) {
-      const filesArray = Array.from(relatedFiles.values());
-      filesArray.forEach(file => {
-        const row = document.createElement('div');
-        row.className = 'related-row';
-        row.innerHTML = `<span title="${file.title}">📄 ${file.name}</span> <button onclick="downloadFile('${encodeURIComponent(file.name)}')">⬇️ Download</button>`;
-        relatedBox.appendChild(row);
-      });
-    } else {
-      relatedBox.innerHTML = '<p style="color: #999; font-size: 0.9rem;">No documents matched</p>';
-    }
-
     // refresh notifications immediately
     fetchNotifications();
 